@@ -7,34 +7,105 @@ Created on Fri Jul  5 21:43:13 2024
 """
 
 import sys,os
+import numpy as np
 import pandas as pd
 import logging
 import subprocess
-from rpy2.robjects.packages import importr
-import rpy2.robjects as ro
-import rpy2.robjects.packages as rpackages
-from rpy2.robjects import pandas2ri
 from dmc.imputation import impute_beta
+from dmc.betareader import read_beta
 from dmc.utils import plot_corr
 
 
-def DunedinPACE_clock(beta_file, outfile, metafile=None, delimiter=None,
-                      ff='pdf', na_percent=0.2, imputation_method=11,
-                      ext_file=None, ovr=False):
-    try:
-        devtools = importr('devtools')
-    except:
-        # Use "utils" to install R's "devtools" if not being done.
-        utils = rpackages.importr('utils')
-        utils.install_packages('devtools')
+# the R package "DunedinPACE" and its probes. Loaded once per process and
+# reused by all input files.
+_r_session = {}
+
+
+def r_session():
+    """
+    Load the R package "DunedinPACE" (through rpy2).
+
+    The R packages "devtools" and "DunedinPACE" are installed if missing.
+    The package and its probes (all "gold standard" and model probes) are
+    kept for later calls in the same process.
+
+    Returns
+    -------
+    dict. {'pace': the R package, 'probes': pandas Index of the probes}.
+    """
+    if _r_session:
+        return _r_session
+    # rpy2 starts an embedded R session on import.
+    import rpy2.robjects as ro
+    import rpy2.robjects.packages as rpackages
 
     # use "devtools" to install "DunedinPACE" package
     # https://github.com/danbelsky/DunedinPACE
     try:
         DunedinPACE = rpackages.importr('DunedinPACE')
     except:
+        try:
+            devtools = rpackages.importr('devtools')
+        except:
+            # Use "utils" to install R's "devtools" if not being done.
+            utils = rpackages.importr('utils')
+            utils.install_packages('devtools')
+            devtools = rpackages.importr('devtools')
         devtools.install_github("danbelsky/DunedinPACE", build_vignettes = False, quiet=True)
+        DunedinPACE = rpackages.importr('DunedinPACE')
+
+    models = ro.r('DunedinPACE:::mPACE_Models')
+    probes = set()
+    for field in ('gold_standard_probes', 'model_probes'):
+        for model_probes in models.rx2(field):
+            probes.update(model_probes)
+    _r_session['pace'] = DunedinPACE
+    _r_session['probes'] = pd.Index(sorted(probes))
+    return _r_session
+
+
+def pace_r(input_df, proportion=0.8):
+    """
+    Calculate DunedinPACE with the R package "DunedinPACE".
+
+    Only the DunedinPACE probes are sent to R, as a float64 matrix (with
+    row and column names) rather than a data.frame.
+
+    Parameters
+    ----------
+    input_df : DataFrame
+        Beta values (CpGs x samples).
+    proportion : float, optional
+        "proportionOfProbesRequired" of "PACEProjector". The default is 0.8.
+
+    Returns
+    -------
+    Pandas Series indexed by samples.
+    """
+    import rpy2.robjects as ro
+    from rpy2.robjects import numpy2ri
+
+    session = r_session()
+    df = input_df[input_df.index.isin(session['probes'])]
+    logging.info("Send %d DunedinPACE probes to R" % len(df))
+    # column-major, as R stores matrices
+    values = np.asfortranarray(df.to_numpy(dtype=np.float64))
+    with (ro.default_converter + numpy2ri.converter).context():
+        r_values = ro.conversion.get_conversion().py2rpy(
+            values.ravel(order='F'))
+    r_betas = ro.baseenv['matrix'](
+        r_values, nrow=df.shape[0], ncol=df.shape[1],
+        dimnames=ro.r.list(ro.StrVector(df.index.astype(str)),
+                           ro.StrVector(df.columns.astype(str))))
+    a = session['pace'].PACEProjector(
+        betas=r_betas, proportionOfProbesRequired=proportion)
+    return pd.Series(np.array(a[0], dtype=np.float64), index=input_df.columns)
 
+
+def DunedinPACE_clock(beta_file, outfile, metafile=None, delimiter=None,
+                      ff='pdf', na_percent=0.2, imputation_method=11,
+                      ext_file=None, ovr=False, cache_dir=None,
+                      ref_panel=None, n_jobs=1, knn_max_donors=50000):
     if outfile is not None:
         out_prefix = outfile
     else:
@@ -67,20 +138,20 @@ def DunedinPACE_clock(beta_file, outfile, metafile=None, delimiter=None,
                 sys.exit(0)
 
     logging.info("Read input file: \"%s\"" % beta_file)
-    input_df1 = pd.read_csv(beta_file, sep=None, index_col=0, engine='python')
-    input_df2 = impute_beta(input_df1, method=imputation_method, ref=ext_file)
+    input_df1 = read_beta(beta_file, delimiter=delimiter, cache_dir=cache_dir)
+    input_df2 = impute_beta(input_df1, method=imputation_method, ref=ext_file,
+                            ref_panel=ref_panel, max_donors=knn_max_donors,
+                            n_jobs=n_jobs)
     (n_cpg, n_sample) = input_df2.shape
     logging.info(
         "Input file: \"%s\", Number of CpGs: %d, Number of samples: %d" %
         (beta_file, n_cpg, n_sample))
 
-    # calculate DunedinPACE
-    with (ro.default_converter + pandas2ri.converter).context():
-        r_from_pd_df = ro.conversion.get_conversion().py2rpy(input_df2)
-    a = DunedinPACE.PACEProjector(betas=r_from_pd_df, proportionOfProbesRequired=1-na_percent)
+    # calculate DunedinPACE with the R package
+    values = pace_r(input_df2, proportion=1-na_percent)
     names = list(input_df1.columns)
-    values = list(a[0][:])
-    output = pd.DataFrame(data={'DunedinPACE' : values}, index=names)
+    output = pd.DataFrame(
+        data={'DunedinPACE' : values.to_numpy()}, index=names)
 
     if metafile is not None:
         logging.info("Read meta information file: \"%s\"" % metafile)
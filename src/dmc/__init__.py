@@ -6,9 +6,8 @@ import argparse
 from dmc._version import __version__
 from dmc import helpdoc
 from dmc.clock_info import clockinfo
-from dmc import methylclocks
-from dmc import DunedinPACE
 from dmc.utils import config_log
+from dmc.registry import CLOCKS, clock_runner, model_name
 
 __author__ = "Liguo Wang"
 __copyright__ = "Copyleft"
@@ -19,45 +18,46 @@ __email__ = "wang.liguo@mayo.edu"
 __status__ = "Development"
 
 
+def score(betas, clocks=None, **kwargs):
+    """
+    Calculate DNAm ages of an in-memory beta matrix (DataFrame, NumPy array
+    or memory-mapped array) without reading or writing files.
+
+    See "dmc.scoring.score" for the parameters.
+
+    >>> import dmc
+    >>> ages, coverage = dmc.score(beta_df, clocks=['Horvath13', 'Hannum'])
+    """
+    # imported here to keep "epical" start-up fast
+    from dmc.scoring import score as score_betas
+    return score_betas(betas, clocks=clocks, **kwargs)
+
+
+def non_negative_int(value):
+    """argparse type of "--jobs" and "--knn-max-donors": an integer >= 0."""
+    try:
+        n = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid int value: %r" % value)
+    if n < 0:
+        raise argparse.ArgumentTypeError("must be >= 0 (got %d)" % n)
+    return n
+
+
 def epical():
     """
     Invoke various functions to calculate the DNA methylation age.
     """
     general_help = helpdoc.general_help
 
-    # sub commands and help.
+    # sub commands and help. The help of a clock is taken from its model
+    # (mm10 for the mouse clocks).
     commands = {
-        'Horvath13': clockinfo('Horvath13.pkl'),
-        'Horvath13_shrunk': clockinfo('Horvath13_shrunk.pkl'),
-        'Horvath18': clockinfo('Horvath18.pkl'),
-        'Levine': clockinfo('Levine.pkl'),
-        'Hannum': clockinfo('Hannum.pkl'),
-        'Zhang_EN': clockinfo('Zhang_EN.pkl'),
-        'Zhang_BLUP': clockinfo('Zhang_BLUP.pkl'),
-        'AltumAge': clockinfo('AltumAge.pkl'),
-        'Lu_DNAmTL': clockinfo('Lu_DNAmTL.pkl'),
-        'Weidner': clockinfo('Weidner.pkl'),
-        'Lin': clockinfo('Lin.pkl'),
-        'ENCen100': clockinfo('ENCen100.pkl'),
-        'ENCen40': clockinfo('ENCen40.pkl'),
-        'DunedinPACE': clockinfo('DunedinPACE.pkl'),
-        'Ped_Wu': clockinfo('Ped_Wu.pkl'),
-        'PedBE': clockinfo('PedBE.pkl'),
-        'GA_Bohlin': clockinfo('GA_Bohlin.pkl'),
-        'GA_Haftorn': clockinfo('GA_Haftorn.pkl'),
-        'GA_Knight': clockinfo('GA_Knight.pkl'),
-        'GA_Mayne': clockinfo('GA_Mayne.pkl'),
-        'GA_Lee_CPC': clockinfo('GA_Lee_CPC.pkl'),
-        'GA_Lee_RPC': clockinfo('GA_Lee_RPC.pkl'),
-        'GA_Lee_rRPC': clockinfo('GA_Lee_rRPC.pkl'),
-        'Cortical': clockinfo('Cortical.pkl'),
-        'MEAT': clockinfo('MEAT.pkl'),
-        'EPM': helpdoc.epm_help,
-        'WLMT': clockinfo('WLMT_mm10.pkl'),
-        'YOMT': clockinfo('YOMT_mm10.pkl'),
-        'mmLiver': clockinfo('mmLiver_mm10.pkl'),
-        'mmBlood': clockinfo('mmBlood_mm10.pkl')
-         }
+        c: clockinfo(model_name(c, 'mm10') + '.pkl') for c in CLOCKS}
+    commands['EPM'] = helpdoc.epm_help
+    commands['EPM-apply'] = helpdoc.epm_apply_help
+    commands['multi'] = helpdoc.multi_help
+    commands['serve'] = helpdoc.serve_help
 
     # create parse
     parser = argparse.ArgumentParser(
@@ -131,6 +131,9 @@ def epical():
     parser_EPM = sub_parsers.add_parser(
         'EPM', help=commands['EPM']
         )
+    parser_EPM_apply = sub_parsers.add_parser(
+        'EPM-apply', help=commands['EPM-apply']
+        )
     parser_MEAT = sub_parsers.add_parser(
         'MEAT', help=commands['MEAT']
         )
@@ -161,6 +164,12 @@ def epical():
     parser_mmBlood = sub_parsers.add_parser(
         'mmBlood', help=commands['mmBlood']
         )
+    parser_multi = sub_parsers.add_parser(
+        'multi', help=commands['multi']
+        )
+    parser_serve = sub_parsers.add_parser(
+        'serve', help=commands['serve']
+        )
 
     # create the parser for the 'Horvath13' sub-command
     parser_Horvath13.add_argument(
@@ -945,10 +954,11 @@ def epical():
         '-o', '--output', type=str, metavar='out_prefix', default=None,
         help=helpdoc.epm_output_help)
     parser_EPM.add_argument(
-        '-p', '--pcc', type=float, default=0.85, help='Threshold of absolute \
+        '-p', '--pcc', type=float, default=None, help='Threshold of absolute \
             Pearson correlation coefficient between chronological age and \
             beta values. This cutoff is used to select age-associated CpG \
-            sites.')
+            sites. The default is 0.85 (or the cutoff saved in the state \
+            file of "--resume").')
     parser_EPM.add_argument(
         '-n', '--niter', type=int, default=100, help='Iteration times of \
             expectation–maximization.')
@@ -974,6 +984,44 @@ def epical():
         '-r', '--ref', type=str, metavar='ref_file', default=None,
         help=helpdoc.ext_ref_help)
     parser_EPM.add_argument(
+        '--resume', type=str, metavar='state_file', default=None,
+        help=helpdoc.epm_resume_help)
+    parser_EPM.add_argument(
+        '--debug', action='store_true', help=helpdoc.debug_help)
+
+    # create the parser for the 'EPM-apply' sub-command
+    parser_EPM_apply.add_argument(
+        'input', type=str, metavar='Input_file', help=helpdoc.input_help)
+    parser_EPM_apply.add_argument(
+        'model', type=str, metavar='model_file', help=helpdoc.epm_model_help)
+    parser_EPM_apply.add_argument(
+        '-o', '--output', type=str, metavar='out_prefix', default=None,
+        help=helpdoc.epm_apply_output_help)
+    parser_EPM_apply.add_argument(
+        '-p', '--percent', type=float, default=0.2, help=helpdoc.na_help)
+    parser_EPM_apply.add_argument(
+        '-d', '--delimiter', type=str, default=None, help=helpdoc.del_help)
+    parser_EPM_apply.add_argument(
+        '-f', '--format', type=str, choices=['pdf', 'png'], default='pdf',
+        help=helpdoc.format_help)
+    parser_EPM_apply.add_argument(
+        '-m', '--metadata', type=str, metavar='meta_file', default=None,
+        help=helpdoc.meta_help)
+    parser_EPM_apply.add_argument(
+        '-l', '--log', type=str, metavar='log_file', default=None,
+        help=helpdoc.log_help)
+    parser_EPM_apply.add_argument(
+        '--impute', type=int, choices=range(-1, 12), default=11,
+        help=helpdoc.imputation_help)
+    parser_EPM_apply.add_argument(
+        '-r', '--ref', type=str, metavar='ref_file', default=None,
+        help=helpdoc.ext_ref_help)
+    parser_EPM_apply.add_argument(
+        '--knn-pool', type=int, default=1000, help=helpdoc.knn_pool_help)
+    parser_EPM_apply.add_argument(
+        '--overwrite', action='store_true',
+        help='If set, over-write existing output files.')
+    parser_EPM_apply.add_argument(
         '--debug', action='store_true', help=helpdoc.debug_help)
 
     # create the parser for the mouse 'WLMT' sub-command
@@ -983,9 +1031,8 @@ def epical():
         '-o', '--output', type=str, metavar='out_prefix', default=None,
         help=helpdoc.output_help)
     parser_WLMT.add_argument(
-       '-g', '--genome', type=str, choices=('mm10', 'mm39'), default='mm10',
-       help="The reference genome for Mouse (Mus musculus) used for RRBS or\
-           WGBS reads alignment. Must be 'mm10' or 'mm39'. default is 'mm10'.")
+       '-g', '--genome', type=str, choices=('mm10', 'mm39', 'auto', 'both'),
+       default='mm10', help=helpdoc.genome_help)
     parser_WLMT.add_argument(
         '-p', '--percent', type=float, default=0.2, help=helpdoc.na_help)
     parser_WLMT.add_argument(
@@ -1018,9 +1065,8 @@ def epical():
         '-o', '--output', type=str, metavar='out_prefix', default=None,
         help=helpdoc.output_help)
     parser_YOMT.add_argument(
-       '-g', '--genome', type=str, choices=('mm10', 'mm39'), default='mm10',
-       help="The reference genome for Mouse (Mus musculus) used for RRBS or\
-           WGBS reads alignment. Must be 'mm10' or 'mm39'. default is 'mm10'.")
+       '-g', '--genome', type=str, choices=('mm10', 'mm39', 'auto', 'both'),
+       default='mm10', help=helpdoc.genome_help)
     parser_YOMT.add_argument(
         '-p', '--percent', type=float, default=0.2, help=helpdoc.na_help)
     parser_YOMT.add_argument(
@@ -1053,9 +1099,8 @@ def epical():
         '-o', '--output', type=str, metavar='out_prefix', default=None,
         help=helpdoc.output_help)
     parser_mmLiver.add_argument(
-       '-g', '--genome', type=str, choices=('mm10', 'mm39'), default='mm10',
-       help="The reference genome for Mouse (Mus musculus) used for RRBS or\
-           WGBS reads alignment. Must be 'mm10' or 'mm39'. default is 'mm10'.")
+       '-g', '--genome', type=str, choices=('mm10', 'mm39', 'auto', 'both'),
+       default='mm10', help=helpdoc.genome_help)
     parser_mmLiver.add_argument(
         '-p', '--percent', type=float, default=0.2, help=helpdoc.na_help)
     parser_mmLiver.add_argument(
@@ -1088,9 +1133,8 @@ def epical():
         '-o', '--output', type=str, metavar='out_prefix', default=None,
         help=helpdoc.output_help)
     parser_mmBlood.add_argument(
-       '-g', '--genome', type=str, choices=('mm10', 'mm39'), default='mm10',
-       help="The reference genome for Mouse (Mus musculus) used for RRBS or\
-           WGBS reads alignment. Must be 'mm10' or 'mm39'. default is 'mm10'.")
+       '-g', '--genome', type=str, choices=('mm10', 'mm39', 'auto', 'both'),
+       default='mm10', help=helpdoc.genome_help)
     parser_mmBlood.add_argument(
         '-p', '--percent', type=float, default=0.2, help=helpdoc.na_help)
     parser_mmBlood.add_argument(
@@ -1116,57 +1160,169 @@ def epical():
         '--overwrite', action='store_true',
         help='If set, over-write existing output files.')
 
+    # restricted imputation: impute the clock CpGs only
+    for sub_parser in [
+            parser_Horvath13, parser_Horvath13_shrunk, parser_Horvath18,
+            parser_Levine, parser_Hannum, parser_Zhang_EN, parser_Zhang_BLUP,
+            parser_AltumAge, parser_Lu_DNAmTL, parser_Ped_Wu, parser_PedBE,
+            parser_GA_Bohlin, parser_GA_Haftorn, parser_GA_Knight,
+            parser_GA_Mayne, parser_GA_Lee_CPC, parser_GA_Lee_RPC,
+            parser_GA_Lee_rRPC, parser_Cortical, parser_MEAT, parser_Weidner,
+            parser_Lin, parser_ENCen100, parser_ENCen40, parser_WLMT,
+            parser_YOMT, parser_mmLiver, parser_mmBlood]:
+        sub_parser.add_argument(
+            '--impute-clock-only', action='store_true',
+            help=helpdoc.impute_clock_only_help)
+        sub_parser.add_argument(
+            '--knn-pool', type=int, default=1000, help=helpdoc.knn_pool_help)
+
+    # per-sample coverage files and coordinate matching (mouse clocks)
+    for sub_parser in [parser_WLMT, parser_YOMT, parser_mmLiver,
+                       parser_mmBlood]:
+        sub_parser.add_argument(
+            '--coverage', action='store_true', help=helpdoc.coverage_help)
+        sub_parser.add_argument(
+            '--min-cov', type=int, default=5, help=helpdoc.min_cov_help)
+        sub_parser.add_argument(
+            '--cov-format', type=str, default=None,
+            choices=['bismark', 'bedgraph', 'bedmethyl'],
+            help=helpdoc.cov_format_help)
+        sub_parser.add_argument(
+            '--match', type=str, default='exact',
+            choices=['exact', 'adjacent', 'window'], help=helpdoc.match_help)
+        sub_parser.add_argument(
+            '--window', type=int, default=0, help=helpdoc.window_help)
+
+    # create the parser for the 'multi' sub-command
+    parser_multi.add_argument(
+        'input', type=str, metavar='Input_file', help=helpdoc.input_help)
+    parser_multi.add_argument(
+        '-c', '--clocks', type=str, metavar='clock_names',
+        default=None, help=helpdoc.multi_clocks_help)
+    parser_multi.add_argument(
+        '-o', '--output', type=str, metavar='out_prefix', default=None,
+        help=helpdoc.multi_output_help)
+    parser_multi.add_argument(
+        '-p', '--percent', type=float, default=0.2, help=helpdoc.na_help)
+    parser_multi.add_argument(
+        '-d', '--delimiter', type=str, default=None, help=helpdoc.del_help)
+    parser_multi.add_argument(
+        '-m', '--metadata', type=str, metavar='meta_file', default=None,
+        help=helpdoc.meta_help)
+    parser_multi.add_argument(
+        '-l', '--log', type=str, metavar='log_file', default=None,
+        help=helpdoc.log_help)
+    parser_multi.add_argument(
+        '--impute', type=int, choices=range(-1, 12), default=11,
+        help=helpdoc.imputation_help)
+    parser_multi.add_argument(
+        '-r', '--ref', type=str, metavar='ref_file', default=None,
+        help=helpdoc.ext_ref_help)
+    parser_multi.add_argument(
+        '--knn-pool', type=int, default=1000, help=helpdoc.knn_pool_help)
+    parser_multi.add_argument(
+        '--debug', action='store_true', help=helpdoc.debug_help)
+    parser_multi.add_argument(
+        '--overwrite', action='store_true',
+        help='If set, over-write existing output files.')
+
+    # create the parser for the 'serve' sub-command
+    parser_serve.add_argument(
+        '-c', '--clocks', type=str, metavar='clock_names',
+        default=None, help=helpdoc.multi_clocks_help)
+    parser_serve.add_argument(
+        '--host', type=str, default='127.0.0.1', help=helpdoc.host_help)
+    parser_serve.add_argument(
+        '--port', type=int, default=8080, help=helpdoc.port_help)
+    parser_serve.add_argument(
+        '--socket', type=str, metavar='socket_file', default=None,
+        help=helpdoc.socket_help)
+    parser_serve.add_argument(
+        '--altum', action='store_true', help=helpdoc.altum_help)
+    parser_serve.add_argument(
+        '--max-batch', type=int, default=64, help=helpdoc.max_batch_help)
+    parser_serve.add_argument(
+        '--max-wait', type=float, default=5.0, help=helpdoc.max_wait_help)
+    parser_serve.add_argument(
+        '-p', '--percent', type=float, default=0.2, help=helpdoc.na_help)
+    parser_serve.add_argument(
+        '--impute', type=int, choices=range(-1, 12), default=11,
+        help=helpdoc.imputation_help)
+    parser_serve.add_argument(
+        '-r', '--ref', type=str, metavar='ref_file', default=None,
+        help=helpdoc.ext_ref_help)
+    parser_serve.add_argument(
+        '--ref-panel', type=str, metavar='panel', default=None,
+        help=helpdoc.ref_panel_help)
+    parser_serve.add_argument(
+        '--knn-pool', type=int, default=1000, help=helpdoc.knn_pool_help)
+    parser_serve.add_argument(
+        '--knn-max-donors', type=non_negative_int, default=50000,
+        help=helpdoc.knn_max_donors_help)
+    parser_serve.add_argument(
+        '-j', '--jobs', type=non_negative_int, metavar='jobs', default=1,
+        help=helpdoc.jobs_help)
+    parser_serve.add_argument(
+        '-l', '--log', type=str, metavar='log_file', default=None,
+        help=helpdoc.log_help)
+    parser_serve.add_argument(
+        '--debug', action='store_true', help=helpdoc.debug_help)
+
+    # binary cache of parsed beta files (all sub-commands)
+    for sub_parser in [
+            parser_Horvath13, parser_Horvath13_shrunk, parser_Horvath18,
+            parser_Levine, parser_Hannum, parser_Zhang_EN, parser_Zhang_BLUP,
+            parser_AltumAge, parser_Lu_DNAmTL, parser_Ped_Wu, parser_PedBE,
+            parser_GA_Bohlin, parser_GA_Haftorn, parser_GA_Knight,
+            parser_GA_Mayne, parser_GA_Lee_CPC, parser_GA_Lee_RPC,
+            parser_GA_Lee_rRPC, parser_Cortical, parser_EPM,
+            parser_EPM_apply, parser_MEAT, parser_Weidner, parser_Lin,
+            parser_ENCen100, parser_ENCen40, parser_DunedinPACE, parser_WLMT,
+            parser_YOMT, parser_mmLiver, parser_mmBlood, parser_multi]:
+        sub_parser.add_argument(
+            '--cache-dir', type=str, metavar='cache_dir', default=None,
+            help=helpdoc.cache_dir_help)
+        sub_parser.add_argument(
+            '--ref-panel', type=str, metavar='panel', default=None,
+            help=helpdoc.ref_panel_help)
+        sub_parser.add_argument(
+            '-j', '--jobs', type=non_negative_int, metavar='jobs', default=1,
+            help=helpdoc.jobs_help)
+        sub_parser.add_argument(
+            '--knn-max-donors', type=non_negative_int, default=50000,
+            help=helpdoc.knn_max_donors_help)
+
     args = parser.parse_args()
     if len(sys.argv) == 1:
         parser.print_help(sys.stderr)
         sys.exit(0)
     elif len(sys.argv) >= 2:
         command = sys.argv[1]
-        if command in ['Horvath13', 'Horvath13_shrunk', 'Horvath18', 'MEAT', 'PedBE', 'Cortical']:
-            config_log(switch=args.debug, logfile=args.log)
-            methylclocks.clock_horvath(
-                beta_file=args.input,
-                outfile=args.output,
-                metafile=args.metadata,
-                delimiter=args.delimiter,
-                adult_age=20, cname=command,
-                ff=args.format,
-                na_percent=args.percent,
-                ovr=args.overwrite,
-                imputation_method=args.impute,
-                ext_file=args.ref
-                )
-        elif command in ['Levine', 'Hannum', 'Lu_DNAmTL']:
+        # heavy modules are imported only when a subcommand is run.
+        from dmc import methylclocks
+        if clock_runner(command) == 'linear':
             config_log(switch=args.debug, logfile=args.log)
-            methylclocks.clock_levine_hannum(
+            methylclocks.clock_linear(
                 beta_file=args.input,
                 outfile=args.output,
-                metafile=args.metadata,
-                delimiter=args.delimiter,
                 cname=command,
-                ff=args.format,
-                na_percent=args.percent,
-                ovr=args.overwrite,
-                imputation_method=args.impute,
-                ext_file=args.ref
-                )
-        elif command in ['Zhang_BLUP', 'Zhang_EN']:
-            config_log(switch=args.debug, logfile=args.log)
-            methylclocks.clock_blup_en(
-                beta_file=args.input,
-                outfile=args.output,
                 metafile=args.metadata,
                 delimiter=args.delimiter,
-                cname=command,
                 ff=args.format,
                 na_percent=args.percent,
                 ovr=args.overwrite,
                 imputation_method=args.impute,
-                ext_file=args.ref
+                ext_file=args.ref,
+                impute_clock_only=args.impute_clock_only,
+                knn_pool=args.knn_pool,
+                cache_dir=args.cache_dir,
+                ref_panel=args.ref_panel,
+                n_jobs=args.jobs,
+                knn_max_donors=args.knn_max_donors
                 )
-        elif command in ['GA_Knight', 'GA_Mayne', 'GA_Bohlin', 'GA_Haftorn', 'GA_Lee_CPC', 'GA_Lee_RPC', 'GA_Lee_rRPC']:
+        elif clock_runner(command) == 'dnn':
             config_log(switch=args.debug, logfile=args.log)
-            methylclocks.clock_GA(
+            methylclocks.altum_age(
                 beta_file=args.input,
                 outfile=args.output,
                 metafile=args.metadata,
@@ -1176,38 +1332,36 @@ def epical():
                 na_percent=args.percent,
                 ovr=args.overwrite,
                 imputation_method=args.impute,
-                ext_file=args.ref
+                ext_file=args.ref,
+                impute_clock_only=args.impute_clock_only,
+                knn_pool=args.knn_pool,
+                cache_dir=args.cache_dir,
+                ref_panel=args.ref_panel,
+                n_jobs=args.jobs,
+                knn_max_donors=args.knn_max_donors
                 )
-        elif command == 'Ped_Wu':
+
+        elif command == 'EPM' and args.resume is not None:
             config_log(switch=args.debug, logfile=args.log)
-            methylclocks.clock_horvath(
+            methylclocks.clock_epm_update(
                 beta_file=args.input,
+                metafile=args.meta,
+                state_file=args.resume,
                 outfile=args.output,
-                metafile=args.metadata,
                 delimiter=args.delimiter,
-                cname=command,
-                ff=args.format,
-                na_percent=args.percent,
-                adult_age=48,
-                ovr=args.overwrite,
                 imputation_method=args.impute,
-                ext_file=args.ref
-                )
-        elif command == 'AltumAge':
-            config_log(switch=args.debug, logfile=args.log)
-            methylclocks.altum_age(
-                beta_file=args.input,
-                outfile=args.output,
-                metafile=args.metadata,
-                delimiter=args.delimiter,
+                ext_file=args.ref,
+                pcc_cut=args.pcc,
+                iter_n=args.niter,
+                error_tol=args.etol,
+                cv_folds=args.kfold,
+                frmt=args.format,
                 cname=command,
-                ff=args.format,
-                na_percent=args.percent,
-                ovr=args.overwrite,
-                imputation_method=args.impute,
-                ext_file=args.ref
+                cache_dir=args.cache_dir,
+                ref_panel=args.ref_panel,
+                n_jobs=args.jobs,
+                knn_max_donors=args.knn_max_donors
                 )
-
         elif command == 'EPM':
             config_log(switch=args.debug, logfile=args.log)
             methylclocks.clock_epm(
@@ -1217,29 +1371,39 @@ def epical():
                 delimiter=args.delimiter,
                 imputation_method=args.impute,
                 ext_file=args.ref,
-                pcc_cut=args.pcc,
+                pcc_cut=0.85 if args.pcc is None else args.pcc,
                 iter_n=args.niter,
                 error_tol=args.etol,
                 cv_folds=args.kfold,
                 frmt=args.format,
-                cname=command
+                cname=command,
+                cache_dir=args.cache_dir,
+                ref_panel=args.ref_panel,
+                n_jobs=args.jobs,
+                knn_max_donors=args.knn_max_donors
                 )
-        elif command in ['Weidner', 'Lin', 'ENCen100', 'ENCen40']:
+        elif command == 'EPM-apply':
             config_log(switch=args.debug, logfile=args.log)
-            methylclocks.clock_general(
+            methylclocks.clock_epm_apply(
                 beta_file=args.input,
+                model_file=args.model,
                 outfile=args.output,
                 metafile=args.metadata,
                 delimiter=args.delimiter,
-                cname=command,
-                ff=args.format,
+                frmt=args.format,
                 na_percent=args.percent,
                 ovr=args.overwrite,
                 imputation_method=args.impute,
-                ext_file=args.ref
+                ext_file=args.ref,
+                knn_pool=args.knn_pool,
+                cache_dir=args.cache_dir,
+                ref_panel=args.ref_panel,
+                n_jobs=args.jobs,
+                knn_max_donors=args.knn_max_donors
                 )
-        elif command in ['DunedinPACE']:
+        elif clock_runner(command) == 'external':
             config_log(switch=args.debug)
+            from dmc import DunedinPACE
             DunedinPACE.DunedinPACE_clock(
                 beta_file=args.input,
                 outfile=args.output,
@@ -1249,9 +1413,13 @@ def epical():
                 na_percent=args.percent,
                 ovr=args.overwrite,
                 imputation_method=args.impute,
-                ext_file=args.ref
+                ext_file=args.ref,
+                cache_dir=args.cache_dir,
+                ref_panel=args.ref_panel,
+                n_jobs=args.jobs,
+                knn_max_donors=args.knn_max_donors
                 )
-        elif command in ['WLMT', 'YOMT', 'mmLiver', 'mmBlood']:
+        elif clock_runner(command) == 'mouse':
             config_log(switch=args.debug, logfile=args.log)
             methylclocks.clock_mouse(
                 beta_file=args.input,
@@ -1264,8 +1432,63 @@ def epical():
                 na_percent=args.percent,
                 ovr=args.overwrite,
                 imputation_method=args.impute,
-                ext_file=args.ref
+                ext_file=args.ref,
+                impute_clock_only=args.impute_clock_only,
+                knn_pool=args.knn_pool,
+                cache_dir=args.cache_dir,
+                ref_panel=args.ref_panel,
+                n_jobs=args.jobs,
+                knn_max_donors=args.knn_max_donors,
+                coverage=args.coverage,
+                min_cov=args.min_cov,
+                cov_format=args.cov_format,
+                match=args.match,
+                window=args.window
                 )
+        elif command == 'multi':
+            config_log(switch=args.debug, logfile=args.log)
+            methylclocks.clock_multi(
+                beta_file=args.input,
+                outfile=args.output,
+                clocks=None if args.clocks is None else
+                [c.strip() for c in args.clocks.split(',') if c.strip()],
+                metafile=args.metadata,
+                delimiter=args.delimiter,
+                na_percent=args.percent,
+                ovr=args.overwrite,
+                imputation_method=args.impute,
+                ext_file=args.ref,
+                knn_pool=args.knn_pool,
+                cache_dir=args.cache_dir,
+                ref_panel=args.ref_panel,
+                n_jobs=args.jobs,
+                knn_max_donors=args.knn_max_donors
+                )
+        elif command == 'serve':
+            config_log(switch=args.debug, logfile=args.log)
+            import logging
+            from dmc import server
+            try:
+                server.serve(
+                    clocks=None if args.clocks is None else
+                    [c.strip() for c in args.clocks.split(',') if c.strip()],
+                    host=args.host,
+                    port=args.port,
+                    socket_path=args.socket,
+                    altum=args.altum,
+                    max_batch=args.max_batch,
+                    max_wait=args.max_wait/1000,
+                    na_percent=args.percent,
+                    imputation_method=args.impute,
+                    ref=args.ref,
+                    knn_pool=args.knn_pool,
+                    ref_panel=args.ref_panel,
+                    n_jobs=args.jobs,
+                    knn_max_donors=args.knn_max_donors
+                    )
+            except (ValueError, ImportError, FileNotFoundError) as e:
+                logging.error(str(e))
+                sys.exit(0)
         else:
             print("Unknown command!")
             parser.print_help(sys.stderr)
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AltumAge inference with NumPy.
+
+AltumAge is a small multilayer perceptron (batch normalization, dense and
+SELU layers) over 20,318 CpGs. The Keras model ("AltumAge.h5") and the
+RobustScaler ("scaler.pkl") are exported once into a plain array file
+("AltumAge_net.npz"), and the forward pass is computed as batched matrix
+products. The file is not bundled: it is created in the user cache directory
+the first time the Keras model is loaded (see "cache_altum"), and later runs
+do not load TensorFlow.
+
+>>> from dmc.altum import export_altum, load_altum
+>>> export_altum('AltumAge.h5', 'scaler.pkl', 'AltumAge_net.npz')
+>>> net = load_altum('AltumAge_net.npz')
+>>> ages = net.predict(betas)  # CpGs x samples
+"""
+
+import os
+import logging
+import numpy as np
+import pandas as pd
+
+# version of the ".npz" file
+FORMAT_VERSION = 1
+
+# SELU constants (Klambauer et al. 2017)
+SELU_ALPHA = 1.6732632423543772
+SELU_SCALE = 1.0507009873554805
+
+# number of samples predicted at a time
+BATCH_SIZE = 256
+
+# layers that do nothing at inference time
+NOOP_LAYERS = ('InputLayer', 'Dropout', 'AlphaDropout', 'GaussianNoise',
+               'GaussianDropout')
+
+
+def activate(x, name):
+    """Apply the (Keras) activation function "name" to x in place."""
+    if name in ('linear', None):
+        pass
+    elif name == 'selu':
+        neg = x < 0
+        x[neg] = SELU_ALPHA * np.expm1(x[neg])
+        x *= SELU_SCALE
+    elif name == 'relu':
+        np.maximum(x, 0, out=x)
+    elif name == 'elu':
+        neg = x < 0
+        x[neg] = np.expm1(x[neg])
+    elif name == 'tanh':
+        np.tanh(x, out=x)
+    elif name == 'sigmoid':
+        x[...] = 1.0 / (1.0 + np.exp(-x))
+    else:
+        raise ValueError("Unsupported activation: %s" % name)
+    return x
+
+
+def export_altum(h5_file, scaler_file, outfile, cpg_file=None, check=True):
+    """
+    Export the Keras AltumAge model and its scaler into a ".npz" file.
+
+    Requires TensorFlow. Only sequential models made of Dense,
+    BatchNormalization, Activation and (inference no-op) dropout/noise
+    layers are supported.
+
+    Parameters
+    ----------
+    h5_file : str
+        Keras model file ("AltumAge.h5").
+    scaler_file : str
+        Pickled sklearn RobustScaler ("scaler.pkl").
+    outfile : str
+        The output file ("AltumAge_net.npz").
+    cpg_file : str, optional
+        Pickled Series of the input CpG IDs ("multi_platform_cpgs.pkl"). If
+        provided, the CpG IDs are saved too. The default is None.
+    check : bool, optional
+        Compare the NumPy forward pass with Keras on random input after the
+        export. The default is True.
+
+    Returns
+    -------
+    None.
+    """
+    import tensorflow as tf
+    from dmc.tf_mse import mse
+    model = tf.keras.models.load_model(h5_file, custom_objects={'mse': mse})
+    scaler = pd.read_pickle(scaler_file)
+    cpgs = None if cpg_file is None else pd.read_pickle(cpg_file)
+    save_altum(model, scaler.center_, scaler.scale_, outfile, cpgs=cpgs,
+               check=check)
+
+
+def save_altum(model, center, scale, outfile, cpgs=None, check=True):
+    """
+    Save a loaded Keras AltumAge model and its scaler into a ".npz" file.
+
+    Parameters
+    ----------
+    model : keras.Model
+        The Keras model (see "keras_arrays").
+    center, scale : numpy.ndarray
+        RobustScaler's "center_" and "scale_".
+    outfile : str
+        The output file. It is written to a temporary file first and then
+        renamed, so concurrent readers never see a partial file.
+    cpgs : list, optional
+        The input CpG IDs. The default is None.
+    check : bool, optional
+        Compare the NumPy forward pass with Keras on random input (ValueError
+        if they differ by more than 1e-3). The default is True.
+
+    Returns
+    -------
+    None.
+    """
+    arrays = keras_arrays(model, center, scale)
+    if cpgs is not None:
+        arrays['cpgs'] = np.array(cpgs, dtype=str)
+    tmp_file = '%s.%d.tmp.npz' % (outfile, os.getpid())
+    try:
+        np.savez_compressed(tmp_file, **arrays)
+        if check is True:
+            rng = np.random.default_rng(0)
+            x = rng.random((len(arrays['center']), 64))
+            x_scaled = (x.T - arrays['center']) / arrays['scale']
+            expected = model.predict(x_scaled, verbose=0).flatten()
+            observed = load_altum(tmp_file).predict(x)
+            diff = np.abs(expected - observed).max()
+            logging.info(
+                "Max. difference between Keras and NumPy predictions: %g" %
+                diff)
+            if diff > 1e-3:
+                raise ValueError(
+                    "NumPy forward pass differs from Keras (max. diff = %g)"
+                    % diff)
+        os.replace(tmp_file, outfile)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    logging.info("AltumAge model saved to: %s" % outfile)
+
+
+def keras_arrays(model, center, scale):
+    """
+    Extract the weights of a (sequential) Keras model into plain arrays.
+
+    Parameters
+    ----------
+    model : keras.Model
+        Model made of Dense, BatchNormalization, Activation and (inference
+        no-op) dropout/noise layers.
+    center, scale : numpy.ndarray
+        RobustScaler's "center_" and "scale_" (one value per input feature).
+
+    Returns
+    -------
+    dict. The arrays of "AltumAge_net.npz" (see "AltumNet").
+    """
+    arrays = {
+        'version': np.array(FORMAT_VERSION),
+        'center': np.asarray(center, dtype=np.float64),
+        'scale': np.asarray(scale, dtype=np.float64)}
+    layer_types = []
+    for layer in model.layers:
+        kind = layer.__class__.__name__
+        config = layer.get_config()
+        weights = layer.get_weights()
+        i = len(layer_types)
+        if kind in NOOP_LAYERS:
+            continue
+        elif kind == 'Dense':
+            arrays['kernel_%d' % i] = weights[0]
+            arrays['bias_%d' % i] = weights[1] if config['use_bias'] \
+                else np.zeros(weights[0].shape[1], dtype=weights[0].dtype)
+            arrays['activation_%d' % i] = np.array(config['activation'])
+        elif kind == 'BatchNormalization':
+            w = list(weights)
+            n = w[-1].shape[0]
+            gamma = w.pop(0) if config['scale'] else np.ones(n)
+            beta = w.pop(0) if config['center'] else np.zeros(n)
+            arrays['gamma_%d' % i] = gamma
+            arrays['beta_%d' % i] = beta
+            arrays['mean_%d' % i] = w[0]
+            arrays['var_%d' % i] = w[1]
+            arrays['epsilon_%d' % i] = np.array(config['epsilon'])
+        elif kind == 'Activation':
+            arrays['activation_%d' % i] = np.array(config['activation'])
+        else:
+            raise ValueError("Unsupported layer: %s (%s)" % (layer.name, kind))
+        layer_types.append(kind)
+    arrays['layers'] = np.array(layer_types)
+    return arrays
+
+
+class AltumNet():
+    """
+    NumPy forward pass of AltumAge.
+
+    Batch normalization layers are folded into the following dense layer, so
+    the forward pass is a chain of (matmul + bias + activation).
+    """
+    __slots__ = ['center', 'scale', 'cpgs', 'kernels', 'biases',
+                 'activations']
+
+    def __init__(self, arrays):
+        self.center = arrays['center']
+        self.scale = arrays['scale']
+        self.cpgs = arrays['cpgs'] if 'cpgs' in arrays else None
+        self.kernels = []
+        self.biases = []
+        self.activations = []
+        # pending per-feature affine transformation (x * a + b)
+        a, b = None, None
+        for i, kind in enumerate(arrays['layers']):
+            if kind == 'BatchNormalization':
+                a2 = arrays['gamma_%d' % i] / np.sqrt(
+                    arrays['var_%d' % i] + float(arrays['epsilon_%d' % i]))
+                b2 = arrays['beta_%d' % i] - arrays['mean_%d' % i] * a2
+                if a is None:
+                    a, b = a2, b2
+                else:
+                    a, b = a * a2, b * a2 + b2
+            elif kind == 'Dense':
+                kernel = np.asarray(arrays['kernel_%d' % i], dtype=np.float64)
+                bias = np.asarray(arrays['bias_%d' % i], dtype=np.float64)
+                if a is not None:
+                    bias = bias + b @ kernel
+                    kernel = kernel * a[:, np.newaxis]
+                    a, b = None, None
+                self.kernels.append(kernel.astype(np.float32))
+                self.biases.append(bias.astype(np.float32))
+                self.activations.append(str(arrays['activation_%d' % i]))
+            elif kind == 'Activation':
+                if a is not None or not self.activations or \
+                        self.activations[-1] != 'linear':
+                    raise ValueError(
+                        "Activation layer must follow a linear dense layer")
+                self.activations[-1] = str(arrays['activation_%d' % i])
+        if a is not None:
+            # trailing batch normalization
+            self.kernels.append(np.diag(a).astype(np.float32))
+            self.biases.append(b.astype(np.float32))
+            self.activations.append('linear')
+
+    def forward(self, x_scaled):
+        """Forward pass of scaled input (samples x CpGs, float32)."""
+        x = x_scaled
+        for kernel, bias, act in zip(
+                self.kernels, self.biases, self.activations):
+            x = x @ kernel
+            x += bias
+            activate(x, act)
+        return x[:, 0]
+
+    def predict(self, betas, batch_size=BATCH_SIZE):
+        """
+        Predict AltumAge.
+
+        Parameters
+        ----------
+        betas : numpy.ndarray
+            Beta values (CpGs x samples, in the order of the model's CpGs).
+        batch_size : int, optional
+            Number of samples predicted at a time. The default is 256.
+
+        Returns
+        -------
+        numpy.ndarray.
+        """
+        out = np.empty(betas.shape[1])
+        for start, end, x in scaled_batches(
+                betas, self.center, self.scale, batch_size):
+            out[start:end] = self.forward(x)
+        return out
+
+
+def scaled_batches(betas, center, scale, batch_size=BATCH_SIZE):
+    """
+    Yield batches of scaled AltumAge input features.
+
+    The features of a batch (samples x CpGs) are copied into one
+    preallocated float32 array, which is reused by all batches, and then
+    centered and scaled in place: (beta - center) / scale.
+
+    Parameters
+    ----------
+    betas : numpy.ndarray
+        Beta values (CpGs x samples, in the order of the model's CpGs).
+    center : numpy.ndarray
+        RobustScaler's "center_" (one value per CpG).
+    scale : numpy.ndarray
+        RobustScaler's "scale_" (one value per CpG).
+    batch_size : int, optional
+        Number of samples per batch. The default is 256.
+
+    Yields
+    ------
+    tuple. (start, end, features), where "features" is a view of the
+    buffer for samples [start, end). It is overwritten by the next batch.
+    """
+    n_cpg, n_sample = betas.shape
+    center = np.asarray(center, dtype=np.float32)
+    scale = np.asarray(scale, dtype=np.float32)
+    buf = np.empty((min(batch_size, n_sample), n_cpg), dtype=np.float32)
+    for start in range(0, n_sample, batch_size):
+        end = min(start + batch_size, n_sample)
+        x = buf[:end - start]
+        x[...] = betas[:, start:end].T
+        x -= center
+        x /= scale
+        yield start, end, x
+
+
+def default_file():
+    """Return the path of the bundled "AltumAge_net.npz"."""
+    return os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'data', 'AltumAge_net.npz')
+
+
+def cache_file():
+    """
+    Return the path of "AltumAge_net.npz" in the user cache directory
+    ("$XDG_CACHE_HOME/epical", by default "~/.cache/epical").
+    """
+    cache_dir = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_dir, 'epical', 'AltumAge_net.npz')
+
+
+def find_altum():
+    """
+    Return the path of the exported AltumAge model: the bundled file if it
+    exists, otherwise the cached file (see "cache_altum"), or None. A cached
+    file older than the Keras model ("AltumAge.h5") is ignored.
+    """
+    if os.path.exists(default_file()):
+        return default_file()
+    cached = cache_file()
+    if not os.path.exists(cached):
+        return None
+    h5_file = os.path.join(os.path.dirname(default_file()), 'AltumAge.h5')
+    if os.path.exists(h5_file) and \
+            os.path.getmtime(cached) < os.path.getmtime(h5_file):
+        return None
+    return cached
+
+
+def cache_altum(model, center, scale, cpgs=None):
+    """
+    Export a loaded Keras AltumAge model into the user cache directory (see
+    "cache_file"), so later runs use the NumPy forward pass.
+
+    Returns
+    -------
+    AltumNet, or None if the model cannot be exported (a warning is logged).
+    """
+    outfile = cache_file()
+    try:
+        os.makedirs(os.path.dirname(outfile), exist_ok=True)
+        save_altum(model, center, scale, outfile, cpgs=cpgs)
+    except (OSError, ValueError) as e:
+        logging.warning(
+            "Cannot save the AltumAge model to \"%s\" (%s). Use TensorFlow."
+            % (outfile, e))
+        return None
+    return load_altum(outfile)
+
+
+def load_altum(npz_file=None):
+    """
+    Load the exported AltumAge model.
+
+    Parameters
+    ----------
+    npz_file : str, optional
+        The ".npz" file created by "export_altum". If None, the bundled or
+        cached file is used (see "find_altum"). The default is None.
+
+    Returns
+    -------
+    AltumNet, or None if the file does not exist.
+    """
+    if npz_file is None:
+        npz_file = find_altum()
+    if npz_file is None or not os.path.exists(npz_file):
+        return None
+    with np.load(npz_file, allow_pickle=False) as dat:
+        if int(dat['version']) > FORMAT_VERSION:
+            raise ValueError(
+                "AltumAge file version %d is not supported (<= %d)" %
+                (int(dat['version']), FORMAT_VERSION))
+        return AltumNet({k: dat[k] for k in dat.files})
+
+
+if __name__ == '__main__':
+    # export the bundled Keras model (requires TensorFlow)
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    logging.basicConfig(level=logging.INFO)
+    export_altum(os.path.join(data_dir, 'AltumAge.h5'),
+                 os.path.join(data_dir, 'scaler.pkl'),
+                 default_file(),
+                 cpg_file=os.path.join(data_dir, 'multi_platform_cpgs.pkl'))
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Read DNA methylation (beta value) matrix files.
+
+>>> from dmc.betareader import read_beta
+>>> df = read_beta('Test1_blood_N20_EPICv1_beta.tsv', cpgs=['cg00075967'])
+>>> df.shape
+(1, 20)
+"""
+
+import os
+import csv
+import hashlib
+import itertools
+import logging
+import numpy as np
+import pandas as pd
+from dmc import ireader
+
+# strings (other than "nan") that represent missing values
+NA_VALUES = {'', 'NA', 'N/A', 'NaN', 'nan', 'NAN', 'NULL', 'null', 'None',
+             '#N/A', '-nan', '.'}
+
+
+def sniff_delimiter(header):
+    """
+    Detect the column separator from the header line.
+
+    Parameters
+    ----------
+    header : str
+        The first (header) line of the input file.
+
+    Returns
+    -------
+    str. The separator. None means "any whitespace".
+    """
+    try:
+        return csv.Sniffer().sniff(header, delimiters='\t,; ').delimiter
+    except csv.Error:
+        return None
+
+
+def _to_float(values):
+    """Convert a list of strings to floats. NA strings become NaN."""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except ValueError:
+        return np.array(
+            [np.nan if v.strip().strip('"') in NA_VALUES else
+             float(v.strip().strip('"')) for v in values], dtype=np.float64)
+
+
+def cache_key(beta_file):
+    """
+    Key of the cached beta file: SHA1 of the absolute path, size and
+    modification time of the file (and the data type of the cached matrix).
+    """
+    st = os.stat(beta_file)
+    key = '%s|%d|%d|float64' % (
+        os.path.abspath(beta_file), st.st_size, st.st_mtime_ns)
+    return hashlib.sha1(key.encode('utf8')).hexdigest()
+
+
+def cache_files(beta_file, cache_dir):
+    """Return the file names of the cached matrix, CpG IDs and sample IDs."""
+    prefix = os.path.join(cache_dir, cache_key(beta_file))
+    return (prefix + '.beta.npy', prefix + '.cpgs.npy',
+            prefix + '.samples.npy')
+
+
+def write_cache(df, beta_file, cache_dir):
+    """
+    Save the beta value matrix as binary files that can be memory-mapped.
+
+    Parameters
+    ----------
+    df : DataFrame
+        The beta value matrix (CpGs x samples).
+    beta_file : str
+        The original (text) beta file.
+    cache_dir : str
+        The cache directory.
+
+    Returns
+    -------
+    None.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    beta_npy, cpg_npy, sample_npy = cache_files(beta_file, cache_dir)
+    logging.info("Save binary cache of \"%s\" to: %s" % (beta_file, beta_npy))
+    np.save(cpg_npy, np.array(df.index, dtype=str))
+    np.save(sample_npy, np.array(df.columns, dtype=str))
+    # the matrix is saved as float64 (same values as reading the text file)
+    # and renamed at the end so that an incomplete cache is never used.
+    tmp = beta_npy + '.%d.tmp' % os.getpid()
+    with open(tmp, 'wb') as fh:
+        np.save(fh, np.ascontiguousarray(df.to_numpy(dtype=np.float64)))
+    os.replace(tmp, beta_npy)
+
+
+def select_rows(betas, all_cpgs, cpgs, n_extra=0, chunk_size=100000):
+    """
+    Find the rows of CpGs in a (memory-mapped) beta matrix.
+
+    Parameters
+    ----------
+    betas : numpy.ndarray or numpy.memmap
+        Beta values (CpGs x samples).
+    all_cpgs : pandas.Index
+        CpG IDs of the rows of "betas".
+    cpgs : list
+        CpG IDs to find.
+    n_extra : int, optional
+        Also select the first "n_extra" rows that have no missing values
+        (e.g., the KNN neighbor candidates, see
+        "imputation.impute_clock_cpgs"). These rows do not depend on "cpgs".
+        The default is 0.
+    chunk_size : int, optional
+        Number of rows scanned at a time for the extra rows. The default is
+        100000.
+
+    Returns
+    -------
+    numpy.ndarray. Row positions (sorted, i.e., in the input order).
+    """
+    pos = all_cpgs.get_indexer(pd.Index(list(cpgs)).unique())
+    pos = np.sort(pos[pos >= 0])
+    if n_extra > 0:
+        extra = []
+        for start in range(0, len(all_cpgs), chunk_size):
+            block = np.asarray(betas[start:start + chunk_size])
+            ok = ~np.isnan(block).any(axis=1)
+            extra.extend((np.where(ok)[0] + start)[:n_extra - len(extra)])
+            if len(extra) >= n_extra:
+                break
+        pos = np.union1d(pos, np.array(extra, dtype=pos.dtype))
+    return pos
+
+
+def read_cache(beta_file, cache_dir, cpgs=None, n_extra=0, dtype=None):
+    """
+    Read the beta values from the binary cache.
+
+    The matrix is opened with np.memmap so only the requested rows are
+    loaded into memory.
+
+    Parameters
+    ----------
+    beta_file : str
+        The original (text) beta file.
+    cache_dir : str
+        The cache directory.
+    cpgs : list, optional
+        CpG IDs to read. If None, all rows are read. The default is None.
+    n_extra : int, optional
+        See "read_beta". The default is 0.
+    dtype : numpy dtype, optional
+        See "read_beta". The default is None.
+
+    Returns
+    -------
+    Pandas DataFrame, or None if the file has not been cached.
+    """
+    beta_npy, cpg_npy, sample_npy = cache_files(beta_file, cache_dir)
+    if not os.path.exists(beta_npy):
+        return None
+    logging.info("Read binary cache of \"%s\": %s" % (beta_file, beta_npy))
+    if dtype is None:
+        dtype = np.float64 if cpgs is None else np.float32
+    betas = np.load(beta_npy, mmap_mode='r')
+    all_cpgs = pd.Index(np.load(cpg_npy))
+    samples = np.load(sample_npy)
+    if cpgs is None:
+        return pd.DataFrame(
+            np.array(betas, dtype=dtype), index=all_cpgs, columns=samples)
+
+    pos = select_rows(betas, all_cpgs, cpgs, n_extra=n_extra)
+    return pd.DataFrame(
+        np.array(betas[pos], dtype=dtype), index=all_cpgs[pos],
+        columns=samples)
+
+
+def read_beta(beta_file, cpgs=None, delimiter=None, n_extra=0,
+              dtype=None, cache_dir=None):
+    """
+    Read the beta value file into a DataFrame (CpGs x samples).
+
+    If "cpgs" is provided, the file is streamed and only rows whose first
+    field (CpG ID) is in "cpgs" are parsed. These rows are stored directly in
+    a preallocated NumPy array, so the time and memory are proportional to
+    the number of requested CpGs rather than the size of the file.
+
+    Parameters
+    ----------
+    beta_file : str
+        The input tabular structure file containing DNA methylation data.
+        Can be plain text or compressed (".gz", ".Z", ".z", ".bz", ".bz2",
+        ".bzip2") file.
+    cpgs : list, optional
+        CpG IDs to read. If None, all rows are read. The default is None.
+    delimiter : str, optional
+        Column separator. If None, it is detected from the header line.
+        The default is None.
+    n_extra : int, optional
+        Also keep the first "n_extra" rows that have no missing values (e.g.,
+        used as KNN neighbor candidates). These rows do not depend on "cpgs".
+        Only effective when "cpgs" is provided. The default is 0.
+    dtype : numpy dtype, optional
+        Data type of the beta values. If None, np.float32 is used when "cpgs"
+        is provided (only the clock rows are kept) and np.float64 otherwise,
+        so a full read gives the same values as "pandas.read_csv". The
+        default is None.
+    cache_dir : str, optional
+        If provided, the parsed matrix is saved into this directory as binary
+        files at the first time, and later reads of the same (unchanged) file
+        are served from these files. The default is None.
+
+    Returns
+    -------
+    Pandas DataFrame. The rows are in the order of the file.
+    """
+    if cache_dir is not None:
+        df = read_cache(
+            beta_file, cache_dir, cpgs=cpgs, n_extra=n_extra, dtype=dtype)
+        if df is None:
+            write_cache(read_beta(beta_file, delimiter=delimiter), beta_file,
+                        cache_dir)
+            df = read_cache(
+                beta_file, cache_dir, cpgs=cpgs, n_extra=n_extra, dtype=dtype)
+        return df
+
+    if dtype is None:
+        dtype = np.float64 if cpgs is None else np.float32
+    fh = ireader.nopen(beta_file)
+    header = fh.readline().decode('utf8').rstrip('\r\n')
+    if delimiter is None:
+        delimiter = sniff_delimiter(header)
+    logging.debug("Column separator: %r" % delimiter)
+
+    if cpgs is None:
+        fh.close()
+        df = pd.read_csv(
+            ireader.nopen(beta_file),
+            sep=r'\s+' if delimiter is None else delimiter, index_col=0,
+            na_values=list(NA_VALUES), engine='c')
+        return df.astype(dtype)
+
+    names = [i.strip('"') for i in header.split(delimiter)]
+    first = fh.readline()
+    # R-style header (no label for the first column)
+    if len(first.decode('utf8').rstrip('\r\n').split(delimiter)) == \
+            len(names) + 1:
+        names = [''] + names
+    n_col = len(names) - 1
+
+    wanted = set(cpgs)
+    sep = None if delimiter is None else delimiter.encode('utf8')
+    block = np.full((len(wanted) + n_extra, n_col), np.nan, dtype=dtype)
+    row_ids = []
+    seen = set()
+    # number of complete rows kept (clock CpGs included)
+    n_complete = 0
+    for l in itertools.chain([first], fh):
+        l = l.rstrip(b'\r\n')
+        if len(l.strip()) == 0:
+            continue
+        if sep is None:
+            key = l.split(None, 1)[0]
+        else:
+            key = l.split(sep, 1)[0]
+        key = key.strip(b'"').decode('utf8')
+        if key in seen or (key not in wanted and n_complete >= n_extra):
+            continue
+        values = l.decode('utf8').split(delimiter)[1:]
+        if len(values) != n_col:
+            logging.warning(
+                "Skip row \"%s\": %d values (expect %d)" %
+                (key, len(values), n_col))
+            continue
+        values = _to_float(values)
+        complete = not np.isnan(values).any()
+        if key in wanted:
+            wanted.discard(key)
+        elif not complete:
+            continue
+        if complete and n_complete < n_extra:
+            n_complete += 1
+        block[len(row_ids)] = values
+        row_ids.append(key)
+        seen.add(key)
+        if len(wanted) == 0 and n_complete >= n_extra:
+            break
+    fh.close()
+
+    df = pd.DataFrame(
+        block[:len(row_ids)], index=pd.Index(row_ids, name=names[0] or None),
+        columns=names[1:])
+    return df
@@ -4,73 +4,113 @@
 Created on Sun Dec 11 19:19:26 2022
 """
 
+import os
+import json
 import pickle
 from itertools import islice
 import importlib.resources
 
+# static metadata of the clock models. Used to build the help text without
+# unpickling the models. Regenerate with "build_manifest()" after a model
+# file (*.pkl) is added or changed.
+MANIFEST = 'clock_manifest.json'
+MANIFEST_ATTRS = ['name', 'info', 'organism', 'tissues', 't_platform',
+                  'age_range', 'age_unit', 'unit', 'ncpg', 'method', 'ref',
+                  'pubmed']
+_manifest = None
+
 
 def take(n, iterable):
     "Return first n items of the iterable as a list"
     return list(islice(iterable, n))
 
 
+def build_manifest(outfile=None):
+    """
+    Unpickle all clock models and save their metadata into a JSON file.
+
+    Parameters
+    ----------
+    outfile : str, optional
+        The output JSON file. If None, it is saved as "clock_manifest.json"
+        in the "dmc.data" directory. The default is None.
+
+    Returns
+    -------
+    dict. Model file name -> metadata.
+    """
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    if outfile is None:
+        outfile = os.path.join(data_dir, MANIFEST)
+    manifest = {}
+    for f_name in sorted(os.listdir(data_dir)):
+        if not f_name.endswith('.pkl'):
+            continue
+        with open(os.path.join(data_dir, f_name), 'rb') as fh:
+            dat = pickle.load(fh)
+        # not a clock model (e.g., "scaler.pkl")
+        if not hasattr(dat, 'coef'):
+            continue
+        manifest[f_name] = {
+            a: str(getattr(dat, a, 'N/A')) for a in MANIFEST_ATTRS}
+    with open(outfile, 'w') as fh:
+        json.dump(manifest, fh, indent=1, sort_keys=True)
+    return manifest
+
+
+def load_manifest():
+    """Return the metadata of all clock models (read only once)."""
+    global _manifest
+    if _manifest is None:
+        try:
+            with importlib.resources.open_text('dmc.data', MANIFEST) as fh:
+                _manifest = json.load(fh)
+        except FileNotFoundError:
+            _manifest = {}
+    return _manifest
+
+
 def clockinfo(infile):
     """
-    Load a pickle file (CpG clock data) and print its content.
+    Return the description of a clock model.
+
+    The metadata are taken from the static manifest ("clock_manifest.json").
+    The pickle file is only loaded if the model is not in the manifest.
 
     Parameters
     ----------
-    infile : pickle
-        Pickle file.
+    infile : str
+        Pickle file name of the clock model (e.g., "Horvath13.pkl").
 
     Returns
     -------
-    None
+    str. The description of the clock.
 
     """
-    fh = importlib.resources.open_binary('dmc.data', infile)
-    dat = pickle.load(fh)
+    dat = load_manifest().get(infile)
+    if dat is None:
+        try:
+            fh = importlib.resources.open_binary('dmc.data', infile)
+        except FileNotFoundError:
+            return 'Description: N/A (model file "%s" is not available).' % infile
+        obj = pickle.load(fh)
+        fh.close()
+        dat = {a: getattr(obj, a, 'N/A') for a in MANIFEST_ATTRS}
     information = f'\
-        Description: {dat.info}.\
-        Organism: {dat.organism}.\
-        Tissue: {dat.tissues}.\
-        Training data platforms: {dat.t_platform}.\
-        Training age range: {dat.age_range}.\
-        Training age unit: {dat.age_unit}.\
-        Prediction age unit: {dat.unit}.\
-        Clock CpGs: {dat.ncpg}.\
-        Method: {dat.method}.\
-        Reference: {dat.ref}.\
-        PubMed: {dat.pubmed}.'
+        Description: {dat["info"]}.\
+        Organism: {dat["organism"]}.\
+        Tissue: {dat["tissues"]}.\
+        Training data platforms: {dat["t_platform"]}.\
+        Training age range: {dat["age_range"]}.\
+        Training age unit: {dat["age_unit"]}.\
+        Prediction age unit: {dat["unit"]}.\
+        Clock CpGs: {dat["ncpg"]}.\
+        Method: {dat["method"]}.\
+        Reference: {dat["ref"]}.\
+        PubMed: {dat["pubmed"]}.'
     return information
 
 
 if __name__ == '__main__':
-    clockinfo('GA_Bohlin.pkl')
-    clockinfo('GA_Haftorn.pkl')
-    clockinfo('GA_Knight.pkl')
-    clockinfo('GA_Mayne.pkl')
-    clockinfo('GA_Lee_RPC.pkl')
-    clockinfo('GA_Lee_CPC.pkl')
-    clockinfo('GA_Lee_refined_RPC.pkl')
-
-    clockinfo('Hannum.pkl')
-    clockinfo('Horvath_2013.pkl')
-    clockinfo('Horvath_2018.pkl')
-    clockinfo('Lu_DNAmTL.pkl')
-    clockinfo('Levine.pkl')
-    clockinfo('Ped_McEwen.pkl')
-    clockinfo('Ped_Wu.pkl')
-    clockinfo('Zhang_BLUP.pkl')
-    clockinfo('Zhang_EN.pkl')
-    clockinfo('AltumAge_cpg.pkl')
-    clockinfo('MEAT.pkl')
-
-    clockinfo('liver_mm10.pkl')
-    clockinfo('liver_mm39.pkl')
-    clockinfo('blood_mm10.pkl')
-    clockinfo('blood_mm39.pkl')
-    clockinfo('YOMT_mm10.pkl')
-    clockinfo('YOMT_mm39.pkl')
-    clockinfo('WLMT_mm10.pkl')
-    clockinfo('WLMT_mm39.pkl')
+    # regenerate the manifest from the bundled models
+    build_manifest()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compact, array-backed clock models.
+
+A clock model is saved as a ".npz" file (no pickle) that holds the CpG IDs
+(NumPy string array), the coefficients (float64 vector), the intercept, the
+transform type and the metadata (JSON string).
+
+>>> from dmc.clockmodel import load_clock
+>>> m = load_clock('Horvath13')
+>>> m.ncpg
+353
+>>> m.transform
+'horvath'
+>>> m.coef_series().head(2)
+cg00075967    0.129337
+cg00374717    0.005018
+Name: Coef, dtype: float64
+"""
+
+import os
+import json
+import pickle
+import logging
+import importlib.resources
+import numpy as np
+import pandas as pd
+
+# version of the ".npz" model format
+FORMAT_VERSION = 1
+
+# metadata fields (same names as the attributes of methyldat.MakeMethylObj)
+META_FIELDS = ['info', 'tissues', 'unit', 'ref', 'pubmed', 'method',
+               'organism', 't_platform', 'age_range', 'age_unit']
+
+# how the linear score (sum(beta * coef) + intercept) is converted into the
+# clock's output.
+#   linear: no transformation
+#   horvath: Horvath's anti.trafo (adult_age = 20)
+#   ped_wu: Horvath's anti.trafo (adult_age = 48), then month -> year
+#   zscore: betas are standardized per sample before the linear score
+#   wlmt, yomt, mmliver, mmblood: mouse clocks (see utils.apply_transform)
+#   dnn: deep neural network (AltumAge)
+#   external: computed by an external package (DunedinPACE)
+TRANSFORMS = {
+    'Horvath13': 'horvath', 'Horvath13_shrunk': 'horvath',
+    'Horvath18': 'horvath', 'MEAT': 'horvath', 'PedBE': 'horvath',
+    'Cortical': 'horvath', 'Ped_Wu': 'ped_wu',
+    'Zhang_EN': 'zscore', 'Zhang_BLUP': 'zscore',
+    'Levine': 'linear', 'Hannum': 'linear', 'Lu_DNAmTL': 'linear',
+    'GA_Knight': 'linear', 'GA_Mayne': 'linear', 'GA_Bohlin': 'linear',
+    'GA_Haftorn': 'linear', 'GA_Lee_CPC': 'linear', 'GA_Lee_RPC': 'linear',
+    'GA_Lee_rRPC': 'linear', 'Weidner': 'linear', 'Lin': 'linear',
+    'ENCen100': 'linear', 'ENCen40': 'linear',
+    'WLMT_mm10': 'wlmt', 'WLMT_mm39': 'wlmt',
+    'YOMT_mm10': 'yomt', 'YOMT_mm39': 'yomt',
+    'mmLiver_mm10': 'mmliver', 'mmLiver_mm39': 'mmliver',
+    'mmBlood_mm10': 'mmblood', 'mmBlood_mm39': 'mmblood',
+    'AltumAge': 'dnn', 'DunedinPACE': 'external',
+}
+
+
+def _to_json(value):
+    """Convert metadata into JSON-compatible values (NaN becomes None)."""
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_to_json(i) for i in value]
+    if isinstance(value, (float, np.floating)):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+class ClockModel():
+    """
+    DNA methylation clock model.
+
+    Parameters
+    ----------
+    name : str
+        Name of the clock.
+    cpgs : array_like
+        CpG IDs of the clock.
+    coef : array_like
+        Coefficients of the CpGs (same order as "cpgs"). Empty if the clock
+        is not a linear model (e.g., AltumAge).
+    intercept : float
+        Intercept of the linear model. NaN if not applicable.
+    transform : str
+        Transform type (see TRANSFORMS).
+    **meta :
+        Metadata (see META_FIELDS).
+    """
+    __slots__ = ['name', 'cpgs', 'coef', 'intercept', 'transform'] + \
+        META_FIELDS
+
+    def __init__(self, name, cpgs, coef, intercept, transform='linear',
+                 **meta):
+        self.name = name
+        self.cpgs = np.asarray(cpgs, dtype=str)
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.transform = transform
+        for field in META_FIELDS:
+            setattr(self, field, meta.get(field, ''))
+        if len(self.coef) not in (0, len(self.cpgs)):
+            raise ValueError(
+                "%s: %d CpGs but %d coefficients" %
+                (name, len(self.cpgs), len(self.coef)))
+
+    @property
+    def ncpg(self):
+        """Number of clock CpGs ("N/A" if the model has no CpGs)."""
+        return len(self.cpgs) if len(self.cpgs) > 0 else 'N/A'
+
+    def coef_series(self):
+        """Return the coefficients as a Series indexed by CpG IDs."""
+        return pd.Series(self.coef, index=self.cpgs[:len(self.coef)],
+                         name='Coef')
+
+    def save(self, outfile, **arrays):
+        """
+        Save the model into a ".npz" file.
+
+        Other arrays (e.g., the EPM rates, see "dmc.epm") can be saved into
+        the same file. They are ignored by "load".
+        """
+        meta = {field: getattr(self, field) for field in META_FIELDS}
+        np.savez_compressed(
+            outfile, version=np.array(FORMAT_VERSION),
+            name=np.array(self.name), cpgs=self.cpgs, coef=self.coef,
+            intercept=np.array(self.intercept),
+            transform=np.array(self.transform),
+            meta=np.array(json.dumps(meta)), **arrays)
+
+    @classmethod
+    def load(cls, infile):
+        """Load the model from a ".npz" file (file name or file object)."""
+        with np.load(infile, allow_pickle=False) as dat:
+            version = int(dat['version'])
+            if version > FORMAT_VERSION:
+                raise ValueError(
+                    "Model format version %d is not supported (<= %d)" %
+                    (version, FORMAT_VERSION))
+            return cls(str(dat['name']), dat['cpgs'], dat['coef'],
+                       float(dat['intercept']), str(dat['transform']),
+                       **json.loads(str(dat['meta'])))
+
+    @classmethod
+    def from_methylobj(cls, obj, transform=None):
+        """
+        Convert a methyldat.MakeMethylObj object into a ClockModel.
+
+        If "transform" is None, it is looked up from TRANSFORMS by the
+        clock's name.
+        """
+        if transform is None:
+            transform = TRANSFORMS.get(obj.name, 'linear')
+        if len(obj.coef) > 0:
+            coef = [obj.coef[i] for i in obj.cpgs]
+        else:
+            coef = []
+        try:
+            intercept = float(obj.Intercept)
+        except (TypeError, ValueError):
+            intercept = np.nan
+        meta = {field: _to_json(getattr(obj, field, ''))
+                for field in META_FIELDS}
+        return cls(obj.name, obj.cpgs, coef, intercept, transform, **meta)
+
+
+def convert_pkl(pkl_file, npz_file, transform=None):
+    """
+    Convert a pickled clock model (methyldat.MakeMethylObj) into ".npz".
+
+    Parameters
+    ----------
+    pkl_file : str
+        The pickle file.
+    npz_file : str
+        The output ".npz" file.
+    transform : str, optional
+        Transform type. If None, it is looked up from TRANSFORMS. The default
+        is None.
+
+    Returns
+    -------
+    ClockModel.
+    """
+    with open(pkl_file, 'rb') as fh:
+        obj = pickle.load(fh)
+    model = ClockModel.from_methylobj(obj, transform=transform)
+    model.save(npz_file)
+    return model
+
+
+def convert_all(data_dir=None):
+    """
+    Convert all clock models (*.pkl) in "data_dir" into ".npz" files.
+
+    The model file name (without ".pkl") is used as the key to look up the
+    transform type. The default "data_dir" is the "dmc/data" directory.
+    """
+    if data_dir is None:
+        data_dir = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), 'data')
+    for f_name in sorted(os.listdir(data_dir)):
+        if not f_name.endswith('.pkl'):
+            continue
+        key = f_name[:-4]
+        if key not in TRANSFORMS:
+            # not a clock model (e.g., "scaler.pkl")
+            continue
+        logging.info("Convert %s" % f_name)
+        convert_pkl(os.path.join(data_dir, f_name),
+                    os.path.join(data_dir, key + '.npz'),
+                    transform=TRANSFORMS[key])
+
+
+def load_clock(model_file):
+    """
+    Load a clock model bundled in "dmc.data".
+
+    Parameters
+    ----------
+    model_file : str
+        Model name (e.g., "Horvath13" or "WLMT_mm10"). The suffix ".pkl" or
+        ".npz" is ignored. The ".npz" file is used if it exists; otherwise
+        the ".pkl" file is loaded and converted.
+
+    Returns
+    -------
+    ClockModel.
+    """
+    key = model_file
+    for suffix in ('.pkl', '.npz'):
+        if key.endswith(suffix):
+            key = key[:-len(suffix)]
+    try:
+        with importlib.resources.open_binary('dmc.data', key + '.npz') as fh:
+            return ClockModel.load(fh)
+    except FileNotFoundError:
+        pass
+    with importlib.resources.open_binary('dmc.data', key + '.pkl') as fh:
+        obj = pickle.load(fh)
+    return ClockModel.from_methylobj(obj, transform=TRANSFORMS.get(key))
+
+
+if __name__ == '__main__':
+    # regenerate the ".npz" models from the bundled pickle files
+    convert_all()
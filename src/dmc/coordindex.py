@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Coordinate index of the mouse clock CpGs.
+
+Mouse clock CpGs are keyed by "chrom_position" (1-based position of the C).
+RRBS/WGBS data is often off by one or reported at the C of the other strand
+(position + 1), so matching the IDs as strings loses sites. The index keeps
+the positions of each chromosome as a sorted int64 array, and input sites
+are matched in bulk with "numpy.searchsorted":
+
+    exact    : same position
+    adjacent : within 1 bp (the other strand of the CpG)
+    window   : within "window" bp
+
+An input site is assigned to the nearest clock CpG (ties go to the upstream
+CpG).
+
+>>> from dmc.coordindex import CoordIndex
+>>> index = CoordIndex(['chr10_111559529', 'chr10_115250413'])
+>>> index.match(pd.Series(['chr10', 'chr10']), [111559530, 5], 'adjacent')
+(array([ 0, -1]), array([1, 0]))
+"""
+
+import numpy as np
+import pandas as pd
+
+# matching mode -> maximum distance (bp). None: given by "window".
+MATCH_MODES = {'exact': 0, 'adjacent': 1, 'window': None}
+
+
+def split_ids(cpg_ids):
+    """
+    Split coordinate IDs into chromosomes and positions (vectorized).
+
+    Returns
+    -------
+    tuple. (chromosomes (Series), positions (float64, NaN if the ID is not
+    "chrom_position")).
+    """
+    if len(cpg_ids) == 0:
+        return pd.Series([], dtype=str), np.array([], dtype=np.float64)
+    parts = pd.Series(np.asarray(cpg_ids, dtype=str)).str.rpartition('_')
+    positions = pd.to_numeric(parts[2], errors='coerce').to_numpy(
+        dtype=np.float64, copy=True)
+    positions[(parts[1] == '').to_numpy()] = np.nan
+    return parts[0], positions
+
+
+def max_distance(mode, window=0):
+    """Return the maximum distance (bp) of a matching mode."""
+    if mode not in MATCH_MODES:
+        raise ValueError(
+            "Unknown matching mode: %s (must be one of %s)" %
+            (mode, ', '.join(MATCH_MODES)))
+    if MATCH_MODES[mode] is None:
+        return int(window)
+    return MATCH_MODES[mode]
+
+
+class CoordIndex():
+    """
+    Sorted per-chromosome index of coordinate-keyed CpGs.
+
+    Parameters
+    ----------
+    cpgs : array_like
+        CpG IDs in the format of "chrom_position" (1-based position).
+
+    Attributes
+    ----------
+    cpgs : pandas.Index
+        The CpG IDs (in the input order).
+    chroms : dict
+        Chromosome -> (sorted positions, positions of these CpGs in "cpgs").
+    """
+    __slots__ = ['cpgs', 'chroms']
+
+    def __init__(self, cpgs):
+        self.cpgs = pd.Index(np.asarray(cpgs, dtype=str))
+        chroms, positions = split_ids(self.cpgs)
+        if np.isnan(positions).any():
+            raise ValueError(
+                "CpG IDs must be \"chrom_position\": %s" %
+                self.cpgs[np.isnan(positions)][0])
+        positions = positions.astype(np.int64)
+        self.chroms = {}
+        for chrom, rows in chroms.groupby(chroms, sort=False).indices.items():
+            order = np.argsort(positions[rows], kind='stable')
+            self.chroms[chrom] = (positions[rows][order], rows[order])
+
+    def __len__(self):
+        return len(self.cpgs)
+
+    def match(self, chroms, positions, mode='exact', window=0):
+        """
+        Find the nearest indexed CpG of each site.
+
+        Parameters
+        ----------
+        chroms : array_like
+            Chromosomes of the sites.
+        positions : array_like
+            1-based positions of the sites. NaN positions are not matched.
+        mode : str, optional
+            One of MATCH_MODES. The default is 'exact'.
+        window : int, optional
+            Maximum distance (bp) of the 'window' mode. The default is 0.
+
+        Returns
+        -------
+        tuple. (positions of the matched CpGs in "cpgs" (-1 if none),
+        distances (bp, 0 if none)).
+        """
+        max_dist = max_distance(mode, window)
+        chroms = pd.Series(np.asarray(chroms, dtype=object))
+        positions = np.asarray(positions, dtype=np.float64)
+        rows = np.full(len(chroms), -1, dtype=np.intp)
+        dists = np.zeros(len(chroms), dtype=np.int64)
+        valid = ~np.isnan(positions)
+        for chrom, query in chroms[valid].groupby(
+                chroms[valid], sort=False).indices.items():
+            if chrom not in self.chroms:
+                continue
+            sorted_pos, sorted_rows = self.chroms[chrom]
+            query = np.flatnonzero(valid)[query]
+            pos = positions[query].astype(np.int64)
+            right = np.searchsorted(sorted_pos, pos, side='left')
+            left = right - 1
+            # distances to the upstream and downstream CpGs
+            d_left = np.where(
+                left >= 0, pos - sorted_pos[np.maximum(left, 0)],
+                np.iinfo(np.int64).max)
+            d_right = np.where(
+                right < len(sorted_pos),
+                sorted_pos[np.minimum(right, len(sorted_pos) - 1)] - pos,
+                np.iinfo(np.int64).max)
+            # exact matches are found by "right" (side='left')
+            use_right = d_right < d_left
+            nearest = np.where(use_right, right, left)
+            dist = np.where(use_right, d_right, d_left)
+            hit = dist <= max_dist
+            rows[query[hit]] = sorted_rows[nearest[hit]]
+            dists[query[hit]] = dist[hit]
+        return rows, dists
+
+    def match_ids(self, cpg_ids, mode='exact', window=0):
+        """Same as "match" for "chrom_position" IDs."""
+        chroms, positions = split_ids(cpg_ids)
+        return self.match(chroms, positions, mode=mode, window=window)
+
+    def best_sites(self, cpg_ids, mode='exact', window=0):
+        """
+        Find the best input site of each indexed CpG.
+
+        Parameters
+        ----------
+        cpg_ids : array_like
+            IDs ("chrom_position") of the input sites.
+        mode, window :
+            See "match".
+
+        Returns
+        -------
+        numpy.ndarray. For each CpG in "cpgs", the position of the nearest
+        input site in "cpg_ids" (-1 if none). Ties go to the first site.
+        """
+        rows, dists = self.match_ids(cpg_ids, mode=mode, window=window)
+        best = np.full(len(self.cpgs), -1, dtype=np.intp)
+        sites = np.flatnonzero(rows >= 0)
+        if len(sites) > 0:
+            # sort by CpG, then distance, then input order
+            order = np.lexsort((sites, dists[sites], rows[sites]))
+            sites = sites[order]
+            first = np.ones(len(sites), dtype=bool)
+            first[1:] = rows[sites][1:] != rows[sites][:-1]
+            best[rows[sites[first]]] = sites[first]
+        return best
+
+    def candidate_ids(self, mode='exact', window=0):
+        """
+        Return all IDs that can match an indexed CpG.
+
+        Used to read only these rows from a beta file (see
+        "methylclocks.read_clock_input").
+        """
+        max_dist = max_distance(mode, window)
+        chroms, positions = split_ids(self.cpgs)
+        positions = positions.astype(np.int64)
+        ids = []
+        for offset in range(-max_dist, max_dist + 1):
+            ids.append(chroms + '_' + pd.Series(positions + offset).astype(str))
+        return pd.Index(pd.concat(ids, ignore_index=True)).unique()
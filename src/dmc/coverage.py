@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Read per-sample methylation coverage files (RRBS/WGBS) for the mouse clocks.
+
+Each coverage file (tens of millions of sites) is streamed in chunks, and
+only the sites of the clock are kept, so the genome-wide matrix is never
+built. Sites are matched to the clock CpGs by the coordinate index (see
+"coordindex.CoordIndex"); the reads of all sites matched to a CpG (e.g., both
+strands with "adjacent" matching) are added up.
+
+Supported formats (".gz" and other compressed files are supported):
+
+    bismark   : Bismark coverage file (".cov"). chrom, start (1-based), end,
+                methylation percentage, count methylated, count unmethylated
+    bedgraph  : bedGraph (e.g., Bismark ".bedGraph"). chrom, start (0-based),
+                end, methylation percentage. There are no read counts, so the
+                minimum coverage is not applied.
+    bedmethyl : ENCODE bedMethyl. chrom, start (0-based), end, name, score,
+                strand, thick start, thick end, color, coverage, methylation
+                percentage
+
+>>> from dmc.coverage import read_manifest, read_coverage_files
+>>> files = read_manifest('samples.txt')
+>>> beta_df = read_coverage_files(files, clock_cpgs, min_cov=5)
+"""
+
+import os
+import logging
+import numpy as np
+import pandas as pd
+from dmc import ireader
+from dmc.coordindex import CoordIndex
+from dmc.scheduler import run_pool, worker_state
+
+# number of lines read at a time
+CHUNK_SIZE = 1000000
+
+# format -> (columns to read, 0-based start?)
+FORMATS = {
+    'bismark': ([0, 1, 4, 5], False),
+    'bedgraph': ([0, 1, 3], True),
+    'bedmethyl': ([0, 1, 9, 10], True),
+}
+
+# file name suffix -> format
+SUFFIXES = [('.cov', 'bismark'), ('.bedgraph', 'bedgraph'),
+            ('.bg', 'bedgraph'), ('.bedmethyl', 'bedmethyl'),
+            ('.bed', 'bedmethyl')]
+
+# compressed file suffixes (see "ireader.nopen")
+COMPRESSED = ('.gz', '.z', '.bz', '.bz2', '.bzip2')
+
+# header lines of BED-like files
+HEADER_PREFIXES = ('track', 'browser', '#')
+
+
+def guess_format(cov_file):
+    """Guess the coverage format from the file name (None if unknown)."""
+    name = cov_file.lower()
+    for suffix in COMPRESSED:
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    for suffix, fmt in SUFFIXES:
+        if name.endswith(suffix):
+            return fmt
+    return None
+
+
+def count_header(cov_file):
+    """Count the header lines ("track", "browser" or "#") of a file."""
+    n = 0
+    for line in ireader.reader(cov_file):
+        if not line.startswith(HEADER_PREFIXES):
+            break
+        n += 1
+    return n
+
+
+def read_coverage(cov_file, index, fmt=None, min_cov=5, match='exact',
+                  window=0, chunk_size=CHUNK_SIZE):
+    """
+    Read the methylation levels of indexed sites from a coverage file.
+
+    Parameters
+    ----------
+    cov_file : str
+        The coverage file.
+    index : CoordIndex
+        CpGs to keep.
+    fmt : str, optional
+        One of FORMATS. If None, it is guessed from the file name (see
+        "guess_format"); unknown names are read as "bismark". The default is
+        None.
+    min_cov : int, optional
+        CpGs covered by fewer reads are ignored. The default is 5.
+    match : str, optional
+        How sites are matched to the CpGs ("exact", "adjacent" or "window",
+        see "CoordIndex.match"). The default is 'exact'.
+    window : int, optional
+        Maximum distance (bp) of the "window" matching. The default is 0.
+    chunk_size : int, optional
+        Number of lines read at a time. The default is CHUNK_SIZE.
+
+    Returns
+    -------
+    numpy.ndarray. Methylation levels (0 to 1) of the indexed CpGs (NaN if
+    not found or not covered). For bedGraph files (no read counts), the
+    levels of the matched sites are averaged.
+    """
+    if fmt is None:
+        fmt = guess_format(cov_file) or 'bismark'
+    if fmt not in FORMATS:
+        raise ValueError("Unknown coverage format: %s" % fmt)
+    usecols, zero_based = FORMATS[fmt]
+    n_meth = np.zeros(len(index))
+    n_total = np.zeros(len(index))
+    n_line = 0
+    n_header = count_header(cov_file)
+    with ireader.nopen(cov_file) as fh, pd.read_csv(
+            fh, sep='\t', header=None, usecols=usecols, skiprows=n_header,
+            dtype={0: str}, chunksize=chunk_size) as reader:
+        for chunk in reader:
+            n_line += len(chunk)
+            pos = chunk[1].to_numpy(dtype=np.int64)
+            if zero_based:
+                pos = pos + 1
+            rows, _ = index.match(chunk[0], pos, mode=match, window=window)
+            hit = rows >= 0
+            if not hit.any():
+                continue
+            chunk = chunk[hit]
+            if fmt == 'bismark':
+                meth = chunk[4].to_numpy(dtype=np.float64)
+                total = meth + chunk[5].to_numpy(dtype=np.float64)
+            elif fmt == 'bedmethyl':
+                total = chunk[9].to_numpy(dtype=np.float64)
+                meth = chunk[10].to_numpy(dtype=np.float64) / 100 * total
+            else:
+                total = np.ones(len(chunk))
+                meth = chunk[3].to_numpy(dtype=np.float64) / 100
+            np.add.at(n_meth, rows[hit], meth)
+            np.add.at(n_total, rows[hit], total)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values = n_meth / n_total
+    values[n_total == 0] = np.nan
+    n_found = int((n_total > 0).sum())
+    if fmt != 'bedgraph':
+        values[n_total < min_cov] = np.nan
+    logging.debug(
+        "%s: %d lines, %d CpGs found, %d CpGs with coverage >= %d" %
+        (cov_file, n_line, n_found, (~np.isnan(values)).sum(), min_cov))
+    return values
+
+
+def _read_task(task):
+    """Read one coverage file (see "read_coverage_files")."""
+    w = worker_state()
+    return read_coverage(task, w['index'], fmt=w['fmt'], min_cov=w['min_cov'],
+                         match=w['match'], window=w['window'])
+
+
+def read_coverage_files(files, cpgs, fmt=None, min_cov=5, match='exact',
+                        window=0, n_jobs=1):
+    """
+    Build the (clock CpGs x samples) beta matrix from coverage files.
+
+    Parameters
+    ----------
+    files : dict
+        Sample ID -> coverage file (see "read_manifest").
+    cpgs : array_like
+        CpG IDs ("chrom_position") to keep.
+    fmt : str, optional
+        Coverage format (see "read_coverage"). The default is None.
+    min_cov : int, optional
+        Minimum number of reads. The default is 5.
+    match, window :
+        See "read_coverage".
+    n_jobs : int, optional
+        Number of files read in parallel. The default is 1.
+
+    Returns
+    -------
+    DataFrame. CpGs found in at least one sample x samples.
+    """
+    index = CoordIndex(cpgs)
+    samples = list(files)
+    logging.info(
+        "Read %d coverage files (%d CpGs, minimum coverage %d, %s "
+        "matching) ..." % (len(samples), len(index), min_cov, match))
+    columns = run_pool(
+        _read_task, [files[s] for s in samples], n_jobs,
+        state={'index': index, 'fmt': fmt, 'min_cov': min_cov,
+               'match': match, 'window': window})
+    df = pd.DataFrame(np.column_stack(columns), index=index.cpgs,
+                      columns=samples)
+    df = df.dropna(how='all')
+    logging.info(
+        "%d of %d CpGs are covered in at least one sample" %
+        (len(df), len(index)))
+    return df
+
+
+def read_manifest(manifest):
+    """
+    Read the list of coverage files.
+
+    The manifest has one sample per line: "sample_ID<TAB>file" or just
+    "file" (the sample ID is the file name without suffixes). Relative paths
+    are relative to the directory of the manifest. Empty lines and lines
+    starting with "#" are ignored.
+
+    Returns
+    -------
+    dict. Sample ID -> coverage file.
+    """
+    base = os.path.dirname(os.path.abspath(manifest))
+    files = {}
+    with open(manifest) as fh:
+        for line in fh:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fields = line.split('\t') if '\t' in line else line.split()
+            if len(fields) >= 2:
+                sample, path = fields[0], fields[1]
+            else:
+                path = fields[0]
+                sample = os.path.basename(path).split('.')[0]
+            if not os.path.isabs(path):
+                path = os.path.join(base, path)
+            if sample in files:
+                raise ValueError(
+                    "Duplicated sample ID in \"%s\": %s" % (manifest, sample))
+            files[sample] = path
+    return files
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Train Epigenetic Pacemaker (EPM) models.
+
+The cross-validation folds of "EpigeneticPacemakerCV" are fitted in parallel
+over a pool of worker processes. The beta values of the selected CpGs are
+put into shared memory once, and each worker fits one fold with
+"EpigeneticPacemaker" (so the results are the same as fitting the folds one
+after another).
+
+>>> from dmc.epm import fit_epm_cv, predict_epm
+>>> fit = fit_epm_cv(train_betas, train_ages, cv_folds=10, n_jobs=10)
+>>> fit['predicted_states']  # training samples (when left out)
+>>> predict_epm(test_betas, fit['rates'], fit['intercepts'])
+>>> save_epm('EPM_model.npz', cpgs, fit['rates'], fit['intercepts'])
+
+The training state (correlation statistics of all CpGs, and the beta values
+and fitted states of the training samples) is saved by "save_state", so the
+model can be updated with new samples ("update_state") without reading the
+old samples again.
+"""
+
+import time
+import logging
+import numpy as np
+import pandas as pd
+from dmc.clockmodel import ClockModel
+from dmc.scheduler import run_pool, worker_state
+from dmc.utils import correlation_stats, add_stats, pearson_from_stats
+
+# version of the EPM state file
+STATE_VERSION = 1
+
+# CpGs with |r| > (pcc_cut - CANDIDATE_MARGIN) keep the beta values of the
+# training samples in the state file, so they can be selected when the model
+# is updated with new samples.
+CANDIDATE_MARGIN = 0.1
+
+# correlation statistics saved in the state file
+STAT_KEYS = ('n', 'sum_y', 'sum_yy', 'sum_x', 'sum_xx', 'sum_xy')
+
+
+def cv_groups(n_sample, folds):
+    """
+    Test samples of each fold (same as "EpigeneticPacemakerCV").
+
+    Parameters
+    ----------
+    n_sample : int
+        Number of samples.
+    folds : int
+        Number of folds. A negative value means leave-one-out.
+
+    Returns
+    -------
+    list of lists of sample indices.
+    """
+    from EpigeneticPacemaker.EpigeneticPacemakerCV import \
+        EpigeneticPacemakerCV
+    return EpigeneticPacemakerCV(cv_folds=folds).get_cv_folds(n_sample)
+
+
+def _fit_fold(task):
+    """Fit one fold (see "fit_epm_cv")."""
+    from EpigeneticPacemaker.EpigeneticPacemaker import EpigeneticPacemaker
+    fold, test_indices = task
+    w = worker_state()
+    meth_array = w['betas']
+    states = w['init_states']
+    train_indices = np.setdiff1d(np.arange(len(states)), test_indices)
+    start = time.time()
+    epm = EpigeneticPacemaker(
+        iter_limit=w['iter_limit'], error_tolerance=w['error_tolerance'])
+    epm.fit(meth_array=meth_array[:, train_indices],
+            states=states[train_indices])
+    test_states = epm.predict(meth_array=meth_array[:, test_indices])
+    return {
+        'fold': fold,
+        'test_indices': test_indices,
+        'test_states': test_states,
+        'rates': epm.EPM['EPM_rates'],
+        'intercepts': epm.EPM['EPM_intercepts'],
+        'iterations': epm.EPM['EPM_iter'],
+        'MC_error': epm.EPM['MC_error'],
+        'EPM_error': epm.EPM['EPM_error'],
+        'seconds': time.time() - start}
+
+
+def fit_epm_cv(meth_array, states, cv_folds=10, iter_limit=100,
+               error_tolerance=1e-5, n_jobs=1, init_states=None):
+    """
+    Fit the EPM model with cross-validation.
+
+    Same as "EpigeneticPacemakerCV.fit": the model of each fold is fitted
+    without its test samples, the test samples are predicted by this model,
+    and the final rates and intercepts are the means over the folds.
+
+    Parameters
+    ----------
+    meth_array : numpy.ndarray
+        Beta values (selected CpGs x samples).
+    states : numpy.ndarray
+        Ages of the samples.
+    cv_folds : int, optional
+        Number of folds. The default is 10.
+    iter_limit : int, optional
+        Maximum number of EM iterations. The default is 100.
+    error_tolerance : float, optional
+        EM stops when the error improves less than this. The default is
+        1e-5.
+    n_jobs : int, optional
+        Number of worker processes (folds fitted at the same time). The
+        default is 1.
+    init_states : numpy.ndarray, optional
+        Initial states of the EM iterations (e.g., the states fitted before
+        new samples were added, see "update_state"). If None, "states" (the
+        ages) are used. The default is None.
+
+    Returns
+    -------
+    dict. 'rates' and 'intercepts' (per CpG), 'predicted_states' (per
+    sample, predicted by the fold in which it was left out) and 'folds'
+    (DataFrame of the number of EM iterations, errors and run time of each
+    fold).
+    """
+    states = np.asarray(states, dtype=np.float64)
+    if init_states is None:
+        init_states = states
+    groups = cv_groups(len(states), cv_folds)
+    results = run_pool(
+        _fit_fold, list(enumerate(groups)), n_jobs,
+        arrays={'betas': meth_array,
+                'init_states': np.asarray(init_states, dtype=np.float64)},
+        state={'iter_limit': iter_limit, 'error_tolerance': error_tolerance})
+
+    predicted_states = np.empty(len(states))
+    for res in results:
+        predicted_states[res['test_indices']] = res['test_states']
+        logging.info(
+            "Fold %d: %d test samples, %d EM iterations (%s), error %g -> %g, "
+            "%.1f seconds" %
+            (res['fold'] + 1, len(res['test_indices']), res['iterations'],
+             'iteration limit' if res['iterations'] >= iter_limit else
+             'converged', res['MC_error'], res['EPM_error'], res['seconds']))
+    folds = pd.DataFrame(
+        [(res['fold'] + 1, len(states) - len(res['test_indices']),
+          len(res['test_indices']), res['iterations'],
+          res['iterations'] < iter_limit, res['MC_error'], res['EPM_error'],
+          res['seconds']) for res in results],
+        columns=['fold', 'n_train', 'n_test', 'iterations', 'converged',
+                 'MC_error', 'EPM_error', 'seconds']).set_index('fold')
+    return {
+        'rates': np.mean([res['rates'] for res in results], axis=0),
+        'intercepts': np.mean([res['intercepts'] for res in results], axis=0),
+        'predicted_states': predicted_states,
+        'folds': folds}
+
+
+def predict_epm(meth_array, rates, intercepts):
+    """
+    Predict the epigenetic states (ages) of samples.
+
+    Parameters
+    ----------
+    meth_array : numpy.ndarray
+        Beta values (CpGs x samples), in the order of "rates".
+    rates : numpy.ndarray
+        EPM rates of the CpGs.
+    intercepts : numpy.ndarray
+        EPM intercepts of the CpGs.
+
+    Returns
+    -------
+    numpy.ndarray.
+    """
+    rates = np.asarray(rates)
+    return (rates @ meth_array - np.sum(rates * intercepts)) / \
+        np.sum(rates ** 2)
+
+
+def epm_model(cpgs, rates, intercepts, **meta):
+    """
+    Convert an EPM model into a (linear) ClockModel.
+
+    The EPM state of a sample, (sum(rates * betas) - sum(rates * intercepts))
+    / sum(rates ** 2), is a linear function of the betas, so the model is
+    saved with coef = rates / sum(rates ** 2) and intercept =
+    -sum(rates * intercepts) / sum(rates ** 2).
+
+    Parameters
+    ----------
+    cpgs : array_like
+        The selected CpGs.
+    rates : numpy.ndarray
+        EPM rates of the CpGs.
+    intercepts : numpy.ndarray
+        EPM intercepts of the CpGs.
+    **meta :
+        Metadata (see clockmodel.META_FIELDS).
+
+    Returns
+    -------
+    ClockModel.
+    """
+    rates = np.asarray(rates, dtype=np.float64)
+    intercepts = np.asarray(intercepts, dtype=np.float64)
+    scale = np.sum(rates ** 2)
+    meta.setdefault('method', 'Epigenetic Pacemaker')
+    return ClockModel('EPM', cpgs, rates / scale,
+                      -np.sum(rates * intercepts) / scale, 'linear', **meta)
+
+
+def save_epm(outfile, cpgs, rates, intercepts, **meta):
+    """
+    Save an EPM model into a ".npz" file (see "epm_model").
+
+    The EPM rates and intercepts are saved too ("epm_rates" and
+    "epm_intercepts"), so the model can also be used by "load_epm".
+
+    Returns
+    -------
+    ClockModel.
+    """
+    model = epm_model(cpgs, rates, intercepts, **meta)
+    model.save(outfile, epm_rates=np.asarray(rates, dtype=np.float64),
+               epm_intercepts=np.asarray(intercepts, dtype=np.float64))
+    return model
+
+
+def load_epm(infile):
+    """
+    Load an EPM model saved by "save_epm".
+
+    Returns
+    -------
+    tuple. (ClockModel, rates, intercepts).
+    """
+    model = ClockModel.load(infile)
+    with np.load(infile, allow_pickle=False) as dat:
+        if 'epm_rates' not in dat.files:
+            raise ValueError("\"%s\" is not an EPM model" % infile)
+        return model, dat['epm_rates'], dat['epm_intercepts']
+
+
+def save_state(outfile, cpgs, stats, pcc_cut, betas, cols, samples, ages,
+               states, margin=CANDIDATE_MARGIN):
+    """
+    Save the EPM training state into a ".npz" file.
+
+    Parameters
+    ----------
+    outfile : str
+        The output file ("<PREFIX>.EPM_state.npz").
+    cpgs : array_like
+        All CpGs of the input (rows of "betas").
+    stats : dict
+        "utils.correlation_stats" of the training samples (all CpGs).
+    pcc_cut : float
+        Cutoff of the absolute correlation coefficient.
+    betas : numpy.ndarray
+        Beta values (all CpGs x samples).
+    cols : array_like
+        Column positions of the training samples in "betas".
+    samples : array_like
+        IDs of the training samples.
+    ages : array_like
+        Ages of the training samples.
+    states : array_like
+        Fitted EPM states of the training samples.
+    margin : float, optional
+        Beta values of CpGs with |r| > (pcc_cut - margin) are saved. The
+        default is CANDIDATE_MARGIN.
+
+    Returns
+    -------
+    None.
+    """
+    pcc = pearson_from_stats(stats)
+    candidates = np.where(np.abs(pcc) > pcc_cut - margin)[0]
+    logging.info(
+        "Save beta values of %d candidate CpGs (|r| > %g)" %
+        (len(candidates), pcc_cut - margin))
+    np.savez_compressed(
+        outfile, version=np.array(STATE_VERSION),
+        cpgs=np.asarray(cpgs, dtype=str),
+        pcc_cut=np.array(pcc_cut), margin=np.array(margin),
+        samples=np.asarray(samples, dtype=str),
+        ages=np.asarray(ages, dtype=np.float64),
+        states=np.asarray(states, dtype=np.float64),
+        candidates=candidates,
+        candidate_betas=np.asarray(betas[candidates][:, cols],
+                                   dtype=np.float32),
+        **{'stat_' + k: np.asarray(stats[k]) for k in STAT_KEYS})
+
+
+def load_state(infile):
+    """
+    Load the EPM training state saved by "save_state".
+
+    Returns
+    -------
+    dict. The arrays of the file; the correlation statistics are in
+    state['stats'].
+    """
+    with np.load(infile, allow_pickle=False) as dat:
+        if int(dat['version']) > STATE_VERSION:
+            raise ValueError(
+                "EPM state version %d is not supported (<= %d)" %
+                (int(dat['version']), STATE_VERSION))
+        state = {k: dat[k] for k in dat.files if not k.startswith('stat_')}
+        state['stats'] = {k: dat['stat_' + k] for k in STAT_KEYS}
+    for k in ('n', 'sum_y', 'sum_yy'):
+        state['stats'][k] = state['stats'][k].item()
+    return state
+
+
+def update_state(state, new_df, new_ages, pcc_cut=None, n_jobs=1):
+    """
+    Add new training samples to the EPM state and reselect CpGs.
+
+    Only the new samples are read: their correlation statistics are added to
+    the saved statistics, and their beta values are appended to the saved
+    beta values of the candidate CpGs. CpGs that pass "pcc_cut" are selected
+    from the candidates.
+
+    Parameters
+    ----------
+    state : dict
+        EPM state (see "load_state").
+    new_df : DataFrame
+        Beta values of the new samples (CpGs x samples), no missing values.
+    new_ages : array_like
+        Ages of the new samples.
+    pcc_cut : float, optional
+        Cutoff of the absolute correlation coefficient. If None, the cutoff
+        of the state is used. The default is None.
+    n_jobs : int, optional
+        Number of threads (see "utils.correlation_stats"). The default is 1.
+
+    Returns
+    -------
+    tuple. (updated state, positions of the selected CpGs in
+    state['candidates']). The "states" of the updated state are the initial
+    EM states: the saved states of the old samples, and the ages of the new
+    samples.
+    """
+    if pcc_cut is None:
+        pcc_cut = float(state['pcc_cut'])
+    new_ages = np.asarray(new_ages, dtype=np.float64)
+    cpgs = pd.Index(state['cpgs'])
+    rows = new_df.index.get_indexer(cpgs)
+    n_missed = int((rows < 0).sum())
+    if n_missed > 0:
+        logging.warning(
+            "%d CpGs of the EPM state are not in the new samples. They are "
+            "excluded." % n_missed)
+
+    new_stats = correlation_stats(new_df.to_numpy(), new_ages, n_jobs=n_jobs)
+    for k in ('sum_x', 'sum_xx', 'sum_xy'):
+        values = new_stats[k][rows]
+        values[rows < 0] = np.nan
+        new_stats[k] = values
+    stats = add_stats(state['stats'], new_stats)
+    pcc = pearson_from_stats(stats)
+
+    # candidates must be in the new samples
+    candidates = state['candidates']
+    keep = rows[candidates] >= 0
+    candidates = candidates[keep]
+    candidate_betas = np.hstack([
+        state['candidate_betas'][keep],
+        new_df.to_numpy(dtype=np.float32)[rows[candidates]]])
+
+    selected = np.where(np.abs(pcc[candidates]) > pcc_cut)[0]
+    n_outside = int((np.abs(pcc) > pcc_cut).sum()) - len(selected)
+    if n_outside > 0:
+        logging.warning(
+            "%d CpGs pass the cutoff but are not candidates of the saved "
+            "state (their old beta values were not saved). They are not "
+            "used." % n_outside)
+
+    new_state = dict(state)
+    new_state.update(
+        pcc_cut=np.array(pcc_cut), stats=stats, candidates=candidates,
+        candidate_betas=candidate_betas,
+        samples=np.concatenate(
+            [state['samples'], np.asarray(new_df.columns, dtype=str)]),
+        ages=np.concatenate([state['ages'], new_ages]),
+        states=np.concatenate([state['states'], new_ages]))
+    return new_state, selected
+
+
+def write_state(outfile, state):
+    """Save a state returned by "update_state"."""
+    arrays = {k: v for k, v in state.items() if k != 'stats'}
+    arrays.update({'stat_' + k: np.asarray(state['stats'][k])
+                   for k in STAT_KEYS})
+    np.savez_compressed(outfile, **arrays)
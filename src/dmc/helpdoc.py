@@ -158,6 +158,103 @@ epm_output_help = '''
         Selected feature CpGs and their beta values for testing samples.
     "<PREFIX>.train_selected_CpGs.tsv":
         Selected feature CpGs and their beta values for training samples.
+    "<PREFIX>.EPM_CV_folds.tsv":
+        Number of EM iterations, errors and run time of each CV fold.
+    "<PREFIX>.EPM_model.npz":
+        The trained EPM model (selected CpGs, rates and intercepts). It can be
+        used to predict new samples with "epical EPM-apply".
+    "<PREFIX>.EPM_state.npz":
+        The training state (correlation statistics of all CpGs, beta values of
+        candidate CpGs and EPM states of training samples). It is used to
+        update the model with new samples ("--resume").
+    '''
+
+epm_resume_help = '''
+    The training state file ("<PREFIX>.EPM_state.npz") of a previous run. If
+    set, the samples of "Input_file" are added to the training samples of the
+    state file, and the model is refitted without reading the old samples
+    again. The EM starts from the previous EPM states.
+    '''
+
+epm_apply_help = '''
+    Description: Predict the EPM ages of new samples using a model trained by
+    "epical EPM" ("<PREFIX>.EPM_model.npz"). Only the model CpGs are read and
+    imputed, and the model is not refitted.
+    '''
+
+epm_model_help = '''
+    The EPM model file ("<PREFIX>.EPM_model.npz") created by "epical EPM".
+    '''
+
+epm_apply_output_help = '''
+    The PREFIX of output files. If no PREFIX is provided, the default prefix
+    "EPM_out" is used. The generated output files include:
+
+    "<PREFIX>.EPM_age.tsv":
+        The predicted EPM ages.
+    "<PREFIX>.predictorCpG_missed.tsv":
+        Model CpGs missing from the input file.
+    "<PREFIX>.EPM_age.pdf" or "<PREFIX>.EPM_age.png":
+        Scatter plot showing the trend between the predicted EPM ages and
+        chronological ages (if the meta file has an 'Age' column).
+    '''
+
+multi_help = '''
+    Description: Calculate DNAm ages of multiple linear clocks in one run. The
+    input file is read and imputed only once (restricted to the union of the
+    clock CpGs), and all clocks are computed together.
+    '''
+
+multi_clocks_help = '''
+    Comma-separated names of clocks to calculate. Supported clocks are the
+    linear human clocks (Horvath13, Horvath13_shrunk, Horvath18, MEAT, PedBE,
+    Cortical, Ped_Wu, Levine, Hannum, Lu_DNAmTL, Zhang_EN, GA_Knight,
+    GA_Mayne, GA_Bohlin, GA_Haftorn, GA_Lee_CPC, GA_Lee_RPC, GA_Lee_rRPC,
+    Weidner, Lin, ENCen100, ENCen40). All of them are used by default.
+    '''
+
+multi_output_help = '''
+    The PREFIX of output files. If no PREFIX is provided, the default prefix
+    "multi_out" is used. The generated output files include:
+
+    "<PREFIX>.DNAm_age.tsv":
+        This file contains the predicted DNAm ages. One column per clock.
+    "<PREFIX>.clock_summary.tsv":
+        This file lists the number of found and missed CpGs of each clock,
+        and whether the clock was calculated or skipped.
+    '''
+
+serve_help = '''
+    Description: Run a long-lived scoring server. The clock models are loaded
+    once at start-up; beta values are posted (JSON or a binary ".npz" file) to
+    "/score" over HTTP or a Unix socket, and requests arriving together are
+    scored in micro-batches. Each response reports its latency.
+    '''
+
+host_help = '''
+    Host (IP address) the server listens on.
+    '''
+
+port_help = '''
+    Port the server listens on.
+    '''
+
+socket_help = '''
+    If set, the server listens on this Unix socket file instead of
+    "--host" and "--port".
+    '''
+
+altum_help = '''
+    If set, AltumAge is also served (its model is loaded at start-up).
+    '''
+
+max_batch_help = '''
+    The maximum number of samples scored together in one micro-batch.
+    '''
+
+max_wait_help = '''
+    How long (milliseconds) the server waits for more requests after the
+    first request of a micro-batch.
     '''
 
 log_help = '''
@@ -181,11 +278,110 @@ imputation_help = '''
         9: Fill the missing values with **row max**,
         10: Fill the missing values with **external reference**,
         11: Fill the missing values using KNN approach (K = sqrt(n)).
-    If 10 is specified, an external reference file must be provided.
+    If 10 is specified without an external reference file, the bundled
+    reference panel is used (see "--ref-panel").
+    '''
+
+impute_clock_only_help = '''
+    If set, only the clock CpGs (rather than all CpGs in the input file) are
+    imputed. This is much faster for large input files (e.g., EPIC array).
+    Column-wise methods (2-5) still use the statistics of all CpGs, and the
+    KNN method (11) searches neighbors among the clock CpGs and a bounded
+    pool of non-clock CpGs (see "--knn-pool").
+    '''
+
+knn_pool_help = '''
+    The number of CpGs (without missing values) used as neighbor candidates
+    by KNN imputation when only the clock CpGs are imputed: the first
+    "knn_pool" complete CpGs of the input, so the imputed values do not
+    depend on which clocks are calculated. Set to 0 to use the clock CpGs
+    only.
+    '''
+
+knn_max_donors_help = '''
+    The maximum number of CpGs used as neighbor candidates by KNN imputation
+    of the whole input (or of the clock CpGs if "--knn-pool" is 0). Inputs
+    with more CpGs (e.g., 450K and EPIC arrays) use this many evenly spaced
+    CpGs, which bounds the time and memory; a warning is logged. Set to 0
+    to use all CpGs (same as imputing with all CpGs as neighbors, as in
+    earlier versions). The default is 50000.
+    '''
+
+coverage_help = '''
+    If set, "Input_file" is a manifest of per-sample coverage files (one
+    sample per line: "sample_ID<TAB>file", or just "file"). Bismark coverage
+    (".cov"), bedGraph and bedMethyl files (optionally compressed) are
+    supported. Each file is streamed and only the clock CpGs are kept, so the
+    genome-wide matrix is never built. Only the clock CpGs are imputed.
+    '''
+
+min_cov_help = '''
+    With "--coverage": CpGs covered by fewer reads are treated as missing.
+    Not applied to bedGraph files (no read counts). The default is 5.
+    '''
+
+cov_format_help = '''
+    With "--coverage": format of the coverage files. If not set, it is
+    guessed from the file names (".cov": bismark, ".bedGraph"/".bg":
+    bedgraph, ".bed"/".bedMethyl": bedmethyl).
+    '''
+
+genome_help = '''
+    The reference genome for Mouse (Mus musculus) used for RRBS or WGBS reads
+    alignment. Must be 'mm10', 'mm39', 'auto' or 'both'. 'auto': the build
+    with more clock CpGs found in the input is used (the clock CpGs are
+    lifted between mm10 and mm39 in memory). 'both': clock CpGs missing in
+    that build are looked up with the coordinates of the other build. The
+    default is 'mm10'.
+    '''
+
+match_help = '''
+    How input CpGs ("chrom_position") are matched to the clock CpGs: "exact"
+    (same position), "adjacent" (within 1 bp, e.g., the C on the other strand
+    or an off-by-one coordinate) or "window" (within "--window" bp). Each
+    clock CpG uses the nearest input CpG; with "--coverage", the reads of all
+    matched sites are added up. The default is "exact".
+    '''
+
+window_help = '''
+    Maximum distance (bp) between an input CpG and a clock CpG with
+    "--match window". The default is 0.
+    '''
+
+cache_dir_help = '''
+    Directory to cache the parsed input file as binary (memory-mappable)
+    files. The cache is keyed by the path, size and modification time of the
+    input file. Later runs on the same input file read the cache instead of
+    parsing the text file again. The default is None (no cache).
     '''
 
 ext_ref_help = '''
-    The external reference file contains two columns, separated by either
-    tabs or commas. The first column represents the probe ID, while the
-    second column contains the corresponding beta values.
+    The external reference file contains two or more columns, separated by
+    either tabs or commas (can be compressed). The first column represents
+    the probe ID, while the other column(s) contain the corresponding beta
+    values of the reference panel(s). A binary reference file (".npz")
+    created by "imputation.save_reference" is also accepted.
+    '''
+
+jobs_help = '''
+    Number of worker processes. Expensive stages (KNN imputation, AltumAge
+    prediction) are split into blocks of CpGs or samples and run in
+    parallel. The input matrix is passed to the workers through shared
+    memory. Clocks themselves are not run in parallel: "multi" scores its
+    linear clocks together in one pass, and other clocks (AltumAge,
+    DunedinPACE, the mouse clocks) need separate commands. Output files are
+    written by the main process. 0 uses one process per CPU. The default
+    is 1.
+    '''
+
+ref_panel_help = '''
+    Name of the reference panel (column) in the external reference file.
+    If not specified, the first panel is used. If no external reference file
+    is given, the bundled panel "AltumAge_median" is used: per-CpG median
+    beta values of the (multi-tissue) AltumAge training samples, for 20,318
+    CpGs shared by the 450K and EPIC arrays. It covers most CpGs of
+    Horvath13, Levine, MEAT and the GA clocks, but few CpGs of Hannum,
+    PedBE, Horvath18 and the Zhang clocks; missing values of CpGs that are
+    not in the panel are not filled (a warning gives the number of such CpGs
+    of each clock). No tissue-specific panel is bundled.
     '''
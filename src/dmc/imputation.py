@@ -6,9 +6,66 @@ Created on Mon Oct  2 13:57:36 2023
 import sys
 import os
 import pandas as pd
-# import numpy as np
+import numpy as np
 import logging
-from sklearn.impute import KNNImputer
+from dmc import ireader
+from dmc.betareader import NA_VALUES, sniff_delimiter
+from dmc.scheduler import n_workers, run_pool, split_range, worker_state
+
+# reference panels bundled with the package (used by method 10 if no
+# external reference file is given, see "build_reference_panels")
+REF_PANELS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'data', 'reference_panels.npz')
+
+# NaN-aware row statistics used by the row-wise imputation (methods 6-9)
+ROW_STATS = {
+    'mean': np.nanmean,
+    'median': np.nanmedian,
+    'min': np.nanmin,
+    'max': np.nanmax,
+}
+
+
+def fill_by_row(values, fill_value='mean', out=None, chunk_size=100000):
+    """
+    Fill missing values of a 2-D array by **row** statistics.
+
+    The array is processed in blocks of "chunk_size" rows, so "values" can
+    be a (read-only) np.memmap that does not fit into memory. Rows that are
+    all missing are left unchanged.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        2-D array (CpGs x samples).
+    fill_value : str, optional
+        Must be one of ["mean", "median", "min", "max"]. The default is
+        'mean'.
+    out : numpy.ndarray, optional
+        Array (of the same shape) to save the result. Can be the same array
+        as "values" (in-place) or a writable np.memmap. If None, a new array
+        is created. The default is None.
+    chunk_size : int, optional
+        Number of rows processed at a time. The default is 100000.
+
+    Returns
+    -------
+    numpy.ndarray.
+    """
+    row_stat = ROW_STATS[fill_value]
+    if out is None:
+        out = np.empty(values.shape, dtype=values.dtype)
+    for start in range(0, values.shape[0], chunk_size):
+        block = np.array(values[start:start + chunk_size])
+        missing = np.isnan(block)
+        rows = missing.any(axis=1) & ~missing.all(axis=1)
+        if rows.any():
+            sub = block[rows]
+            np.copyto(sub, row_stat(sub, axis=1)[:, np.newaxis],
+                      where=missing[rows])
+            block[rows] = sub
+        out[start:start + chunk_size] = block
+    return out
 
 
 def update_df_row(df_in, fill_value='mean'):
@@ -30,25 +87,233 @@ def update_df_row(df_in, fill_value='mean'):
     Pandas DataFrame.
 
     """
-    for cgID, betas in df_in.iterrows():
-        if betas.isnull().values.any() and betas.isnull().sum() < len(betas):
-            if fill_value == 'mean':
-                df_in.loc[cgID, :] = df_in.fillna(betas.mean())
-            elif fill_value == 'median':
-                df_in.loc[cgID, :] = df_in.fillna(betas.median())
-            elif fill_value == 'min':
-                df_in.loc[cgID, :] = df_in.fillna(betas.min())
-            elif fill_value == 'max':
-                df_in.loc[cgID, :] = df_in.fillna(betas.max())
-            else:
-                logging.error(
-                    'Must be one of ["mean", "median", "min", "max"]')
-        else:
-            continue
-    return df_in
+    if fill_value not in ROW_STATS:
+        logging.error(
+            'Must be one of ["mean", "median", "min", "max"]')
+        return df_in
+    values = fill_by_row(df_in.to_numpy(), fill_value)
+    return pd.DataFrame(values, index=df_in.index, columns=df_in.columns)
+
+
+def read_reference(ref, panel=None):
+    """
+    Read the external reference file used by imputation method 10.
+
+    Text files (plain or compressed) have CpG IDs in the first column and
+    one or more columns of beta values (i.e., reference panels, such as
+    tissue-specific medians). The header line is optional. Binary files
+    (".npz") are created by "save_reference".
+
+    Parameters
+    ----------
+    ref : str
+        The reference file.
+    panel : str, optional
+        Name of the reference panel (column) to use. If None, the first
+        panel is used. The default is None.
+
+    Returns
+    -------
+    Pandas Series (indexed by CpG IDs).
+    """
+    if ref.endswith('.npz'):
+        with np.load(ref, allow_pickle=False) as dat:
+            ref_df = pd.DataFrame(
+                dat['values'], index=dat['cpgs'], columns=dat['panels'])
+    else:
+        fh = ireader.nopen(ref)
+        first = fh.readline().decode('utf8').rstrip('\r\n')
+        fh.close()
+        delimiter = sniff_delimiter(first)
+        try:
+            float(first.split(delimiter)[1])
+            header = None
+        except (ValueError, IndexError):
+            header = 0
+        ref_df = pd.read_csv(
+            ireader.nopen(ref),
+            sep=r'\s+' if delimiter is None else delimiter, header=header,
+            index_col=0, na_values=list(NA_VALUES), engine='c')
+        if header is None:
+            ref_df.columns = ['ref_%d' % (i + 1)
+                              for i in range(ref_df.shape[1])]
+        ref_df.index = ref_df.index.astype(str)
+    ref_df = ref_df.loc[~ref_df.index.duplicated(keep='first')]
+
+    if panel is None:
+        panel = ref_df.columns[0]
+    elif panel not in ref_df.columns:
+        logging.error(
+            "Reference panel \"%s\" does not exist in \"%s\". Must be one of:"
+            " %s" % (panel, ref, ','.join(map(str, ref_df.columns))))
+        sys.exit(0)
+    logging.info(
+        "Use reference panel \"%s\" (%d CpGs) of \"%s\"" %
+        (panel, len(ref_df), ref))
+    return ref_df[panel].astype(np.float64)
+
+
+def save_reference(ref_df, outfile):
+    """
+    Save reference panels into a binary (".npz") file.
+
+    Parameters
+    ----------
+    ref_df : DataFrame
+        CpGs x panels (e.g., tissue-specific median beta values).
+    outfile : str
+        The output file name (must end with ".npz").
+
+    Returns
+    -------
+    None.
+    """
+    np.savez_compressed(
+        outfile, cpgs=np.array(ref_df.index, dtype=str),
+        values=ref_df.to_numpy(dtype=np.float32),
+        panels=np.array(ref_df.columns, dtype=str))
+
+
+def build_reference_panels(outfile=REF_PANELS):
+    """
+    Build the bundled reference panels ("data/reference_panels.npz").
+
+    Panels:
+        AltumAge_median : per-CpG median beta values of the AltumAge training
+                          samples (multi-tissue; the center of the bundled
+                          AltumAge RobustScaler), 20,318 CpGs shared by the
+                          450K and EPIC arrays.
+
+    >>> from dmc.imputation import build_reference_panels
+    >>> build_reference_panels()
+    """
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    scaler = pd.read_pickle(os.path.join(data_dir, 'scaler.pkl'))
+    cpgs = pd.read_pickle(os.path.join(data_dir, 'multi_platform_cpgs.pkl'))
+    ref_df = pd.DataFrame(
+        {'AltumAge_median': scaler.center_},
+        index=pd.Index(np.asarray(cpgs, dtype=str)))
+    save_reference(ref_df, outfile)
+
+
+def fill_by_reference(input_df, ref_beta):
+    """
+    Fill missing values with the reference beta values of the same CpGs.
+
+    Parameters
+    ----------
+    input_df : DataFrame
+        CpGs x samples.
+    ref_beta : Series
+        Reference beta values (indexed by CpG IDs). CpGs that are not in the
+        reference are left unchanged.
+
+    Returns
+    -------
+    Pandas DataFrame.
+    """
+    values = input_df.to_numpy()
+    ref_values = ref_beta.reindex(input_df.index).to_numpy(dtype=values.dtype)
+    missing = np.isnan(values)
+    logging.info(
+        "%d missing values; %d CpGs with missing values are not in the "
+        "reference." % (missing.sum(),
+                        (missing.any(axis=1) & np.isnan(ref_values)).sum()))
+    values = np.where(missing, ref_values[:, np.newaxis], values)
+    return pd.DataFrame(values, index=input_df.index, columns=input_df.columns)
+
+
+def _knn_block(task):
+    """Impute a block of CpGs (worker of "impute_knn")."""
+    start, end = task
+    w = worker_state()
+    rows = w['receivers'][start:end]
+    w['values'][rows] = w['imputer'].transform(w['values'][rows])
 
 
-def impute_beta(input_df, method, ref=None, k=None, w='uniform'):
+def impute_knn(input_df, k=None, w='uniform', block_size=10000,
+               max_donors=50000, donors=None, n_jobs=1):
+    """
+    Fill missing values with average values from K Nearest Neighbors (KNN).
+
+    Same as sklearn's KNNImputer (rows are CpGs, columns are samples), but
+    the neighbor search is done for blocks of CpGs that have missing values,
+    and the blocks can be processed in parallel. The imputer is fitted once
+    on the donor CpGs and reused by all blocks. If the input has no more
+    than "max_donors" CpGs (or "max_donors" is 0), all CpGs are donors and
+    the result is identical to running KNNImputer on the whole input.
+    Otherwise "max_donors" evenly spaced CpGs are used as donors, which
+    bounds the time and memory (a warning is logged).
+
+    Parameters
+    ----------
+    input_df : DataFrame
+        CpGs x samples.
+    k : int, optional
+        Number of neighbors. If None, k = sqrt(n) where n is the number of
+        samples. The default is None.
+    w : str, optional
+        Weight function ("uniform" or "distance"). The default is 'uniform'.
+    block_size : int, optional
+        Number of CpGs (with missing values) imputed at a time. The default
+        is 10000.
+    max_donors : int, optional
+        The maximum number of CpGs used as neighbor candidates. Set to 0 (or
+        None) to use all CpGs. The default is 50000.
+    donors : DataFrame, optional
+        The neighbor candidates (CpGs x samples, same samples as "input_df").
+        If provided, "max_donors" is ignored. The default is None (the CpGs
+        of "input_df").
+    n_jobs : int, optional
+        Number of worker processes (0: one per CPU). The default is 1.
+
+    Returns
+    -------
+    DataFrame with missing values filled.
+    """
+    from sklearn.impute import KNNImputer
+    n_jobs = n_workers(n_jobs)
+    if k is None:
+        nb = int(input_df.shape[1]**0.5)
+    else:
+        nb = k
+    values = np.array(input_df.to_numpy(), copy=True)
+    if values.dtype.kind != 'f':
+        values = values.astype(np.float64)
+    receivers = np.flatnonzero(np.isnan(values).any(axis=1))
+    if len(receivers) == 0:
+        return input_df.copy()
+
+    if donors is not None:
+        donors = donors[input_df.columns].to_numpy(dtype=values.dtype)
+    elif not max_donors or len(values) <= max_donors:
+        donors = values
+    else:
+        logging.warning(
+            "%d CpGs in the input: %d evenly spaced CpGs are used as KNN "
+            "neighbor candidates (set \"--knn-max-donors 0\" to use all "
+            "CpGs)" % (len(values), max_donors))
+        idx = np.unique(
+            np.linspace(0, len(values) - 1, max_donors).astype(int))
+        donors = values[idx]
+    logging.info(
+        "KNN imputation of %d CpGs (k = %d, donors = %d, jobs = %d) ..." %
+        (len(receivers), nb, len(donors), n_jobs))
+    imputer = KNNImputer(n_neighbors=nb, weights=w).fit(donors)
+    # at least one block per worker
+    block_size = max(1, min(block_size, -(-len(receivers) // n_jobs)))
+
+    # the blocks fill "values" in place (through shared memory if n_jobs > 1)
+    run_pool(
+        _knn_block, split_range(len(receivers), block_size=block_size),
+        n_jobs, arrays={'values': values},
+        state={'imputer': imputer, 'receivers': receivers},
+        writeback=('values',))
+    return pd.DataFrame(values, index=input_df.index, columns=input_df.columns)
+
+
+def impute_beta(input_df, method, ref=None, k=None, w='uniform',
+                ref_panel=None, max_donors=50000, n_jobs=1):
     """
     Parameters
     ----------
@@ -83,8 +348,10 @@ def impute_beta(input_df, method, ref=None, k=None, w='uniform'):
             10: Fill the missing values with **external reference**
             11: Fill the missing values with average values from K Nearest Neighbors (KNN). (default)
     ref : str
-        Tab or comma separated file. The first column is CpG ID, the 2nd
-        column is beta value.
+        Tab or comma separated file (can be compressed). The first column is
+        CpG ID, the other column(s) are beta values of reference panel(s).
+        Or a binary file (".npz") created by "save_reference". If None,
+        method 10 uses the bundled panels (REF_PANELS).
     k : int
         Number of neighboring samples to use for imputation. If k is None,
         k = sqrt(n) where n is the "number of samples" in the input_df.
@@ -93,6 +360,14 @@ def impute_beta(input_df, method, ref=None, k=None, w='uniform'):
         Weight function used in prediction. 
         (https://scikit-learn.org/stable/modules/generated/sklearn.impute.KNNImputer.html)
         Only effective when used imputation method is "KNN".
+    ref_panel : str
+        Name of the reference panel (column) in "ref". If None, the first
+        panel is used. Only effective when the imputation method is 10.
+    max_donors : int
+        The maximum number of CpGs used as KNN neighbor candidates (0: all).
+        See "impute_knn".
+    n_jobs : int
+        Number of worker processes used by KNN. See "impute_knn".
 
     Returns
     -------
@@ -139,41 +414,102 @@ def impute_beta(input_df, method, ref=None, k=None, w='uniform'):
         output_df = update_df_row(input_df, 'max')
     elif method == 10:
         logging.info("Fill missing values with external reference ...")
-        if ref is not None and os.path.exists(ref):
-            # dict: key is cgID, value is beta
-            external_ref = {}
-            # read external file
-            with open(ref) as external:
-                line = external.read().strip()
-                if ref.endswith('.csv'):
-                    f = line.split(',')
-                else:
-                    f = line.split()
-                try:
-                    external_ref[f[0]] = float(f[1])
-                except ValueError:
-                    pass
-            for cgID, betas in input_df.iterrows():
-                if betas.isnull().values.any():
-                    if cgID in external_ref:
-                        ref_beta = external_ref[cgID]
-                        input_df.loc[cgID, :] = betas.fillna(ref_beta)
-                    else:
-                        continue
-                else:
-                    continue
-            output_df = input_df
+        if ref is None:
+            logging.warning(
+                "No external reference file: use the bundled panel (%s). "
+                "It is not a tissue panel, and the CpGs it does not cover "
+                "stay missing." % REF_PANELS)
+            ref = REF_PANELS
+        if os.path.exists(ref):
+            output_df = fill_by_reference(
+                input_df, read_reference(ref, panel=ref_panel))
         else:
             logging.error("External file %s does not exist." % ref)
             sys.exit()
     elif method == 11:
-        if k is None:
-            nb = int(input_df.shape[1]**0.5)
+        output_df = impute_knn(input_df, k=k, w=w, max_donors=max_donors,
+                               n_jobs=n_jobs)
+    return output_df
+
+
+def impute_clock_cpgs(input_df, cpgs, method, ref=None, k=None, w='uniform',
+                      knn_pool=1000, max_donors=50000, ref_panel=None,
+                      n_jobs=1):
+    """
+    Fill missing values of the clock CpGs only (instead of the whole input).
+
+    Row-wise methods (-1, 0, 1, 6-10) only use the values of the CpG itself,
+    so the results are identical to imputing the whole input. Column-wise
+    methods (2-5) use the column statistics of the whole input. The KNN
+    method (11) searches the neighbors in a fixed pool: the first "knn_pool"
+    complete (i.e., no missing values) CpGs of the input, in the input order.
+    The pool does not depend on "cpgs", so the imputed value of a CpG does
+    not depend on which (or how many) clocks are calculated together.
+
+    Parameters
+    ----------
+    input_df : DataFrame
+        The input DataFrame (CpGs x samples).
+    cpgs : list
+        The clock CpG IDs. CpGs that do not exist in input_df are ignored.
+    method : int
+        Imputation method. See "impute_beta" for details.
+    ref : str
+        External reference file. See "impute_beta" for details.
+    k : int
+        Number of neighboring samples used by KNN. See "impute_beta".
+    w : str
+        Weight function used by KNN. See "impute_beta".
+    knn_pool : int, optional
+        The number of complete CpGs used as neighbor candidates by KNN (see
+        above). Set to 0 to search neighbors among the CpGs of "cpgs" only
+        (the imputed values then depend on "cpgs"). The default is 1000.
+    max_donors : int, optional
+        The maximum number of neighbor candidates if "knn_pool" is 0 (see
+        "impute_knn"). The default is 50000.
+    ref_panel : str
+        Reference panel in "ref". See "impute_beta".
+    n_jobs : int
+        Number of worker processes used by KNN. See "impute_knn".
+
+    Returns
+    -------
+    DataFrame of clock CpGs with missing values filled.
+    """
+    is_clock = input_df.index.isin(cpgs)
+    clock_df = input_df.loc[is_clock]
+    logging.info(
+        "Impute %d clock CpGs (out of %d CpGs) ..." %
+        (len(clock_df), len(input_df)))
+
+    if method in (2, 3, 4, 5):
+        if method == 2:
+            col_stat = input_df.mean()
+        elif method == 3:
+            col_stat = input_df.median()
+        elif method == 4:
+            col_stat = input_df.min()
+        else:
+            col_stat = input_df.max()
+        output_df = clock_df.fillna(col_stat)
+    elif method == 11 and knn_pool > 0 and clock_df.isnull().values.any():
+        pool_df = input_df.loc[input_df.notnull().all(axis=1)].iloc[:knn_pool]
+        if len(pool_df) == 0:
+            logging.warning(
+                "No complete CpGs in the input. Search KNN neighbors among "
+                "the clock CpGs.")
+            pool_df = None
         else:
-            nb = k
-        imputer = KNNImputer(n_neighbors=nb, weights=w)
-        after = imputer.fit_transform(input_df)
-        output_df = pd.DataFrame(after, index = input_df.index, columns = input_df.columns)
+            logging.info(
+                "Use %d complete CpGs as KNN neighbor candidates." %
+                len(pool_df))
+        output_df = impute_knn(
+            clock_df, k=k, w=w, max_donors=max_donors, donors=pool_df,
+            n_jobs=n_jobs)
+    else:
+        output_df = impute_beta(clock_df, method=method, ref=ref, k=k, w=w,
+                                ref_panel=ref_panel, max_donors=max_donors,
+                                n_jobs=n_jobs)
     return output_df
 
 
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Liftover of the mouse clock CpGs between mm10 and mm39.
+
+The mouse clock models of the two builds ("<clock>_mm10" and
+"<clock>_mm39") have the same coefficients, and their CpGs are row-aligned
+(the i-th CpG of the mm10 model was lifted to the i-th CpG of the mm39
+model). The coordinates of all clock CpGs in both builds are bundled in
+"mouse_liftover.npz", so clock coordinates are translated to the build of
+the input in memory, and one input can be matched against the CpGs of both
+builds without being read twice.
+
+>>> from dmc.liftover import lift
+>>> lift(['chr10_111559529'], 'mm10', 'mm39')
+array(['chr10_111395434'], dtype='<U15')
+"""
+
+import os
+import logging
+import numpy as np
+import pandas as pd
+from dmc.clockmodel import load_clock
+from dmc.coordindex import CoordIndex
+
+# genome builds of the mouse clocks
+GENOMES = ('mm10', 'mm39')
+
+# mouse clocks with a model for each build
+MOUSE_CLOCKS = ('WLMT', 'YOMT', 'mmLiver', 'mmBlood')
+
+# loaded mapping (see "load_liftover")
+_mapping = {}
+
+
+def default_file():
+    """Return the path of the bundled "mouse_liftover.npz"."""
+    return os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'data',
+        'mouse_liftover.npz')
+
+
+def mapping_from_models():
+    """
+    Pair the CpGs of the row-aligned mouse clock models.
+
+    Returns
+    -------
+    DataFrame. One row per clock CpG, one column per build.
+    """
+    pairs = []
+    for cname in MOUSE_CLOCKS:
+        models = [load_clock(cname + '_' + g) for g in GENOMES]
+        if len(set(len(m.cpgs) for m in models)) != 1 or not all(
+                np.array_equal(models[0].coef, m.coef) for m in models):
+            raise ValueError("%s models are not row-aligned" % cname)
+        pairs.append(pd.DataFrame(
+            {g: m.cpgs for g, m in zip(GENOMES, models)}))
+    mapping = pd.concat(pairs, ignore_index=True).drop_duplicates()
+    for g in GENOMES:
+        if mapping[g].duplicated().any():
+            raise ValueError("CpGs of %s are mapped to multiple CpGs" % g)
+    return mapping
+
+
+def build_liftover(outfile=None):
+    """
+    Build the coordinate mapping from the row-aligned mouse clock models.
+
+    Parameters
+    ----------
+    outfile : str, optional
+        The output file. If None, "mouse_liftover.npz" in the "dmc/data"
+        directory is used. The default is None.
+
+    Returns
+    -------
+    DataFrame. One row per clock CpG, one column per build.
+    """
+    if outfile is None:
+        outfile = default_file()
+    mapping = mapping_from_models()
+    np.savez_compressed(
+        outfile, **{g: mapping[g].to_numpy(dtype=str) for g in GENOMES})
+    logging.info(
+        "Liftover of %d CpGs saved to: %s" % (len(mapping), outfile))
+    return mapping
+
+
+def load_liftover():
+    """
+    Load the bundled coordinate mapping (built from the models if the file
+    does not exist).
+
+    Returns
+    -------
+    dict. (source build, target build) -> Series (source ID -> target ID).
+    """
+    if not _mapping:
+        if os.path.exists(default_file()):
+            with np.load(default_file(), allow_pickle=False) as dat:
+                mapping = pd.DataFrame({g: dat[g] for g in GENOMES})
+        else:
+            mapping = mapping_from_models()
+        for src in GENOMES:
+            for dst in GENOMES:
+                _mapping[(src, dst)] = pd.Series(
+                    mapping[dst].to_numpy(), index=mapping[src].to_numpy())
+    return _mapping
+
+
+def lift(cpg_ids, src, dst):
+    """
+    Translate clock CpG IDs from one build to another.
+
+    Parameters
+    ----------
+    cpg_ids : array_like
+        CpG IDs ("chrom_position") in build "src".
+    src, dst : str
+        Builds (see GENOMES).
+
+    Returns
+    -------
+    numpy.ndarray. IDs in build "dst" ('' if the CpG is not a clock CpG).
+    """
+    if src not in GENOMES or dst not in GENOMES:
+        raise ValueError(
+            "Unknown genome build: %s (must be one of %s)" %
+            (src if src not in GENOMES else dst, ', '.join(GENOMES)))
+    return load_liftover()[(src, dst)].reindex(
+        np.asarray(cpg_ids, dtype=str)).fillna('').to_numpy(dtype=str)
+
+
+def assign_sites(input_ids, build_ids, match='exact', window=0,
+                 single=False):
+    """
+    Match input CpGs to the (row-aligned) clock CpGs of several builds.
+
+    The build with the most matched CpGs is the primary build. Clock CpGs
+    that are not found in the primary build are looked up in the other
+    builds (unless "single" is set). An input CpG is used at most once.
+
+    Parameters
+    ----------
+    input_ids : array_like
+        IDs ("chrom_position") of the input CpGs.
+    build_ids : dict
+        Build -> clock CpG IDs in this build (same order for all builds, ''
+        if not available).
+    match, window :
+        See "coordindex.CoordIndex.match".
+    single : bool, optional
+        If set, only the primary build is used. The default is False.
+
+    Returns
+    -------
+    tuple. (positions of the input CpGs used for the clock CpGs (-1 if
+    none), build of each clock CpG ('' if none), builds sorted by the number
+    of matched CpGs, number of matched CpGs of each build).
+    """
+    bests = {}
+    hits = {}
+    for build, ids in build_ids.items():
+        ids = np.asarray(ids, dtype=str)
+        ok = ids != ''
+        best = np.full(len(ids), -1, dtype=np.intp)
+        best[ok] = CoordIndex(ids[ok]).best_sites(input_ids, match, window)
+        bests[build] = best
+        hits[build] = int((best >= 0).sum())
+    order = sorted(build_ids, key=lambda b: -hits[b])
+    if single is True:
+        order = order[:1]
+
+    n = len(bests[order[0]])
+    best = np.full(n, -1, dtype=np.intp)
+    source = np.full(n, '', dtype=object)
+    used = np.zeros(len(input_ids), dtype=bool)
+    for build in order:
+        fill = (best < 0) & (bests[build] >= 0)
+        fill[fill] = ~used[bests[build][fill]]
+        best[fill] = bests[build][fill]
+        source[fill] = build
+        used[best[fill]] = True
+    return best, source, order, hits
+
+
+if __name__ == '__main__':
+    # regenerate "mouse_liftover.npz" from the bundled mouse clock models
+    logging.basicConfig(level=logging.INFO)
+    build_liftover()
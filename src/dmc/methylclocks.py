@@ -8,18 +8,28 @@ This program computes the biological age using DNA methylation data.
 
 import sys
 import os
+import importlib.util
 import pandas as pd
 import numpy as np
-import importlib.resources
-import pickle
 import logging
 from dmc.utils import plot_coef, plot_corr
-from dmc.imputation import impute_beta
+from dmc.imputation import impute_beta, impute_clock_cpgs
+from dmc.betareader import read_beta
+from dmc.clockmodel import load_clock
+from dmc.scheduler import map_sample_blocks
+from dmc.altum import load_altum, scaled_batches, find_altum, cache_altum
+from dmc.altum import cache_file as altum_cache_file
 from dmc.utils import plot_known_predicted_ages
-from dmc.utils import pearson_correlation
+from dmc.utils import select_correlated, correlation_stats
+from dmc.registry import CLOCKS, clock_runner, clocks_of, model_name
+from dmc.registry import multi_clocks
+from dmc.scoring import score_linear, sample_stats
+from dmc.epm import fit_epm_cv, predict_epm, save_epm, load_epm
+from dmc.epm import save_state, load_state, update_state, write_state
+from dmc.coverage import read_manifest, read_coverage_files
+from dmc.coordindex import CoordIndex, max_distance
+from dmc.liftover import GENOMES, lift, assign_sites
 import subprocess
-from EpigeneticPacemaker.EpigeneticPacemaker import EpigeneticPacemaker
-from EpigeneticPacemaker.EpigeneticPacemakerCV import EpigeneticPacemakerCV
 
 
 __author__ = "Liguo Wang"
@@ -30,59 +40,69 @@ __email__ = "wang.liguo@mayo.edu"
 __status__ = "Development"
 
 
-def clock_general(beta_file, outfile, cname, metafile=None, delimiter=None,
-                  ff='pdf', na_percent=0.2,
-                  ovr=False, imputation_method=11, ext_file=None):
+def read_clock_input(beta_file, delimiter=None, cpgs=None,
+                     imputation_method=11, knn_pool=1000, cache_dir=None):
     """
-    Calculate DNAm age using the "Weidner" or "Lin" clocks.
+    Read the input beta file.
+
+    If "cpgs" is provided and the imputation method does not need the other
+    CpGs (i.e., not the column-wise methods 2-5), only the rows of these CpGs
+    (plus up to "knn_pool" complete CpGs for KNN imputation) are read.
 
     Parameters
     ----------
     beta_file : str
         The input tabular structure file containing DNA methylation data.
-
-        #example of CSV file
-        ID_REF,s55N,s58N,s64N,s68N,s72N,s74N,s76N,s77N
-        cg26928153,0.86,0.79695,0.72618,0.67142,0.70801,0.80371,0.87158,0.78885
-        cg16269199,0.74,0.64148,0.65569,0.64138,0.56486,0.5707,0.75318,0.67239
-        cg13869341,0.76,0.7559,0.7059,0.82141,0.72888,0.72055,0.87058,0.80822
-        ...
-    outfile : str
-        The prefix of out files.
-    metafile : str, optional
-        Meta information (e.g., Age, Sex) of samples.
-        Example of a meta file
-            Sample_ID       Age     Sex
-            s16N    65      M
-            s36N    60      F
-            s45N    61      M
-            ...
     delimiter : str, optional
         Character used to separate columns of the input file.
         The default is None
-    cname : str, optional
+    cpgs : list, optional
+        Clock CpG IDs. If None, all CpGs are read. The default is None.
+    imputation_method : int
+        Imputation method. See imputation.py for details.
+    knn_pool : int, optional
+        The maximum number of non-clock CpGs used as KNN neighbor candidates.
+        The default is 1000.
+    cache_dir : str, optional
+        Directory of the binary cache of parsed beta files. See
+        "betareader.read_beta". The default is None (no cache).
+
+    Returns
+    -------
+    Pandas DataFrame.
+    """
+    if cpgs is not None and imputation_method not in (2, 3, 4, 5):
+        if imputation_method == 11:
+            n_extra = knn_pool
+        else:
+            n_extra = 0
+        return read_beta(
+            beta_file, cpgs=cpgs, delimiter=delimiter, n_extra=n_extra,
+            cache_dir=cache_dir)
+    return read_beta(beta_file, delimiter=delimiter, cache_dir=cache_dir)
+
+
+def clock_outfiles(outfile, cname, ff='pdf', ovr=False):
+    """
+    Set up the output files of a clock.
+
+    Parameters
+    ----------
+    outfile : str
+        The prefix of out files. If None, "<cname>_out" is used.
+    cname : str
         Clock name.
     ff : str, optional
-        The figure format. Must be one of ['pdf', 'png'].
-        The default is 'pdf'.
-    na_percent : float, optional
-        The maximum of percent of missing values.
-        The default is 0.2 (20%).
+        The figure format. Must be one of ['pdf', 'png']. The default is
+        'pdf'.
     ovr : bool, optional
         If set, over write existing files. The default is False
-    imputation_method : int
-        Must be one of [-1, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]. See
-        imputation.py for details. default is 6.
-    ext_file : str
-        This is must be exisit if imputation_method is set to 10.
-        Two-column, Tab or comma separated file: 1st column is CpG ID, the 2nd
-        column is beta value.
 
     Returns
     -------
-    Pandas Series.
+    dict. File type ('used', 'missed', 'age', 'coef', 'r', 'figure',
+    'scatter') -> file name.
     """
-
     # set up the prefix for output files.
     if outfile is not None:
         out_prefix = outfile
@@ -91,97 +111,90 @@ def clock_general(beta_file, outfile, cname, metafile=None, delimiter=None,
     logging.info(
         "The prefix of output files is set to \"%s\"." % out_prefix)
 
-    used_cpg_out = out_prefix + '.predictorCpG_found.tsv'
-    missed_cpg_out = out_prefix + '.predictorCpG_missed.tsv'
-    age_out = out_prefix + '.DNAm_age.tsv'
-    coef_out = out_prefix + '.predictorCpG_coef.tsv'
-    r_out = out_prefix + '.plots.R'
-    if ff.lower() in ['pdf', 'png']:
-        figure_out = out_prefix + '.coef_plot.' + ff.lower()
-        scatter_out = out_prefix + '.scatter_plot.' + ff.lower()
-    else:
+    if ff.lower() not in ['pdf', 'png']:
         logging.error("Does not suppor format: %s!" % ff)
         sys.exit(0)
-    outfiles = [used_cpg_out, missed_cpg_out, age_out, coef_out, r_out,
-                figure_out, scatter_out]
+    files = {
+        'used': out_prefix + '.predictorCpG_found.tsv',
+        'missed': out_prefix + '.predictorCpG_missed.tsv',
+        'age': out_prefix + '.DNAm_age.tsv',
+        'coef': out_prefix + '.predictorCpG_coef.tsv',
+        'r': out_prefix + '.plots.R',
+        'figure': out_prefix + '.coef_plot.' + ff.lower(),
+        'scatter': out_prefix + '.scatter_plot.' + ff.lower(),
+    }
 
     if ovr is True:
         logging.warning(
             "Over write existing files with prefix: %s" % out_prefix)
-        for tmp in outfiles:
+        for tmp in files.values():
             try:
                 os.remove(tmp)
             except FileNotFoundError:
                 pass
     else:
-        for tmp in outfiles:
+        for tmp in files.values():
             if os.path.exists(tmp):
                 logging.error(
                     ("%s exists! Use different prefix or specify "
                     "\"--overwrite\" to replace existing files." % tmp))
                 sys.exit(0)
+    return files
 
-    logging.info("Loading %s clock data ..." % cname)
-    model_file = cname + '.pkl'
-    fh = importlib.resources.open_binary('dmc.data', model_file)
-    clock_dat = pickle.load(fh)
 
+def log_clock(clock_dat):
+    """Log the description of a clock model."""
     logging.info("Clock's name: \"%s\"" % clock_dat.name)
     logging.info(
-        "Clock was trained from: \"%s\"" %
-        ','.join(clock_dat.tissues))
+        "Clock was trained from: \"%s\"" % ','.join(clock_dat.tissues))
     logging.info("Clock's unit: \"%s\"" % clock_dat.unit)
     logging.info("Number of CpGs used: %d" % clock_dat.ncpg)
     logging.info("Clock's description: \"%s\"" % clock_dat.info)
-    clock_coef = pd.Series(clock_dat.coef, name='Coef')
-    clock_intercept = clock_dat.Intercept
-
-    logging.info("Read input file: \"%s\"" % beta_file)
-    input_df1 = pd.read_csv(beta_file, sep=None, index_col=0, engine='python')
 
-    input_df2 = impute_beta(input_df1, method=imputation_method, ref=ext_file)
 
-    (n_cpg, n_sample) = input_df2.shape
-    logging.info(
-        "Input file: \"%s\", Number of CpGs: %d, Number of samples: %d" %
-        (beta_file, n_cpg, n_sample))
-    sample_cpg_ids = input_df2.index
-    # sample_names = df2.columns
-
-    #logging.info("Standardization ...")
-    #scaled_df2 = (input_df2 - input_df2.mean())/input_df2.std()
-
-    logging.info("Extract clock CpGs ...")
-    # clock CpGs missed from data file
-    missed_cpgs = set(clock_coef.index) - set(sample_cpg_ids)
+def check_missed(beta_file, cname, missed_cpgs, n_cpg, na_percent):
+    """Exit if too many clock CpGs (or any CpG of a "strict" clock) are
+    missed from the input."""
     logging.info(
         "Clock CpGs missed from '%s': %d (%f%%)" %
-        (beta_file, len(missed_cpgs), len(missed_cpgs)*100/clock_dat.ncpg))
-
-    if len(missed_cpgs)/clock_dat.ncpg > na_percent:
+        (beta_file, len(missed_cpgs), len(missed_cpgs)*100/n_cpg))
+    if len(missed_cpgs)/n_cpg > na_percent:
         logging.critical(
             "Missing clock CpGs exceed %f%%. Exit!" % (na_percent*100))
         sys.exit(0)
-    if cname == 'Weidner' and len(missed_cpgs) > 0:
+    if CLOCKS[cname].strict is True and len(missed_cpgs) > 0:
         logging.critical(
             "Missing CpGs found: %s. Exit!" % (','.join(missed_cpgs)))
         sys.exit(0)
 
-    common_cpgs = list(set(clock_coef.index) & set(sample_cpg_ids))
-    logging.info(
-        "Clock CpGs exisit in \"%s\": %d" % (beta_file, len(common_cpgs)))
-
-    used_df = input_df2.loc[common_cpgs]
-    used_clock_coef = clock_coef.loc[common_cpgs]
-    (usable_cpg, usable_sample) = used_df.shape
-    logging.info(
-        "Used CpGs: %d, Used samples: %d" % (usable_cpg, usable_sample))
 
-    df4 = used_df.mul(used_clock_coef, axis=0)
+def save_clock_output(output, cname, files, used_df, clock_coef, found,
+                      metafile=None):
+    """
+    Save the predicted ages, the used/missed CpGs and the coefficient plot
+    of a clock.
 
-    output = df4.sum(axis=0) + clock_intercept
-    output.name = "%s" % cname
+    Parameters
+    ----------
+    output : Series
+        Predicted ages.
+    cname : str
+        Clock name.
+    files : dict
+        Output files (see "clock_outfiles").
+    used_df : DataFrame
+        Beta values of the clock CpGs found in the input.
+    clock_coef : Series
+        Coefficients of the clock CpGs.
+    found : array_like
+        Boolean array telling which CpGs of "clock_coef" were found.
+    metafile : str, optional
+        Meta information (e.g., Age, Sex) of samples. The default is None.
 
+    Returns
+    -------
+    Pandas Series (or DataFrame if "metafile" is given).
+    """
     if metafile is not None:
         logging.info("Read meta information file: \"%s\"" % metafile)
         meta_df = pd.read_csv(metafile, sep=None, index_col=0, engine='python')
@@ -200,47 +213,55 @@ def clock_general(beta_file, outfile, cname, metafile=None, delimiter=None,
 
         if len(c_age) >= 2 and len(c_age) == len(d_age):
             logging.info(
-                "Writing R script of scatter plot. Save to: %s" % r_out)
-            plot_corr(c_age, d_age, outfile=scatter_out, rfile=r_out)
+                "Writing R script of scatter plot. Save to: %s" % files['r'])
+            plot_corr(c_age, d_age, outfile=files['scatter'],
+                      rfile=files['r'])
 
     # save used CpGs to file
-    logging.info("Save used CpGs and beta values to: %s" % used_cpg_out)
-    used_df.to_csv(used_cpg_out, sep="\t", index_label="CpG_ID")
+    logging.info("Save used CpGs and beta values to: %s" % files['used'])
+    used_df.to_csv(files['used'], sep="\t", index_label="CpG_ID")
 
     # save missed CpGs to file
-    logging.info("Save missed CpGs: %s" % missed_cpg_out)
-    tmp = pd.DataFrame(list(missed_cpgs), columns=["missed_CpGs"])
-    tmp.to_csv(missed_cpg_out, sep="\t", index=False)
+    logging.info("Save missed CpGs: %s" % files['missed'])
+    tmp = pd.DataFrame(list(clock_coef.index[~found]),
+                       columns=["missed_CpGs"])
+    tmp.to_csv(files['missed'], sep="\t", index=False)
 
     # save coef information
-    logging.info("Save CpG and coefficients to: %s" % coef_out)
+    logging.info("Save CpG and coefficients to: %s" % files['coef'])
     tmp = clock_coef.to_frame()
-    tmp['Found'] = tmp.index.isin(common_cpgs)
-    tmp.to_csv(coef_out, sep="\t", index_label="CpG_ID")
+    tmp['Found'] = found
+    tmp.to_csv(files['coef'], sep="\t", index_label="CpG_ID")
 
     # save predicted age
-    logging.info("Save predicted DNAm age to: %s" % age_out)
-    output.to_csv(age_out, sep="\t", index_label="Sample_ID")
+    logging.info("Save predicted DNAm age to: %s" % files['age'])
+    output.to_csv(files['age'], sep="\t", index_label="Sample_ID")
 
     # generate coefficient plot
-    logging.info("Writing R script of coefficient plot. Save to: %s" % r_out)
-    plot_coef(coef_out, figure_out, r_out)
+    logging.info("Generate coefficient plot. Save to: %s" % files['figure'])
+    plot_coef(files['coef'], files['figure'], files['r'])
 
-    logging.info("Running R script: %s" % r_out)
+    logging.info("Running R script: %s" % files['r'])
     try:
-        subprocess.call("Rscript " + r_out, shell=True)
+        subprocess.call("Rscript " + files['r'], shell=True)
     except subprocess.CalledProcessError as e:
-        print("Cannot generate pdf file from " + r_out, file=sys.stderr)
+        print("Cannot generate pdf file from " + files['r'], file=sys.stderr)
         print(e.output, file=sys.stderr)
         pass
     return output
 
 
-def clock_blup_en(beta_file, outfile, metafile=None, delimiter=None,
-                  cname="Zhang_BLUP", ff='pdf', na_percent=0.2,
-                  ovr=False, imputation_method=11, ext_file=None):
+def clock_linear(beta_file, outfile, cname, metafile=None, delimiter=None,
+                 ff='pdf', na_percent=0.2, ovr=False, imputation_method=11,
+                 ext_file=None, impute_clock_only=False, knn_pool=1000,
+                 cache_dir=None, ref_panel=None, n_jobs=1, adult_age=None,
+                 knn_max_donors=50000):
     """
-    Calculate DNAm age using the "Zhang_BLUP" or "Zhang_EN" clocks.
+    Calculate DNAm age using a linear clock (see "registry.CLOCKS").
+
+    The clock's preprocessing (per-sample standardization of the "Zhang"
+    clocks) and output transform (e.g., Horvath's anti.trafo) are declared
+    by its model, and the ages are computed by "scoring.score_linear".
 
     Parameters
     ----------
@@ -255,6 +276,9 @@ def clock_blup_en(beta_file, outfile, metafile=None, delimiter=None,
         ...
     outfile : str
         The prefix of out files.
+    cname : str
+        Clock name. Must be a "linear" clock of "registry.CLOCKS" (e.g.,
+        "Horvath13", "Zhang_EN", "Levine", "GA_Knight" or "Weidner").
     metafile : str, optional
         Meta information (e.g., Age, Sex) of samples.
         Example of a meta file
@@ -266,9 +290,6 @@ def clock_blup_en(beta_file, outfile, metafile=None, delimiter=None,
     delimiter : str, optional
         Character used to separate columns of the input file.
         The default is None
-    cname : str, optional
-        Clock name. Must be one of ["Zhang_BLUP", "Zhang_EN"].
-        The default is "Zhang_BLUP".
     ff : str, optional
         The figure format. Must be one of ['pdf', 'png'].
         The default is 'pdf'.
@@ -284,167 +305,240 @@ def clock_blup_en(beta_file, outfile, metafile=None, delimiter=None,
         This is must be exisit if imputation_method is set to 10.
         Two-column, Tab or comma separated file: 1st column is CpG ID, the 2nd
         column is beta value.
+    impute_clock_only : bool, optional
+        If set, only impute the clock CpGs instead of all CpGs of the input
+        file. The default is False.
+    knn_pool : int, optional
+        The maximum number of non-clock CpGs used as KNN neighbor candidates
+        when impute_clock_only is set. The default is 1000.
+    knn_max_donors : int, optional
+        The maximum number of CpGs used as KNN neighbor candidates when the
+        whole input is imputed (see "imputation.impute_knn"). 0 uses all
+        CpGs. The default is 50000.
+    cache_dir : str, optional
+        Directory of the binary cache of parsed beta files. See
+        "betareader.read_beta". The default is None (no cache).
+    ref_panel : str, optional
+        Name of the reference panel in "ext_file". If None, the first panel
+        is used. The default is None.
+    n_jobs : int, optional
+        Number of worker processes. The default is 1.
+    adult_age : int, optional
+        "adult_age" of Horvath's anti.trafo. If None, it is given by the
+        clock (20, or 48 for "Ped_Wu"). Do not change this value. The
+        default is None.
 
     Returns
     -------
     Pandas Series.
     """
-
-    # set up the prefix for output files.
-    if outfile is not None:
-        out_prefix = outfile
-    else:
-        out_prefix = cname + '_out'
-    logging.info(
-        "The prefix of output files is set to \"%s\"." % out_prefix)
-
-    used_cpg_out = out_prefix + '.predictorCpG_found.tsv'
-    missed_cpg_out = out_prefix + '.predictorCpG_missed.tsv'
-    age_out = out_prefix + '.DNAm_age.tsv'
-    coef_out = out_prefix + '.predictorCpG_coef.tsv'
-    r_out = out_prefix + '.plots.R'
-    if ff.lower() in ['pdf', 'png']:
-        figure_out = out_prefix + '.coef_plot.' + ff.lower()
-        scatter_out = out_prefix + '.scatter_plot.' + ff.lower()
-    else:
-        logging.error("Does not suppor format: %s!" % ff)
+    if clock_runner(cname) != 'linear':
+        logging.error(
+            "Not a linear clock: %s. Must be one of: %s" %
+            (cname, ','.join(clocks_of('linear'))))
         sys.exit(0)
-    outfiles = [used_cpg_out, missed_cpg_out, age_out, coef_out, r_out,
-                figure_out, scatter_out]
-
-    if ovr is True:
-        logging.warning(
-            "Over write existing files with prefix: %s" % out_prefix)
-        for tmp in outfiles:
-            try:
-                os.remove(tmp)
-            except FileNotFoundError:
-                pass
-    else:
-        for tmp in outfiles:
-            if os.path.exists(tmp):
-                logging.error(
-                    ("%s exists! Use different prefix or specify "
-                    "\"--overwrite\" to replace existing files." % tmp))
-                sys.exit(0)
+    files = clock_outfiles(outfile, cname, ff=ff, ovr=ovr)
 
     logging.info("Loading %s clock data ..." % cname)
-    model_file = cname + '.pkl'
-    fh = importlib.resources.open_binary('dmc.data', model_file)
-    clock_dat = pickle.load(fh)
-
-    logging.info("Clock's name: \"%s\"" % clock_dat.name)
-    logging.info(
-        "Clock was trained from: \"%s\"" %
-        ','.join(clock_dat.tissues))
-    logging.info("Clock's unit: \"%s\"" % clock_dat.unit)
-    logging.info("Number of CpGs used: %d" % clock_dat.ncpg)
-    logging.info("Clock's description: \"%s\"" % clock_dat.info)
-    clock_coef = pd.Series(clock_dat.coef, name='Coef')
-    clock_intercept = clock_dat.Intercept
+    clock_dat = load_clock(model_name(cname))
+    log_clock(clock_dat)
+    clock_coef = clock_dat.coef_series()
+    # the "Zhang" clocks standardize each sample using all CpGs of the input
+    zscore = clock_dat.transform == 'zscore'
 
     logging.info("Read input file: \"%s\"" % beta_file)
-    input_df1 = pd.read_csv(beta_file, sep=None, index_col=0, engine='python')
-
-    input_df2 = impute_beta(input_df1, method=imputation_method, ref=ext_file)
-
+    input_df1 = read_clock_input(
+        beta_file, delimiter=delimiter,
+        cpgs=clock_coef.index
+        if impute_clock_only is True and not zscore else None,
+        imputation_method=imputation_method, knn_pool=knn_pool,
+        cache_dir=cache_dir)
+
+    if impute_clock_only is True:
+        input_df2 = impute_clock_cpgs(
+            input_df1, clock_coef.index, method=imputation_method,
+            ref=ext_file, knn_pool=knn_pool, max_donors=knn_max_donors,
+            ref_panel=ref_panel, n_jobs=n_jobs)
+    else:
+        input_df2 = impute_beta(
+            input_df1, method=imputation_method, ref=ext_file,
+            ref_panel=ref_panel, max_donors=knn_max_donors, n_jobs=n_jobs)
     (n_cpg, n_sample) = input_df2.shape
     logging.info(
         "Input file: \"%s\", Number of CpGs: %d, Number of samples: %d" %
         (beta_file, n_cpg, n_sample))
-    sample_cpg_ids = input_df2.index
-    # sample_names = df2.columns
 
-    logging.info("Standardization ...")
-    scaled_df2 = (input_df2 - input_df2.mean())/input_df2.std()
+    sample_mean = sample_std = None
+    if zscore:
+        logging.info("Standardization ...")
+        # use the statistics of all CpGs, not only the imputed clock CpGs
+        sample_mean, sample_std = sample_stats(
+            input_df1 if impute_clock_only is True else input_df2)
 
     logging.info("Extract clock CpGs ...")
-    # clock CpGs missed from data file
-    missed_cpgs = set(clock_coef.index) - set(sample_cpg_ids)
-    logging.info(
-        "Clock CpGs missed from '%s': %d (%f%%)" %
-        (beta_file, len(missed_cpgs), len(missed_cpgs)*100/clock_dat.ncpg))
-
-    if len(missed_cpgs)/clock_dat.ncpg > na_percent:
-        logging.critical(
-            "Missing clock CpGs exceed %f%%. Exit!" % (na_percent*100))
-        sys.exit(0)
-
-    common_cpgs = list(set(clock_coef.index) & set(sample_cpg_ids))
+    found = clock_coef.index.isin(input_df2.index)
+    check_missed(beta_file, cname, clock_coef.index[~found], clock_dat.ncpg,
+                 na_percent)
+    common_cpgs = clock_coef.index[found]
     logging.info(
         "Clock CpGs exisit in \"%s\": %d" % (beta_file, len(common_cpgs)))
 
-    used_df = scaled_df2.loc[common_cpgs]
-    used_clock_coef = clock_coef.loc[common_cpgs]
+    used_df = input_df2.loc[common_cpgs]
     (usable_cpg, usable_sample) = used_df.shape
     logging.info(
         "Used CpGs: %d, Used samples: %d" % (usable_cpg, usable_sample))
 
-    df4 = used_df.mul(used_clock_coef, axis=0)
+    scores, _ = score_linear(
+        used_df, {cname: clock_dat}, sample_mean=sample_mean,
+        sample_std=sample_std, adult_age=adult_age)
+    output = scores[cname]
+    if zscore:
+        used_df = (used_df - sample_mean)/sample_std
 
-    output = df4.sum(axis=0) + clock_intercept
-    output.name = "%s" % cname
+    return save_clock_output(output, cname, files, used_df, clock_coef,
+                             found, metafile=metafile)
 
-    if metafile is not None:
-        logging.info("Read meta information file: \"%s\"" % metafile)
-        meta_df = pd.read_csv(metafile, sep=None, index_col=0, engine='python')
-        meta_df.index = meta_df.index.astype(str)
-        # combine predicted age and other meta information
-        logging.info("Combining meta information with predicted age")
-        output = pd.concat([output, meta_df], axis=1)
 
-        # generate scatter plot between c_age and d_age
-        c_age = []
-        for col_id in output.columns:
-            if col_id.lower() == 'age':
-                c_age = output[col_id]
-                break
-        d_age = output[cname]
+def clock_general(beta_file, outfile, cname, metafile=None, delimiter=None,
+                  **kwargs):
+    """Calculate DNAm age using the "Weidner", "Lin", "ENCen100" or
+    "ENCen40" clocks. See "clock_linear"."""
+    return clock_linear(beta_file, outfile, cname, metafile=metafile,
+                        delimiter=delimiter, **kwargs)
 
-        if len(c_age) >= 2 and len(c_age) == len(d_age):
-            logging.info(
-                "Writing R script of scatter plot. Save to: %s" % r_out)
-            plot_corr(c_age, d_age, outfile=scatter_out, rfile=r_out)
 
-    # save used CpGs to file
-    logging.info("Save used CpGs and beta values to: %s" % used_cpg_out)
-    used_df.to_csv(used_cpg_out, sep="\t", index_label="CpG_ID")
+def clock_blup_en(beta_file, outfile, metafile=None, delimiter=None,
+                  cname="Zhang_BLUP", **kwargs):
+    """Calculate DNAm age using the "Zhang_BLUP" or "Zhang_EN" clocks. See
+    "clock_linear"."""
+    return clock_linear(beta_file, outfile, cname, metafile=metafile,
+                        delimiter=delimiter, **kwargs)
 
-    # save missed CpGs to file
-    logging.info("Save missed CpGs: %s" % missed_cpg_out)
-    tmp = pd.DataFrame(list(missed_cpgs), columns=["missed_CpGs"])
-    tmp.to_csv(missed_cpg_out, sep="\t", index=False)
 
-    # save coef information
-    logging.info("Save CpG and coefficients to: %s" % coef_out)
-    tmp = clock_coef.to_frame()
-    tmp['Found'] = tmp.index.isin(common_cpgs)
-    tmp.to_csv(coef_out, sep="\t", index_label="CpG_ID")
+def clock_horvath(beta_file, outfile, metafile=None, delimiter=None,
+                  adult_age=20, cname="Horvath13", **kwargs):
+    """Calculate DNAm age using the "Horvath13", "Horvath13_shrunk",
+    "Horvath18", "PedBE", "Ped_Wu", "MEAT" or "Cortical" clocks. See
+    "clock_linear"."""
+    return clock_linear(beta_file, outfile, cname, metafile=metafile,
+                        delimiter=delimiter, adult_age=adult_age, **kwargs)
 
-    # save predicted age
-    logging.info("Save predicted DNAm age to: %s" % age_out)
-    output.to_csv(age_out, sep="\t", index_label="Sample_ID")
 
-    # generate coefficient plot
-    logging.info("Writing R script of coefficient plot. Save to: %s" % r_out)
-    plot_coef(coef_out, figure_out, r_out)
+def clock_levine_hannum(beta_file, outfile, metafile=None, delimiter=None,
+                        cname="Levine", **kwargs):
+    """Calculate DNAm age using the "Levine", "Hannum", or "Lu_DNAmTL"
+    clock. Note, the output of "Lu_DNAmTL" clock is "Kb" (DNA telomere
+    length). See "clock_linear"."""
+    return clock_linear(beta_file, outfile, cname, metafile=metafile,
+                        delimiter=delimiter, **kwargs)
 
-    logging.info("Running R script: %s" % r_out)
-    try:
-        subprocess.call("Rscript " + r_out, shell=True)
-    except subprocess.CalledProcessError as e:
-        print("Cannot generate pdf file from " + r_out, file=sys.stderr)
-        print(e.output, file=sys.stderr)
-        pass
-    return output
+
+def clock_GA(beta_file, outfile, metafile=None, delimiter=None,
+             cname="GA_Knight", **kwargs):
+    """Calculate DNAm age (gestational) using the 'Knight', 'Bohlin',
+    'Mayne', 'Haftorn', 'Lee_CPC', 'Lee_RPC', or 'Lee_cRPC' clock. See
+    "clock_linear"."""
+    return clock_linear(beta_file, outfile, cname, metafile=metafile,
+                        delimiter=delimiter, **kwargs)
+
+
+# AltumAge model, loaded once per process by "altum_predict"
+_altum_model = {}
+
+
+def check_altum_model():
+    """
+    Check that AltumAge can be run: the NumPy model ("AltumAge_net.npz")
+    exists (see "dmc.altum.find_altum"), or TensorFlow and the Keras model
+    ("AltumAge.h5") are available. Raise ImportError or FileNotFoundError
+    (with a readable message) if not.
+    """
+    if find_altum() is not None:
+        return
+    if importlib.util.find_spec('tensorflow') is None:
+        raise ImportError(
+            "AltumAge requires TensorFlow (\"pip3 install tensorflow\") "
+            "to load the Keras model and export it to \"%s\"." %
+            altum_cache_file())
+    h5_file = os.path.join(os.path.dirname(__file__), "data", "AltumAge.h5")
+    if not os.path.exists(h5_file):
+        raise FileNotFoundError(
+            "AltumAge model \"%s\" does not exist." % h5_file)
+
+
+def load_altum_model():
+    """
+    Load the AltumAge model once per process.
+
+    The NumPy model ("AltumAge_net.npz", see "dmc.altum") is used if it exists.
+    Otherwise the Keras model ("AltumAge.h5") is loaded with TensorFlow and
+    exported to the user cache directory, so later runs use the NumPy model.
+    If the export fails, Keras is used for prediction (see
+    "check_altum_model" for the errors).
+    """
+    if len(_altum_model) == 0:
+        check_altum_model()
+        net = load_altum()
+        if net is None:
+            logging.info(
+                "Load the Keras AltumAge model and export it to \"%s\"" %
+                altum_cache_file())
+            import tensorflow as tf
+            from dmc.tf_mse import mse
+            this_dir, this_filename = os.path.split(__file__)
+            scaler = pd.read_pickle(
+                os.path.join(this_dir, "data", "scaler.pkl"))
+            model = tf.keras.models.load_model(
+                os.path.join(this_dir, "data", "AltumAge.h5"),
+                custom_objects={'mse': mse})
+            cpgs = pd.read_pickle(
+                os.path.join(this_dir, "data", "multi_platform_cpgs.pkl"))
+            net = cache_altum(model, scaler.center_, scaler.scale_,
+                              cpgs=cpgs)
+            if net is None:
+                _altum_model['scaler'] = scaler
+                _altum_model['model'] = model
+        if net is not None:
+            _altum_model['net'] = net
+    return _altum_model
+
+
+def altum_predict(beta_df):
+    """
+    Predict the AltumAge of samples (see "load_altum_model").
+
+    Parameters
+    ----------
+    beta_df : DataFrame
+        Imputed beta values of the AltumAge CpGs (CpGs x samples, in the
+        order of "multi_platform_cpgs.pkl").
+
+    Returns
+    -------
+    Pandas Series (indexed by samples).
+    """
+    load_altum_model()
+    if 'net' in _altum_model:
+        return pd.Series(
+            _altum_model['net'].predict(beta_df.to_numpy()),
+            index=beta_df.columns)
+    # AltumAge used the transposed beta value matrix
+    scaler = _altum_model['scaler']
+    ages = np.empty(beta_df.shape[1])
+    for start, end, x in scaled_batches(
+            beta_df.to_numpy(), scaler.center_, scaler.scale_):
+        ages[start:end] = _altum_model['model'].predict(x).flatten()
+    return pd.Series(ages, index=beta_df.columns)
 
 
-def clock_horvath(beta_file, outfile, metafile=None, delimiter=None, adult_age=20,
-                  cname="Horvath_2013", ff='pdf', na_percent=0.2, ovr=False,
-                  imputation_method=11, ext_file=None):
+def altum_age(beta_file, outfile, metafile=None, delimiter=None,
+              cname="AltumAge", ff='pdf', na_percent=0.2, ovr=False,
+              imputation_method=11, ext_file=None,
+              impute_clock_only=False, knn_pool=1000,
+              cache_dir=None, ref_panel=None, n_jobs=1, knn_max_donors=50000):
     """
-    Calculate DNAm age using the "Horvath_2013", "Horvath13_shrunk", 
-    "Horvath_2018", "PedPE", "Ped_Wu", "MEAT" or "Cortical" clocks.
+    Calculate DNAm age (gestational) using the 'Knight', 'Bohlin', 'Mayne',
+    'Haftorn', or 'Lee' clock.
 
     Parameters
     ----------
@@ -469,11 +563,8 @@ def clock_horvath(beta_file, outfile, metafile=None, delimiter=None, adult_age=2
     delimiter : str, optional
         Character used to separate columns of the input file.
         The default is None
-    adult_age : int, optional
-        Default is 20. Do not change this value.
     cname : str, optional
-        Clock name. Must be one of ["Horvath_2013", "Horvath_2018", "PedPE",
-        "Ped_Wu", "MEAT"]. The default is "Horvath_2013".
+        Clock name. Set to "AltumAge" (do NOT change)
     ff : str, optional
         The figure format. Must be one of ['pdf', 'png'].
         The default is 'pdf'.
@@ -489,11 +580,28 @@ def clock_horvath(beta_file, outfile, metafile=None, delimiter=None, adult_age=2
         This is must be exisit if imputation_method is set to 10.
         Two-column, Tab or comma separated file: 1st column is CpG ID, the 2nd
         column is beta value.
+    impute_clock_only : bool, optional
+        If set, only impute the clock CpGs instead of all CpGs of the input
+        file. The default is False.
+    knn_pool : int, optional
+        The maximum number of non-clock CpGs used as KNN neighbor candidates
+        when impute_clock_only is set. The default is 1000.
+    knn_max_donors : int, optional
+        The maximum number of CpGs used as KNN neighbor candidates when the
+        whole input is imputed (see "imputation.impute_knn"). 0 uses all
+        CpGs. The default is 50000.
+    cache_dir : str, optional
+        Directory of the binary cache of parsed beta files. See
+        "betareader.read_beta". The default is None (no cache).
+    ref_panel : str, optional
+        Name of the reference panel in "ext_file". If None, the first panel
+        is used. The default is None.
+    n_jobs : int, optional
+        Number of worker processes. The default is 1.
 
     Returns
     -------
     Pandas Series.
-
     """
     # set up the prefix for output files.
     if outfile is not None:
@@ -525,6 +633,9 @@ def clock_horvath(beta_file, outfile, metafile=None, delimiter=None, adult_age=2
                 os.remove(tmp)
             except FileNotFoundError:
                 pass
+        for tmp in outfiles:
+            if os.path.exists(tmp):
+                os.remove(tmp)
     else:
         for tmp in outfiles:
             if os.path.exists(tmp):
@@ -534,684 +645,67 @@ def clock_horvath(beta_file, outfile, metafile=None, delimiter=None, adult_age=2
                 sys.exit(0)
 
     logging.info("Loading %s clock data ..." % cname)
-    model_file = cname + '.pkl'
-    fh = importlib.resources.open_binary('dmc.data', model_file)
-    clock_dat = pickle.load(fh)
+    if cname == 'AltumAge':
+        this_dir, this_filename = os.path.split(__file__)
+        cpg_path = os.path.join(this_dir, "data", "multi_platform_cpgs.pkl")
+        cpgs = np.array(pd.read_pickle(cpg_path))
 
+    clock_dat = load_clock('AltumAge')
     logging.info("Clock's name: \"%s\"" % clock_dat.name)
     logging.info(
         "Clock was trained from: \"%s\"" % ','.join(clock_dat.tissues))
     logging.info("Clock's unit: \"%s\"" % clock_dat.unit)
-    logging.info("Number of CpGs used: %d" % clock_dat.ncpg)
+    logging.info("Number of CpGs used: %d" % len(cpgs))
     logging.info("Clock's description: \"%s\"" % clock_dat.info)
-    clock_coef = pd.Series(clock_dat.coef, name='Coef')
-    clock_intercept = clock_dat.Intercept
-
-    logging.info("Read input file: \"%s\"" % beta_file)
-    input_df1 = pd.read_csv(
-        beta_file, sep=delimiter, index_col=0, engine='python')
-
-    input_df2 = impute_beta(input_df1, method=imputation_method, ref=ext_file)
-    (n_cpg, n_sample) = input_df2.shape
-    logging.info(
-        "Input file: \"%s\", Number of CpGs: %d, Number of samples: %d" %
-        (beta_file, n_cpg, n_sample))
-    sample_cpg_ids = input_df2.index
-    # sample_names = df2.columns
-
-    # printlog("Standardization ...")
-    # scaled_df2 = (input_df2 - input_df2.mean())/input_df2.std()
+    try:
+        check_altum_model()
+    except (ImportError, FileNotFoundError) as e:
+        logging.error(str(e))
+        sys.exit(0)
 
-    logging.info("Extract clock CpGs ...")
-    # clock CpGs missed from data file
-    missed_cpgs = set(clock_coef.index) - set(sample_cpg_ids)
-    logging.info(
-        "Clock CpGs missed from '%s': %d (%f%%)" %
-        (beta_file, len(missed_cpgs), len(missed_cpgs)*100/clock_dat.ncpg))
+    logging.info("Read input file: \"%s\" ..." % beta_file)
+    input_df1 = read_clock_input(
+        beta_file, delimiter=delimiter,
+        cpgs=cpgs if impute_clock_only is True else None,
+        imputation_method=imputation_method, knn_pool=knn_pool,
+        cache_dir=cache_dir)
 
-    if len(missed_cpgs)/clock_dat.ncpg > na_percent:
-        logging.critical(
-            "Missing clock CpGs exceed %f%%. Exit!" % (na_percent*100))
-        sys.exit(0)
+    # check if there is any missed CpGs
+    n_missed = int((~pd.Index(cpgs).isin(input_df1.index)).sum())
+    logging.info("%d CpGs were missed from %s" % (n_missed, beta_file))
+
+    if impute_clock_only is True:
+        input_df2 = impute_clock_cpgs(
+            input_df1, cpgs, method=imputation_method, ref=ext_file,
+            knn_pool=knn_pool, max_donors=knn_max_donors,
+            ref_panel=ref_panel, n_jobs=n_jobs)
+    else:
+        input_df2 = impute_beta(
+            input_df1, method=imputation_method, ref=ext_file,
+            ref_panel=ref_panel, max_donors=knn_max_donors, n_jobs=n_jobs)
 
-    common_cpgs = list(set(clock_coef.index) & set(sample_cpg_ids))
-    logging.info(
-        "Clock CpGs exisit in \"%s\": %d" % (beta_file, len(common_cpgs)))
+    # one lookup of the clock CpGs (in the model's order). Missed CpGs
+    # are filled with zeros.
+    logging.info("Extract clock CpG from data frame ...")
+    df_used = input_df2.reindex(cpgs, fill_value=0)
 
-    used_df = input_df2.loc[common_cpgs]
-    used_clock_coef = clock_coef.loc[common_cpgs]
-    (usable_cpg, usable_sample) = used_df.shape
+    (usable_cpg, usable_sample) = df_used.shape
     logging.info(
         "Used CpGs: %d, Used samples: %d" % (usable_cpg, usable_sample))
 
-    df4 = used_df.mul(used_clock_coef, axis=0)
-
-    # df4.to_csv('df4.csv')
-    output = df4.sum(axis=0) + clock_intercept
-    # adoped from the "anti.trafo" funciton from:
-    # https://rdrr.io/github/perishky/meffonym/src/tests/horvath-example.r
-    for indx, val in output.items():
-        if val < 0:
-            if cname == 'Ped_Wu':
-                output[indx] = ((1 + adult_age)*np.exp(val) - 1)/12.0
-            else:
-                output[indx] = (1 + adult_age)*np.exp(val) - 1
-        else:
-            if cname == 'Ped_Wu':
-                output[indx] = ((1 + adult_age)*val + adult_age)/12.0
-            else:
-                output[indx] = (1 + adult_age)*val + adult_age
-    output.name = "%s" % cname
-
-    if metafile is not None:
-        logging.info("Read meta information file: \"%s\"" % metafile)
-        meta_df = pd.read_csv(metafile, sep=None, index_col=0, engine='python')
-        meta_df.index = meta_df.index.astype(str)
-        # combine predicted age and other meta information
-        logging.info("Combining meta information with predicted age")
-        output = pd.concat([output, meta_df], axis=1)
-
-        # generate scatter plot between c_age and d_age
-        c_age = []
-        for col_id in output.columns:
-            if col_id.lower() == 'age':
-                c_age = output[col_id]
-                break
-        d_age = output[cname]
-
-        if len(c_age) >= 2 and len(c_age) == len(d_age):
-            logging.info(
-                "Writing R script of scatter plot. Save to: %s" % r_out)
-            plot_corr(c_age, d_age, outfile=scatter_out, rfile=r_out)
-
-    # save used CpGs to file
-    logging.info("Save used CpGs and beta values to: %s" % used_cpg_out)
-    used_df.to_csv(used_cpg_out, sep="\t", index_label="CpG_ID")
-
-    # save missed CpGs to file
-    logging.info("Save missed CpGs: %s" % missed_cpg_out)
-    tmp = pd.DataFrame(list(missed_cpgs), columns=["missed_CpGs"])
-    tmp.to_csv(missed_cpg_out, sep="\t", index=False)
-
-    # save coef information
-    logging.info("Save CpG and coefficients to: %s" % coef_out)
-    tmp = clock_coef.to_frame()
-    tmp['Found'] = tmp.index.isin(common_cpgs)
-    tmp.to_csv(coef_out, sep="\t", index_label="CpG_ID")
-
-    # save predicted age
-    logging.info("Save predicted DNAm age to: %s" % age_out)
-    output.to_csv(age_out, sep="\t", index_label="Sample_ID")
-
-    # generate coefficient plot
-    logging.info("Generate coefficient plot. Save to: %s" % figure_out)
-    plot_coef(coef_out, figure_out, r_out)
-
-    logging.info("Running R script: %s" % r_out)
-    try:
-        subprocess.call("Rscript " + r_out, shell=True)
-    except subprocess.CalledProcessError as e:
-        print("Cannot generate pdf file from " + r_out, file=sys.stderr)
-        print(e.output, file=sys.stderr)
-        pass
-
-    return output
-
-
-def clock_levine_hannum(beta_file, outfile, metafile=None, delimiter=None,
-                        cname="Levine", ff='pdf', na_percent=0.2, ovr=False,
-                        imputation_method=11, ext_file=None):
-    """
-    Calculate DNAm age using the "Levine", "Hannum", or "Lu_DNAmTL" clock.
-    Note, the output of "Lu_DNAmTL" clock is "Kb" (DNA telomere length)
-
-    Parameters
-    ----------
-    beta_file : str
-        The input tabular structure file containing DNA methylation data.
-        #example of CSV file
-        ID_REF,s55N,s58N,s64N,s68N,s72N,s74N,s76N,s77N
-        cg26928153,0.86007,0.79695,0.72618,0.67142,0.70801,0.80371,0.8715,0.789
-        cg16269199,0.74023,0.64148,0.65569,0.64138,0.56486,0.5707,0.7531,0.672
-        cg13869341,0.76405,0.7559,0.7059,0.82141,0.72888,0.72055,0.8705,0.808
-        ...
-    outfile : str
-        The prefix of out files.
-    metafile : str, optional
-        Meta information (e.g., Age, Sex) of samples.
-        Example of a meta file
-            Sample_ID       Age     Sex
-            s16N    65      M
-            s36N    60      F
-            s45N    61      M
-            ...
-    delimiter : str, optional
-        Character used to separate columns of the input file.
-        The default is None
-    cname : str, optional
-        Clock name. Must be one of ["Levine", "Hannum", "Lu_DNAmTL"].
-        The default is "Levine".
-    ff : str, optional
-        The figure format. Must be one of ['pdf', 'png'].
-        The default is 'pdf'.
-    na_percent : float, optional
-        The maximum of percent of missing values.
-        The default is 0.2 (20%).
-    ovr : bool, optional
-        If set, over write existing files. The default is False
-    imputation_method : int
-        Must be one of [-1, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]. See
-        imputation.py for details. default is 6.
-    ext_file : str
-        This is must be exisit if imputation_method is set to 10.
-        Two-column, Tab or comma separated file: 1st column is CpG ID, the 2nd
-        column is beta value.
-
-    Returns
-    -------
-    Pandas Series.
-    """
-
-    # set up the prefix for output files.
-    if outfile is not None:
-        out_prefix = outfile
-    else:
-        out_prefix = cname + '_out'
-    logging.info(
-        "The prefix of output files is set to \"%s\"." % out_prefix)
-
-    used_cpg_out = out_prefix + '.predictorCpG_found.tsv'
-    missed_cpg_out = out_prefix + '.predictorCpG_missed.tsv'
-    age_out = out_prefix + '.DNAm_age.tsv'
-    coef_out = out_prefix + '.predictorCpG_coef.tsv'
-    r_out = out_prefix + '.plots.R'
-    if ff.lower() in ['pdf', 'png']:
-        figure_out = out_prefix + '.coef_plot.' + ff.lower()
-        scatter_out = out_prefix + '.scatter_plot.' + ff.lower()
-    else:
-        logging.error("Does not suppor format: %s!" % ff)
-        sys.exit(0)
-    outfiles = [used_cpg_out, missed_cpg_out, age_out, coef_out, r_out,
-                figure_out, scatter_out]
-
-    if ovr is True:
-        logging.warning(
-            "Over write existing files with prefix: %s" % out_prefix)
-        for tmp in outfiles:
-            try:
-                os.remove(tmp)
-            except FileNotFoundError:
-                continue
-    else:
-        for tmp in outfiles:
-            if os.path.exists(tmp):
-                logging.error(
-                    ("%s exists! Use different prefix or specify "
-                    "\"--overwrite\" to replace existing files." % tmp))
-                sys.exit(0)
-
-    logging.info("Loading %s clock data ..." % cname)
-    model_file = cname + '.pkl'
-    fh = importlib.resources.open_binary('dmc.data', model_file)
-    clock_dat = pickle.load(fh)
-
-    logging.info("Clock's name: \"%s\"" % clock_dat.name)
-    logging.info(
-        "Clock was trained from: \"%s\"" % ','.join(clock_dat.tissues))
-    logging.info("Clock's unit: \"%s\"" % clock_dat.unit)
-    logging.info("Number of CpGs used: %d" % clock_dat.ncpg)
-    logging.info("Clock's description: \"%s\"" % clock_dat.info)
-    clock_coef = pd.Series(clock_dat.coef, name='Coef')
-    clock_intercept = clock_dat.Intercept
-
-    logging.info("Read input file: \"%s\"" % beta_file)
-    input_df1 = pd.read_csv(beta_file, sep=None, index_col=0, engine='python')
-
-    input_df2 = impute_beta(input_df1, method=imputation_method, ref=ext_file)
-    (n_cpg, n_sample) = input_df2.shape
-    logging.info(
-        "Input file: \"%s\", Number of CpGs: %d, Number of samples: %d" %
-        (beta_file, n_cpg, n_sample))
-    sample_cpg_ids = input_df2.index
-    # sample_names = df2.columns
-
-    # printlog("Standardization ...")
-    # scaled_df2 = (input_df2 - input_df2.mean())/input_df2.std()
-
-    logging.info("Extract clock CpGs ...")
-    # clock CpGs missed from data file
-    missed_cpgs = set(clock_coef.index) - set(sample_cpg_ids)
-    logging.info(
-        "Clock CpGs missed from '%s': %d (%f%%)" %
-        (beta_file, len(missed_cpgs), len(missed_cpgs)*100/clock_dat.ncpg))
-
-    if len(missed_cpgs)/clock_dat.ncpg > na_percent:
-        logging.critical(
-            "Missing clock CpGs exceed %f%%. Exit!" % (na_percent*100))
-        sys.exit(0)
-
-    common_cpgs = list(set(clock_coef.index) & set(sample_cpg_ids))
-    logging.info(
-        "Clock CpGs exisit in \"%s\": %d" % (beta_file, len(common_cpgs)))
-
-    used_df = input_df2.loc[common_cpgs]
-    used_clock_coef = clock_coef.loc[common_cpgs]
-    (usable_cpg, usable_sample) = used_df.shape
-    logging.info(
-        "Used CpGs: %d, Used samples: %d" % (usable_cpg, usable_sample))
-
-    df4 = used_df.mul(used_clock_coef, axis=0)
-
-    # df4.to_csv('df4.csv')
-    output = df4.sum(axis=0) + clock_intercept
-
-    output.name = "%s" % cname
-
-    if metafile is not None:
-        logging.info("Read meta information file: \"%s\"" % metafile)
-        meta_df = pd.read_csv(metafile, sep=None, index_col=0, engine='python')
-        meta_df.index = meta_df.index.astype(str)
-        # combine predicted age and other meta information
-        logging.info("Combining meta information with predicted age")
-        output = pd.concat([output, meta_df], axis=1)
-
-        # generate scatter plot between c_age and d_age
-        c_age = []
-        for col_id in output.columns:
-            if col_id.lower() == 'age':
-                c_age = output[col_id]
-                break
-        d_age = output[cname]
-
-        if len(c_age) >= 2 and len(c_age) == len(d_age):
-            logging.info(
-                "Writing R script of scatter plot. Save to: %s" % r_out)
-            plot_corr(c_age, d_age, outfile=scatter_out, rfile=r_out)
-
-    # save used CpGs to file
-    logging.info("Save used CpGs and beta values to: %s" % used_cpg_out)
-    used_df.to_csv(used_cpg_out, sep="\t", index_label="CpG_ID")
-
-    # save missed CpGs to file
-    logging.info("Save missed CpGs: %s" % missed_cpg_out)
-    tmp = pd.DataFrame(list(missed_cpgs), columns=["missed_CpGs"])
-    tmp.to_csv(missed_cpg_out, sep="\t", index=False)
-
-    # save coef information
-    logging.info("Save CpG and coefficients to: %s" % coef_out)
-    tmp = clock_coef.to_frame()
-    tmp['Found'] = tmp.index.isin(common_cpgs)
-    tmp.to_csv(coef_out, sep="\t", index_label="CpG_ID")
-
-    # save predicted age
-    logging.info("Save predicted DNAm age to: %s" % age_out)
-    output.to_csv(age_out, sep="\t", index_label="Sample_ID")
-
-    # generate coefficient plot
-    logging.info("Generate coefficient plot. Save to: %s" % figure_out)
-    plot_coef(coef_out, figure_out, r_out)
-
-    logging.info("Running R script: %s" % r_out)
-    try:
-        subprocess.call("Rscript " + r_out, shell=True)
-    except subprocess.CalledProcessError as e:
-        print("Cannot generate pdf file from " + r_out, file=sys.stderr)
-        print(e.output, file=sys.stderr)
-        pass
-    return output
-
-
-def clock_GA(beta_file, outfile, metafile=None, delimiter=None,
-             cname="GA_Knight", ff='pdf', na_percent=0.2, ovr=False,
-             imputation_method=11, ext_file=None):
-    """
-    Calculate DNAm age (gestational) using the 'Knight', 'Bohlin', 'Mayne',
-    'Haftorn', 'Lee_CPC', 'Lee_RPC', or 'Lee_cRPC' clock.
-
-    Parameters
-    ----------
-    beta_file : str
-        The input tabular structure file containing DNA methylation data.
-        #example of CSV file
-        ID_REF,s55N,s58N,s64N,s68N,s72N,s74N,s76N,s77N
-        cg26928153,0.86007,0.79695,0.72618,0.67142,0.70801,0.80371,0.87158,0.78885
-        cg16269199,0.74023,0.64148,0.65569,0.64138,0.56486,0.5707,0.75318,0.67239
-        cg13869341,0.76405,0.7559,0.7059,0.82141,0.72888,0.72055,0.87058,0.80822
-        ...
-    outfile : str
-        The prefix of out files.
-    metafile : str, optional
-        Meta information (e.g., Age, Sex) of samples.
-        Example of a meta file
-            Sample_ID       Age     Sex
-            s16N    65      M
-            s36N    60      F
-            s45N    61      M
-            ...
-    delimiter : str, optional
-        Character used to separate columns of the input file.
-        The default is None
-    cname : str, optional
-        Clock name. Must be one of ['GA_Knight', 'GA_Bohlin', 'GA_Mayne',
-        'GA_Haftorn', 'GA_Lee_CPC', 'GA_Lee_RPC', 'GA_Lee_rRPC'].
-        The default is "GA_Knight".
-    ff : str, optional
-        The figure format. Must be one of ['pdf', 'png'].
-        The default is 'pdf'.
-    na_percent : float, optional
-        The maximum of percent of missing values.
-        The default is 0.2 (20%).
-    ovr : bool, optional
-        If set, over write existing files. The default is False
-    imputation_method : int
-        Must be one of [-1, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]. See
-        imputation.py for details. default is 6.
-    ext_file : str
-        This is must be exisit if imputation_method is set to 10.
-        Two-column, Tab or comma separated file: 1st column is CpG ID, the 2nd
-        column is beta value.
-
-    Returns
-    -------
-    Pandas Series.
-    """
-    # set up the prefix for output files.
-    if outfile is not None:
-        out_prefix = outfile
-    else:
-        out_prefix = cname + '_out'
-    logging.info(
-        "The prefix of output files is set to \"%s\"." % out_prefix)
-
-    used_cpg_out = out_prefix + '.predictorCpG_found.tsv'
-    missed_cpg_out = out_prefix + '.predictorCpG_missed.tsv'
-    age_out = out_prefix + '.DNAm_age.tsv'
-    coef_out = out_prefix + '.predictorCpG_coef.tsv'
-    r_out = out_prefix + '.plots.R'
-    if ff.lower() in ['pdf', 'png']:
-        figure_out = out_prefix + '.coef_plot.' + ff.lower()
-        scatter_out = out_prefix + '.scatter_plot.' + ff.lower()
-    else:
-        logging.error("Does not suppor format: %s!" % ff)
-        sys.exit(0)
-    outfiles = [used_cpg_out, missed_cpg_out, age_out, coef_out, r_out,
-                figure_out, scatter_out]
-
-    if ovr is True:
-        logging.warning(
-            "Over write existing files with prefix: %s" % out_prefix)
-        for tmp in outfiles:
-            try:
-                os.remove(tmp)
-            except FileNotFoundError:
-                pass
-    else:
-        for tmp in outfiles:
-            if os.path.exists(tmp):
-                logging.error(
-                    ("%s exists! Use different prefix or specify "
-                    "\"--overwrite\" to replace existing files." % tmp))
-                sys.exit(0)
-
-    logging.info("Loading %s clock data ..." % cname)
-    model_file = cname + '.pkl'
-    fh = importlib.resources.open_binary('dmc.data', model_file)
-    clock_dat = pickle.load(fh)
-
-    logging.info("Clock's name: \"%s\"" % clock_dat.name)
-    logging.info(
-        "Clock was trained from: \"%s\"" % ','.join(clock_dat.tissues))
-    logging.info("Clock's unit: \"%s\"" % clock_dat.unit)
-    logging.info("Number of CpGs used: %d" % clock_dat.ncpg)
-    logging.info("Clock's description: \"%s\"" % clock_dat.info)
-    clock_coef = pd.Series(clock_dat.coef, name='Coef')
-    clock_intercept = clock_dat.Intercept
-
-    logging.info("Read input file: \"%s\"" % beta_file)
-    input_df1 = pd.read_csv(beta_file, sep=None, index_col=0, engine='python')
-
-    input_df2 = impute_beta(input_df1, method=imputation_method, ref=ext_file)
-    (n_cpg, n_sample) = input_df2.shape
-    logging.info(
-        "Input file: \"%s\", Number of CpGs: %d, Number of samples: %d" %
-        (beta_file, n_cpg, n_sample))
-    sample_cpg_ids = input_df2.index
-    # sample_names = df2.columns
-
-    # printlog("Standardization ...")
-    # scaled_df2 = (input_df2 - input_df2.mean())/input_df2.std()
-
-    logging.info("Extract clock CpGs ...")
-    # clock CpGs missed from data file
-    missed_cpgs = set(clock_coef.index) - set(sample_cpg_ids)
-    logging.info(
-        "Clock CpGs missed from '%s': %d (%f%%)" %
-        (beta_file, len(missed_cpgs), len(missed_cpgs)*100/clock_dat.ncpg))
-
-    if len(missed_cpgs)/clock_dat.ncpg > na_percent:
-        logging.critical(
-            "Missing clock CpGs exceed %f%%. Exit!" % (na_percent*100))
-        sys.exit(0)
-
-    common_cpgs = list(set(clock_coef.index) & set(sample_cpg_ids))
-    logging.info(
-        "Clock CpGs exisit in \"%s\": %d" % (beta_file, len(common_cpgs)))
-
-    used_df = input_df2.loc[common_cpgs]
-    used_clock_coef = clock_coef.loc[common_cpgs]
-    (usable_cpg, usable_sample) = used_df.shape
-    logging.info(
-        "Used CpGs: %d, Used samples: %d" % (usable_cpg, usable_sample))
-
-    df4 = used_df.mul(used_clock_coef, axis=0)
-
-    # df4.to_csv('df4.csv')
-    output = df4.sum(axis=0) + clock_intercept
-    output.name = "%s" % cname
-    if metafile is not None:
-        logging.info("Read meta information file: \"%s\"" % metafile)
-        meta_df = pd.read_csv(metafile, sep=None, index_col=0, engine='python')
-        meta_df.index = meta_df.index.astype(str)
-        # combine predicted age and other meta information
-        logging.info("Combining meta information with predicted age")
-        output = pd.concat([output, meta_df], axis=1)
-        # print(output.to_string())
-        # generate scatter plot between c_age and d_age
-        c_age = []
-        for col_id in output.columns:
-            if col_id.lower() == 'age':
-                c_age = output[col_id]
-                break
-        d_age = output[cname]
-        if len(c_age) >= 2 and len(c_age) == len(d_age):
-            logging.info(
-                "Writing R script of scatter plot. Save to: %s" % r_out)
-            plot_corr(c_age, d_age, outfile=scatter_out, rfile=r_out)
-
-    # save used CpGs to file
-    logging.info("Save used CpGs and beta values to: %s" % used_cpg_out)
-    used_df.to_csv(used_cpg_out, sep="\t", index_label="CpG_ID")
-
-    # save missed CpGs to file
-    logging.info("Save missed CpGs: %s" % missed_cpg_out)
-    tmp = pd.DataFrame(list(missed_cpgs), columns=["missed_CpGs"])
-    tmp.to_csv(missed_cpg_out, sep="\t", index=False)
-
-    # save coef information
-    logging.info("Save CpG and coefficients to: %s" % coef_out)
-    tmp = clock_coef.to_frame()
-    tmp['Found'] = tmp.index.isin(common_cpgs)
-    tmp.to_csv(coef_out, sep="\t", index_label="CpG_ID")
-
-    # save predicted age
-    logging.info("Save predicted DNAm age to: %s" % age_out)
-    output.to_csv(age_out, sep="\t", index_label="Sample_ID")
-
-    # generate coefficient plot
-    logging.info("Generate coefficient plot. Save to: %s" % figure_out)
-    plot_coef(coef_out, figure_out, r_out)
-
-    logging.info("Running R script: %s" % r_out)
-    try:
-        subprocess.call("Rscript " + r_out, shell=True)
-    except subprocess.CalledProcessError as e:
-        print("Cannot generate pdf file from " + r_out, file=sys.stderr)
-        print(e.output, file=sys.stderr)
-        pass
-    return output
-
-
-def altum_age(beta_file, outfile, metafile=None, delimiter=None,
-              cname="AltumAge", ff='pdf', na_percent=0.2, ovr=False,
-              imputation_method=11, ext_file=None):
-    """
-    Calculate DNAm age (gestational) using the 'Knight', 'Bohlin', 'Mayne',
-    'Haftorn', or 'Lee' clock.
-
-    Parameters
-    ----------
-    beta_file : str
-        The input tabular structure file containing DNA methylation data.
-        #example of CSV file
-        ID_REF,s55N,s58N,s64N,s68N,s72N,s74N,s76N,s77N
-        cg26928153,0.86007,0.79695,0.72618,0.67142,0.70801,0.80371,0.87158,0.78885
-        cg16269199,0.74023,0.64148,0.65569,0.64138,0.56486,0.5707,0.75318,0.67239
-        cg13869341,0.76405,0.7559,0.7059,0.82141,0.72888,0.72055,0.87058,0.80822
-        ...
-    outfile : str
-        The prefix of out files.
-    metafile : str, optional
-        Meta information (e.g., Age, Sex) of samples.
-        Example of a meta file
-            Sample_ID       Age     Sex
-            s16N    65      M
-            s36N    60      F
-            s45N    61      M
-            ...
-    delimiter : str, optional
-        Character used to separate columns of the input file.
-        The default is None
-    cname : str, optional
-        Clock name. Set to "AltumAge" (do NOT change)
-    ff : str, optional
-        The figure format. Must be one of ['pdf', 'png'].
-        The default is 'pdf'.
-    na_percent : float, optional
-        The maximum of percent of missing values.
-        The default is 0.2 (20%).
-    ovr : bool, optional
-        If set, over write existing files. The default is False
-    imputation_method : int
-        Must be one of [-1, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]. See
-        imputation.py for details. default is 6.
-    ext_file : str
-        This is must be exisit if imputation_method is set to 10.
-        Two-column, Tab or comma separated file: 1st column is CpG ID, the 2nd
-        column is beta value.
-
-    Returns
-    -------
-    Pandas Series.
-    """
-    import tensorflow as tf
-    from dmc.tf_mse import mse
-    # from sklearn import linear_model, preprocessing
-
-    # set up the prefix for output files.
-    if outfile is not None:
-        out_prefix = outfile
-    else:
-        out_prefix = cname + '_out'
-    logging.info(
-        "The prefix of output files is set to \"%s\"." % out_prefix)
-
-    used_cpg_out = out_prefix + '.predictorCpG_found.tsv'
-    missed_cpg_out = out_prefix + '.predictorCpG_missed.tsv'
-    age_out = out_prefix + '.DNAm_age.tsv'
-    coef_out = out_prefix + '.predictorCpG_coef.tsv'
-    r_out = out_prefix + '.plots.R'
-    if ff.lower() in ['pdf', 'png']:
-        figure_out = out_prefix + '.coef_plot.' + ff.lower()
-        scatter_out = out_prefix + '.scatter_plot.' + ff.lower()
-    else:
-        logging.error("Does not suppor format: %s!" % ff)
-        sys.exit(0)
-    outfiles = [used_cpg_out, missed_cpg_out, age_out, coef_out, r_out,
-                figure_out, scatter_out]
-
-    if ovr is True:
-        logging.warning(
-            "Over write existing files with prefix: %s" % out_prefix)
-        for tmp in outfiles:
-            try:
-                os.remove(tmp)
-            except FileNotFoundError:
-                pass
-        for tmp in outfiles:
-            if os.path.exists(tmp):
-                os.remove(tmp)
-    else:
-        for tmp in outfiles:
-            if os.path.exists(tmp):
-                logging.error(
-                    ("%s exists! Use different prefix or specify "
-                    "\"--overwrite\" to replace existing files." % tmp))
-                sys.exit(0)
-
-    logging.info("Loading %s clock data ..." % cname)
-    if cname == 'AltumAge':
-        this_dir, this_filename = os.path.split(__file__)
-        scaler_path = os.path.join(this_dir, "data", "scaler.pkl")
-        model_path = os.path.join(this_dir, "data", "AltumAge.h5")
-        cpg_path = os.path.join(this_dir, "data", "multi_platform_cpgs.pkl")
-
-        scaler = pd.read_pickle(scaler_path)
-        AltumAge = tf.keras.models.load_model(model_path, custom_objects={'mse': mse})
-        cpgs = np.array(pd.read_pickle(cpg_path))
-
-        fh = importlib.resources.open_binary('dmc.data', 'AltumAge.pkl')
-
-    clock_dat = pickle.load(fh)
-    logging.info("Clock's name: \"%s\"" % clock_dat.name)
-    logging.info(
-        "Clock was trained from: \"%s\"" % ','.join(clock_dat.tissues))
-    logging.info("Clock's unit: \"%s\"" % clock_dat.unit)
-    logging.info("Number of CpGs used: %d" % len(cpgs))
-    logging.info("Clock's description: \"%s\"" % clock_dat.info)
-
-    logging.info("Read input file: \"%s\" ..." % beta_file)
-    input_df1 = pd.read_csv(beta_file, sep=None, index_col=0, engine='python')
-
-    # check if there is any missed CpGs
-    missed_cpgs = list(set(cpgs) - set(input_df1.index))
-    # print (missed_cpgs)
-    logging.info("%d CpGs were missed from %s" % (len(missed_cpgs), beta_file))
-
-    if len(missed_cpgs) > 0:
-        # create a new dataframe with all zeros
-        df_missed = pd.DataFrame(0, index=missed_cpgs, columns=input_df1.columns) 
-        input_df1 = pd.concat([input_df1, df_missed], ignore_index=False)
-    input_df2 = impute_beta(input_df1, method=imputation_method, ref=ext_file)
-
-    logging.info("Transpose input data frame ...")
-    df_transpose = input_df2.T
-
-    logging.info("Extract clock CpG from data frame ...")
-    df_used = df_transpose[cpgs]
-
-    (usable_sample, usable_cpg) = df_used.shape
-    logging.info(
-        "Used CpGs: %d, Used samples: %d" % (usable_cpg, usable_sample))
-
-    # AltumAge used the transposed beta value matrix
-    logging.info(
-        "Scale the beta values of each CpG with sklearn robust scaler ...")
-    df_scaled = scaler.transform(df_used)
-
+    # the beta values of each CpG are scaled with sklearn robust scaler
+    # before prediction (see "altum.scaled_batches"). Blocks of samples are
+    # predicted in parallel if n_jobs > 1. The model is loaded (and, on the
+    # first run, exported) here, so forked workers inherit the NumPy model.
+    # TensorFlow is not fork-safe, so workers are spawned if the export
+    # failed.
     logging.info("AltumAge prediction ...")
-    pred_age_AltumAge = AltumAge.predict(df_scaled).flatten()
+    altum_model = load_altum_model()
+    pred_age_AltumAge = map_sample_blocks(
+        altum_predict, df_used, n_jobs,
+        mp_context=None if 'net' in altum_model else 'spawn')
     output = pd.DataFrame(
-        index=df_used.index, data={cname: list(pred_age_AltumAge)}
+        index=df_used.columns, data={cname: list(pred_age_AltumAge)}
         )
     print(output)
     if metafile is not None:
@@ -1237,7 +731,7 @@ def altum_age(beta_file, outfile, metafile=None, delimiter=None,
 
     # save used CpGs to file
     logging.info("Save used CpGs and beta values to: %s" % used_cpg_out)
-    df_used.to_csv(used_cpg_out, sep="\t", index_label="CpG_ID")
+    df_used.T.to_csv(used_cpg_out, sep="\t", index_label="CpG_ID")
 
     # save missed CpGs to file
     # logging.info("Save missed CpGs: %s" % missed_cpg_out)
@@ -1261,9 +755,13 @@ def altum_age(beta_file, outfile, metafile=None, delimiter=None,
 def clock_epm(beta_file, metafile, outfile, delimiter=None,
               imputation_method=11, ext_file=None, pcc_cut=0.85,
               iter_n=100, error_tol=1e-5, cv_folds=10, frmt='pdf',
-              cname='EPM'):
+              cname='EPM', cache_dir=None, ref_panel=None, n_jobs=1,
+              knn_max_donors=50000):
     """
     Epigenetic Pacemaker (EPM)
+
+    The beta file is cached as binary files in "cache_dir" if provided (see
+    "betareader.read_beta").
     """
     # set up the prefix for output files.
     if outfile is not None:
@@ -1279,19 +777,25 @@ def clock_epm(beta_file, metafile, outfile, delimiter=None,
     train_png_out = out_prefix + '.train_EPM_age.' + frmt
     test_cpg_out = out_prefix + '.test_selected_CpGs.tsv'
     train_cpg_out = out_prefix + '.train_selected_CpGs.tsv'
+    folds_out = out_prefix + '.EPM_CV_folds.tsv'
+    model_out = out_prefix + '.EPM_model.npz'
+    state_out = out_prefix + '.EPM_state.npz'
 
     # Read input beta file
     logging.info("Read input beta file: \"%s\"" % beta_file)
-    beta_df = pd.read_csv(
-        beta_file, sep=delimiter, index_col=0, engine='python')
+    beta_df = read_beta(beta_file, delimiter=delimiter, cache_dir=cache_dir)
 
     # Imputate input beta values
-    beta_df = impute_beta(beta_df, method=imputation_method, ref=ext_file)
+    beta_df = impute_beta(beta_df, method=imputation_method, ref=ext_file,
+                          ref_panel=ref_panel, max_donors=knn_max_donors,
+                          n_jobs=n_jobs)
     (n_cpg, n_sample) = beta_df.shape
     logging.info(
         "Input file: \"%s\", Number of CpGs: %d, Number of samples: %d" %
         (beta_file, n_cpg, n_sample))
     all_CpGs = np.array(beta_df.index)
+    # CpGs x samples (a view of beta_df, not a copy)
+    beta_values = beta_df.to_numpy()
 
     # Read meta information file
     logging.info("Read meta information file: \"%s\"" % metafile)
@@ -1300,6 +804,14 @@ def clock_epm(beta_file, metafile, outfile, delimiter=None,
     # change column names into lower case
     meta_df.columns = meta_df.columns.str.lower()
 
+    missed_samples = meta_df.index[~meta_df.index.isin(beta_df.columns)]
+    if len(missed_samples) > 0:
+        logging.error(
+            "%d samples in \"%s\" are not found in \"%s\": %s ..." %
+            (len(missed_samples), metafile, beta_file,
+             ', '.join(missed_samples[0:5])))
+        sys.exit(0)
+
     if 'age' not in meta_df.columns:
         logging.error(
             "There must be a column named 'age' (case insensitive) in \"%s\""
@@ -1324,7 +836,7 @@ def clock_epm(beta_file, metafile, outfile, delimiter=None,
 
         train_sample_ids = np.array(train_meta_df.index)
         train_sample_ages = np.array(train_meta_df['age'])
-        train_beta_values = beta_df[train_sample_ids].to_numpy()
+        train_cols = beta_df.columns.get_indexer(train_sample_ids)
         logging.info(
             "%d samples are included in training set: %s ..." %
             (len(train_sample_ids), ', '.join(train_sample_ids[0:5]))
@@ -1332,21 +844,21 @@ def clock_epm(beta_file, metafile, outfile, delimiter=None,
 
         test_sample_ids = np.array(test_meta_df.index)
         test_sample_ages = np.array(test_meta_df['age'])
-        test_beta_values = beta_df[test_sample_ids].to_numpy()
+        test_cols = beta_df.columns.get_indexer(test_sample_ids)
         logging.info(
             "%d samples are included in testing set: %s ..." %
             (len(test_sample_ids), ', '.join(test_sample_ids[0:5]))
             )
 
-        # get the absolute value of the correlation coefficient
-        logging.info("Calculate pearson correlation coefficients ...")
-        abs_pcc_coefficients = abs(
-            pearson_correlation(train_beta_values, train_sample_ages))
-
         # return list of site indices with a high absolute correlation
-        # coefficient
-        selected_CpGs_indices = np.where(abs_pcc_coefficients > pcc_cut)[0]
+        # coefficient. The correlation is computed in blocks of CpGs.
+        logging.info("Calculate pearson correlation coefficients ...")
+        train_stats = correlation_stats(
+            beta_values, train_sample_ages, cols=train_cols, n_jobs=n_jobs)
+        selected_CpGs_indices, _ = select_correlated(
+            beta_values, train_sample_ages, pcc_cut, stats=train_stats)
         selected_CpGs = all_CpGs[selected_CpGs_indices]
+        train_beta_values = beta_values[selected_CpGs_indices][:, train_cols]
         logging.info(
             "%d CpG sites are selected: %s ..." %
             (len(selected_CpGs_indices), ', '.join(selected_CpGs[0:5]))
@@ -1355,30 +867,40 @@ def clock_epm(beta_file, metafile, outfile, delimiter=None,
         logging.info(
             "Save beta values of selected CpGs to \"%s\"" % train_cpg_out)
         # beta_df.loc[selected_CpGs].to_csv(cpg_out, sep="\t")
-        beta_df[train_sample_ids].iloc[selected_CpGs_indices].to_csv(
+        beta_df.iloc[selected_CpGs_indices][train_sample_ids].to_csv(
             train_cpg_out, sep="\t")
 
         logging.info(
             "Save beta values of selected CpGs to \"%s\"" % test_cpg_out)
         # beta_df.loc[selected_CpGs].to_csv(cpg_out, sep="\t")
-        beta_df[test_sample_ids].iloc[selected_CpGs_indices].to_csv(
+        beta_df.iloc[selected_CpGs_indices][test_sample_ids].to_csv(
             test_cpg_out, sep="\t")
 
-        # initialize the EPM model
-        logging.info("Initialize the EPM model ...")
-        epm_cv = EpigeneticPacemakerCV(
-            iter_limit=iter_n,
-            error_tolerance=error_tol,
-            cv_folds=cv_folds)
-
-        # fit the model using the training data
+        # fit the model using the training data. CV folds are fitted in
+        # parallel.
         logging.info("Fit the EPM model using training data ...")
-        epm_cv.fit(
-            train_beta_values[selected_CpGs_indices, :],
-            train_sample_ages)
+        epm_cv = fit_epm_cv(
+            train_beta_values, train_sample_ages, cv_folds=cv_folds,
+            iter_limit=iter_n, error_tolerance=error_tol, n_jobs=n_jobs)
+        logging.info(
+            "Save EM iterations of CV folds to \"%s\"" % folds_out)
+        epm_cv['folds'].to_csv(folds_out, sep="\t")
+        logging.info("Save the EPM model to \"%s\"" % model_out)
+        save_epm(
+            model_out, selected_CpGs, epm_cv['rates'], epm_cv['intercepts'],
+            info="Trained from \"%s\" (%d samples)" %
+            (beta_file, len(train_sample_ids)),
+            age_range=[float(np.min(train_sample_ages)),
+                       float(np.max(train_sample_ages))])
+        logging.info("Save the EPM training state to \"%s\"" % state_out)
+        save_state(
+            state_out, all_CpGs, train_stats, pcc_cut, beta_values,
+            train_cols, train_sample_ids, train_sample_ages,
+            predict_epm(train_beta_values, epm_cv['rates'],
+                        epm_cv['intercepts']))
 
         logging.info("Get training sample EPM predictions (when left out) ...")
-        train_predict = epm_cv.predicted_states
+        train_predict = epm_cv['predicted_states']
         train_out = train_meta_df.assign(
             epm_age=pd.Series(train_predict, index=train_meta_df.index))
         logging.info(
@@ -1388,104 +910,504 @@ def clock_epm(beta_file, metafile, outfile, delimiter=None,
 
         # generate predicted ages for testing samples
         logging.info("Predict testing samples ...")
-        test_predict = epm_cv.predict(
-            test_beta_values[selected_CpGs_indices, :])
+        test_predict = predict_epm(
+            beta_values[selected_CpGs_indices][:, test_cols],
+            epm_cv['rates'], epm_cv['intercepts'])
+
+        test_out = test_meta_df.assign(
+            epm_age=pd.Series(test_predict, index=test_meta_df.index))
+        # print(test_out)
+        logging.info(
+            "Save predicted EPM age of testing samples to \"%s\""
+            % test_age_out)
+        test_out.to_csv(test_age_out, sep="\t")
+
+        logging.info(
+            "Generate scatter plot of test samples and save to \"%s\""
+            % test_png_out)
+        plot_known_predicted_ages(
+            known_ages=test_sample_ages,
+            predicted_ages=test_predict,
+            outfile=test_png_out,
+            title="EPM CV predicted ages (testing samples)"
+            )
+        logging.info(
+            "Generate scatter plot of train samples and save to \"%s\""
+            % train_png_out)
+        plot_known_predicted_ages(
+            known_ages=train_sample_ages,
+            predicted_ages=train_predict,
+            outfile=train_png_out,
+            title="EPM CV predicted ages (training samples when left out)"
+            )
+    # there is no "label column" to designate training/testing samples
+    else:
+        train_data = meta_df
+        train_sample_ids = np.array(train_data.index)
+        train_sample_ages = np.array(train_data['age'])
+        train_cols = beta_df.columns.get_indexer(train_sample_ids)
+        logging.info(
+            "%d samples are included in training set: %s ..." %
+            (len(train_sample_ids), ', '.join(train_sample_ids[0:5]))
+            )
+        # return list of site indices with a high absolute correlation
+        # coefficient. The correlation is computed in blocks of CpGs.
+        logging.info("Calculate pearson correlation coefficients ...")
+        train_stats = correlation_stats(
+            beta_values, train_sample_ages, cols=train_cols, n_jobs=n_jobs)
+        selected_CpGs_indices, _ = select_correlated(
+            beta_values, train_sample_ages, pcc_cut, stats=train_stats)
+        selected_CpGs = all_CpGs[selected_CpGs_indices]
+        train_beta_values = beta_values[selected_CpGs_indices][:, train_cols]
+        logging.info(
+            "%d CpG sites are selected: %s ..." %
+            (len(selected_CpGs_indices), ', '.join(selected_CpGs[0:5]))
+            )
+
+        logging.info(
+            "Save beta values of selected CpGs to \"%s\"" % train_cpg_out)
+        # beta_df.loc[selected_CpGs].to_csv(cpg_out, sep="\t")
+        beta_df.iloc[selected_CpGs_indices][train_sample_ids].to_csv(
+            train_cpg_out, sep="\t")
+
+        # fit the model using the training data. CV folds are fitted in
+        # parallel.
+        logging.info("Fit the EPM model using training data ...")
+        epm_cv = fit_epm_cv(
+            train_beta_values, train_sample_ages, cv_folds=cv_folds,
+            iter_limit=iter_n, error_tolerance=error_tol, n_jobs=n_jobs)
+        logging.info(
+            "Save EM iterations of CV folds to \"%s\"" % folds_out)
+        epm_cv['folds'].to_csv(folds_out, sep="\t")
+        logging.info("Save the EPM model to \"%s\"" % model_out)
+        save_epm(
+            model_out, selected_CpGs, epm_cv['rates'], epm_cv['intercepts'],
+            info="Trained from \"%s\" (%d samples)" %
+            (beta_file, len(train_sample_ids)),
+            age_range=[float(np.min(train_sample_ages)),
+                       float(np.max(train_sample_ages))])
+        logging.info("Save the EPM training state to \"%s\"" % state_out)
+        save_state(
+            state_out, all_CpGs, train_stats, pcc_cut, beta_values,
+            train_cols, train_sample_ids, train_sample_ages,
+            predict_epm(train_beta_values, epm_cv['rates'],
+                        epm_cv['intercepts']))
+
+        logging.info("Get training sample EPM predictions (when left out) ...")
+        train_predict = epm_cv['predicted_states']
+        train_out = train_data.assign(
+            epm_age=pd.Series(train_predict, index=train_data.index))
+
+        # save predicted EMP age
+        logging.info(
+            "Save predicted EPM ages of traning samples to \"%s\""
+            % train_age_out)
+        train_out.to_csv(train_age_out, sep="\t")
+
+        # save scatter plot
+        logging.info(
+            "Generate scatter plot of train samples and save to \"%s\""
+            % train_png_out)
+        plot_known_predicted_ages(
+            known_ages=train_sample_ages,
+            predicted_ages=train_predict,
+            outfile=train_png_out,
+            title="EPM CV predicted ages (training samples when left out)"
+            )
+
+
+def clock_epm_update(beta_file, metafile, state_file, outfile,
+                     delimiter=None, imputation_method=11, ext_file=None,
+                     pcc_cut=None, iter_n=100, error_tol=1e-5, cv_folds=10,
+                     frmt='pdf', cname='EPM', cache_dir=None, ref_panel=None,
+                     n_jobs=1, knn_max_donors=50000):
+    """
+    Update an EPM model with new training samples.
+
+    The training state saved by "clock_epm" ("<PREFIX>.EPM_state.npz") holds
+    the correlation statistics of all CpGs and the beta values of the
+    candidate CpGs, so the old samples are not read again: the statistics
+    of the new samples are added to the saved ones, CpGs are reselected, and
+    the EM is started from the saved EPM states of the old samples (and the
+    ages of the new samples).
+
+    Parameters
+    ----------
+    beta_file : str
+        The input file of the new samples.
+    metafile : str
+        Meta information of the new samples (must have an 'age' column).
+        Samples designated as 'test' are predicted by the updated model.
+    state_file : str
+        The state file created by "clock_epm" or "clock_epm_update".
+    outfile : str
+        The prefix of out files.
+    pcc_cut : float, optional
+        Cutoff of the absolute correlation coefficient. If None, the cutoff
+        of the state file is used. The default is None.
+
+    Other parameters are the same as "clock_epm".
+
+    Returns
+    -------
+    None.
+    """
+    # set up the prefix for output files.
+    if outfile is not None:
+        out_prefix = outfile
+    else:
+        out_prefix = cname + '_out'
+    logging.info(
+        "The prefix of output files is set to \"%s\"." % out_prefix)
+
+    test_age_out = out_prefix + '.test_EPM_age.tsv'
+    train_age_out = out_prefix + '.train_EPM_age.tsv'
+    test_png_out = out_prefix + '.test_EPM_age.' + frmt
+    train_png_out = out_prefix + '.train_EPM_age.' + frmt
+    test_cpg_out = out_prefix + '.test_selected_CpGs.tsv'
+    train_cpg_out = out_prefix + '.train_selected_CpGs.tsv'
+    folds_out = out_prefix + '.EPM_CV_folds.tsv'
+    model_out = out_prefix + '.EPM_model.npz'
+    state_out = out_prefix + '.EPM_state.npz'
+
+    logging.info("Loading EPM training state: \"%s\"" % state_file)
+    try:
+        state = load_state(state_file)
+    except (OSError, ValueError, KeyError) as e:
+        logging.error("Cannot load EPM state \"%s\": %s" % (state_file, e))
+        sys.exit(0)
+    logging.info(
+        "Number of CpGs: %d, Number of training samples: %d" %
+        (len(state['cpgs']), len(state['samples'])))
+
+    # Read input beta file
+    logging.info("Read input beta file: \"%s\"" % beta_file)
+    beta_df = read_beta(beta_file, delimiter=delimiter, cache_dir=cache_dir)
+
+    # Imputate input beta values
+    beta_df = impute_beta(beta_df, method=imputation_method, ref=ext_file,
+                          ref_panel=ref_panel, max_donors=knn_max_donors,
+                          n_jobs=n_jobs)
+    (n_cpg, n_sample) = beta_df.shape
+    logging.info(
+        "Input file: \"%s\", Number of CpGs: %d, Number of samples: %d" %
+        (beta_file, n_cpg, n_sample))
+
+    # Read meta information file
+    logging.info("Read meta information file: \"%s\"" % metafile)
+    meta_df = pd.read_csv(metafile, sep=None, index_col=0, engine='python')
+    meta_df.index = meta_df.index.astype(str)
+    # change column names into lower case
+    meta_df.columns = meta_df.columns.str.lower()
+
+    missed_samples = meta_df.index[~meta_df.index.isin(beta_df.columns)]
+    if len(missed_samples) > 0:
+        logging.error(
+            "%d samples in \"%s\" are not found in \"%s\": %s ..." %
+            (len(missed_samples), metafile, beta_file,
+             ', '.join(missed_samples[0:5])))
+        sys.exit(0)
+
+    if 'age' not in meta_df.columns:
+        logging.error(
+            "There must be a column named 'age' (case insensitive) in \"%s\""
+            % metafile)
+        sys.exit(0)
+
+    if 'designation' in meta_df.columns:
+        logging.info(
+            "Split samples into training and testing sets ...")
+        designation = meta_df['designation'].str.lower()
+        train_meta_df = meta_df.loc[designation == 'train']
+        test_meta_df = meta_df.loc[designation == 'test']
+    else:
+        train_meta_df = meta_df
+        test_meta_df = meta_df.iloc[0:0]
+
+    dup_samples = train_meta_df.index[
+        train_meta_df.index.isin(state['samples'])]
+    if len(dup_samples) > 0:
+        logging.error(
+            "%d samples are already in the EPM training state: %s ..." %
+            (len(dup_samples), ', '.join(dup_samples[0:5])))
+        sys.exit(0)
+    if len(train_meta_df) == 0:
+        logging.error("No new training samples in \"%s\"" % metafile)
+        sys.exit(0)
+    logging.info(
+        "%d new samples are added to the training set: %s ..." %
+        (len(train_meta_df), ', '.join(train_meta_df.index[0:5])))
+
+    # add the correlation statistics of the new samples and reselect CpGs
+    logging.info("Update pearson correlation coefficients ...")
+    state, selected = update_state(
+        state, beta_df[train_meta_df.index],
+        np.array(train_meta_df['age']), pcc_cut=pcc_cut, n_jobs=n_jobs)
+    selected_CpGs = state['cpgs'][state['candidates'][selected]]
+    train_beta_values = state['candidate_betas'][selected].astype(np.float64)
+    train_sample_ids = state['samples']
+    train_sample_ages = state['ages']
+    logging.info(
+        "%d CpG sites are selected: %s ..." %
+        (len(selected_CpGs), ', '.join(selected_CpGs[0:5])))
+
+    logging.info(
+        "Save beta values of selected CpGs to \"%s\"" % train_cpg_out)
+    pd.DataFrame(
+        train_beta_values, index=selected_CpGs,
+        columns=train_sample_ids).to_csv(train_cpg_out, sep="\t")
+
+    # warm start: the EM starts from the EPM states of the old samples
+    logging.info("Fit the EPM model using all training data ...")
+    epm_cv = fit_epm_cv(
+        train_beta_values, train_sample_ages, cv_folds=cv_folds,
+        iter_limit=iter_n, error_tolerance=error_tol, n_jobs=n_jobs,
+        init_states=state['states'])
+    logging.info(
+        "Save EM iterations of CV folds to \"%s\"" % folds_out)
+    epm_cv['folds'].to_csv(folds_out, sep="\t")
+    logging.info("Save the EPM model to \"%s\"" % model_out)
+    save_epm(
+        model_out, selected_CpGs, epm_cv['rates'], epm_cv['intercepts'],
+        info="Updated from \"%s\" with \"%s\" (%d samples)" %
+        (state_file, beta_file, len(train_sample_ids)),
+        age_range=[float(np.min(train_sample_ages)),
+                   float(np.max(train_sample_ages))])
+    logging.info("Save the EPM training state to \"%s\"" % state_out)
+    state['states'] = predict_epm(
+        train_beta_values, epm_cv['rates'], epm_cv['intercepts'])
+    write_state(state_out, state)
+
+    logging.info("Get training sample EPM predictions (when left out) ...")
+    train_predict = epm_cv['predicted_states']
+    train_out = pd.DataFrame(
+        {'age': train_sample_ages, 'epm_age': train_predict},
+        index=pd.Index(train_sample_ids, name=meta_df.index.name))
+    logging.info(
+        "Save predicted EPM ages of traning samples to \"%s\""
+        % train_age_out)
+    train_out.to_csv(train_age_out, sep="\t")
+
+    if len(test_meta_df) > 0:
+        test_df = beta_df.loc[selected_CpGs, test_meta_df.index]
+        logging.info(
+            "Save beta values of selected CpGs to \"%s\"" % test_cpg_out)
+        test_df.to_csv(test_cpg_out, sep="\t")
+
+        logging.info("Predict testing samples ...")
+        test_predict = predict_epm(
+            test_df.to_numpy(dtype=np.float64), epm_cv['rates'],
+            epm_cv['intercepts'])
+        test_out = test_meta_df.assign(
+            epm_age=pd.Series(test_predict, index=test_meta_df.index))
+        logging.info(
+            "Save predicted EPM age of testing samples to \"%s\""
+            % test_age_out)
+        test_out.to_csv(test_age_out, sep="\t")
+
+        logging.info(
+            "Generate scatter plot of test samples and save to \"%s\""
+            % test_png_out)
+        plot_known_predicted_ages(
+            known_ages=np.array(test_meta_df['age']),
+            predicted_ages=test_predict,
+            outfile=test_png_out,
+            title="EPM CV predicted ages (testing samples)"
+            )
+    logging.info(
+        "Generate scatter plot of train samples and save to \"%s\""
+        % train_png_out)
+    plot_known_predicted_ages(
+        known_ages=train_sample_ages,
+        predicted_ages=train_predict,
+        outfile=train_png_out,
+        title="EPM CV predicted ages (training samples when left out)"
+        )
+
+
+def clock_epm_apply(beta_file, model_file, outfile, metafile=None,
+                    delimiter=None, frmt='pdf', na_percent=0.2, ovr=False,
+                    imputation_method=11, ext_file=None, knn_pool=1000,
+                    cname='EPM', cache_dir=None, ref_panel=None, n_jobs=1,
+                    knn_max_donors=50000):
+    """
+    Predict EPM ages of new samples using a model saved by "clock_epm".
+
+    Only the rows of the model CpGs (plus up to "knn_pool" complete CpGs for
+    KNN imputation) are read and imputed, and the ages are computed in one
+    pass from the saved EPM rates and intercepts. Model CpGs missing from
+    the input are left out of the EPM state estimate.
+
+    Parameters
+    ----------
+    beta_file : str
+        The input tabular structure file containing DNA methylation data.
+    model_file : str
+        The model file ("<PREFIX>.EPM_model.npz") created by "clock_epm".
+    outfile : str
+        The prefix of out files.
+    metafile : str, optional
+        Meta information (e.g., Age, Sex) of samples. If it has an 'age'
+        column, a scatter plot of the predicted and chronological ages is
+        generated. The default is None.
+    delimiter : str, optional
+        Character used to separate columns of the input file.
+        The default is None
+    frmt : str, optional
+        The figure format. Must be one of ['pdf', 'png'].
+        The default is 'pdf'.
+    na_percent : float, optional
+        The maximum of percent of missing model CpGs.
+        The default is 0.2 (20%).
+    ovr : bool, optional
+        If set, over write existing files. The default is False
+    imputation_method : int
+        Must be one of [-1, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]. See
+        imputation.py for details. default is 11.
+    ext_file : str
+        This is must be exisit if imputation_method is set to 10.
+    knn_pool : int, optional
+        The maximum number of non-model CpGs used as KNN neighbor candidates.
+        The default is 1000.
+    knn_max_donors : int, optional
+        The maximum number of CpGs used as KNN neighbor candidates when the
+        whole input is imputed (see "imputation.impute_knn"). 0 uses all
+        CpGs. The default is 50000.
+    cname : str, optional
+        Clock name. The default is 'EPM'.
+    cache_dir : str, optional
+        Directory of the binary cache of parsed beta files. See
+        "betareader.read_beta". The default is None (no cache).
+    ref_panel : str, optional
+        Name of the reference panel in "ext_file". If None, the first panel
+        is used. The default is None.
+    n_jobs : int, optional
+        Number of worker processes. The default is 1.
+
+    Returns
+    -------
+    Pandas Series.
+    """
+    # set up the prefix for output files.
+    if outfile is not None:
+        out_prefix = outfile
+    else:
+        out_prefix = cname + '_out'
+    logging.info(
+        "The prefix of output files is set to \"%s\"." % out_prefix)
+
+    age_out = out_prefix + '.EPM_age.tsv'
+    missed_cpg_out = out_prefix + '.predictorCpG_missed.tsv'
+    if frmt.lower() in ['pdf', 'png']:
+        scatter_out = out_prefix + '.EPM_age.' + frmt.lower()
+    else:
+        logging.error("Does not suppor format: %s!" % frmt)
+        sys.exit(0)
+    outfiles = [age_out, missed_cpg_out, scatter_out]
+
+    if ovr is True:
+        logging.warning(
+            "Over write existing files with prefix: %s" % out_prefix)
+        for tmp in outfiles:
+            try:
+                os.remove(tmp)
+            except FileNotFoundError:
+                pass
+    else:
+        for tmp in outfiles:
+            if os.path.exists(tmp):
+                logging.error(
+                    ("%s exists! Use different prefix or specify "
+                    "\"--overwrite\" to replace existing files." % tmp))
+                sys.exit(0)
 
-        test_out = test_meta_df.assign(
-            epm_age=pd.Series(test_predict, index=test_meta_df.index))
-        # print(test_out)
-        logging.info(
-            "Save predicted EPM age of testing samples to \"%s\""
-            % test_age_out)
-        test_out.to_csv(test_age_out, sep="\t")
+    logging.info("Loading EPM model: \"%s\"" % model_file)
+    try:
+        clock_dat, rates, intercepts = load_epm(model_file)
+    except (OSError, ValueError, KeyError) as e:
+        logging.error("Cannot load EPM model \"%s\": %s" % (model_file, e))
+        sys.exit(0)
+    logging.info("Model's description: \"%s\"" % clock_dat.info)
+    logging.info("Number of CpGs used: %d" % clock_dat.ncpg)
+    model_cpgs = pd.Index(clock_dat.cpgs)
 
-        logging.info(
-            "Generate scatter plot of test samples and save to \"%s\""
-            % test_png_out)
-        plot_known_predicted_ages(
-            known_ages=test_sample_ages,
-            predicted_ages=test_predict,
-            outfile=test_png_out,
-            title="EPM CV predicted ages (testing samples)"
-            )
-        logging.info(
-            "Generate scatter plot of train samples and save to \"%s\""
-            % train_png_out)
-        plot_known_predicted_ages(
-            known_ages=train_sample_ages,
-            predicted_ages=train_predict,
-            outfile=train_png_out,
-            title="EPM CV predicted ages (training samples when left out)"
-            )
-    # there is no "label column" to designate training/testing samples
-    else:
-        train_data = meta_df
-        train_sample_ids = np.array(train_data.index)
-        train_sample_ages = np.array(train_data['age'])
-        train_beta_values = beta_df[train_sample_ids].to_numpy()
-        logging.info(
-            "%d samples are included in training set: %s ..." %
-            (len(train_sample_ids), ', '.join(train_sample_ids[0:5]))
-            )
-        # get the absolute value of the correlation coefficient
-        logging.info("Calculate pearson correlation coefficients ...")
-        abs_pcc_coefficients = abs(
-            pearson_correlation(train_beta_values, train_sample_ages))
+    logging.info("Read input file: \"%s\"" % beta_file)
+    input_df1 = read_clock_input(
+        beta_file, delimiter=delimiter, cpgs=model_cpgs,
+        imputation_method=imputation_method, knn_pool=knn_pool,
+        cache_dir=cache_dir)
+    (n_cpg, n_sample) = input_df1.shape
+    logging.info(
+        "Input file: \"%s\", Number of CpGs read: %d, Number of samples: %d" %
+        (beta_file, n_cpg, n_sample))
 
-        # return list of site indices with a high absolute correlation
-        # coefficient
-        selected_CpGs_indices = np.where(abs_pcc_coefficients > pcc_cut)[0]
-        selected_CpGs = all_CpGs[selected_CpGs_indices]
-        logging.info(
-            "%d CpG sites are selected: %s ..." %
-            (len(selected_CpGs_indices), ', '.join(selected_CpGs[0:5]))
-            )
+    found = model_cpgs.isin(input_df1.index)
+    missed_cpgs = model_cpgs[~found]
+    logging.info(
+        "Model CpGs missed from '%s': %d (%f%%)" %
+        (beta_file, len(missed_cpgs), len(missed_cpgs)*100/len(model_cpgs)))
+    if len(missed_cpgs)/len(model_cpgs) > na_percent:
+        logging.critical(
+            "Missing model CpGs exceed %f%%. Exit!" % (na_percent*100))
+        sys.exit(0)
 
-        logging.info(
-            "Save beta values of selected CpGs to \"%s\"" % train_cpg_out)
-        # beta_df.loc[selected_CpGs].to_csv(cpg_out, sep="\t")
-        beta_df[train_sample_ids].iloc[selected_CpGs_indices].to_csv(
-            train_cpg_out, sep="\t")
+    used_df = impute_clock_cpgs(
+        input_df1, model_cpgs[found], method=imputation_method, ref=ext_file,
+        knn_pool=knn_pool, max_donors=knn_max_donors,
+        ref_panel=ref_panel, n_jobs=n_jobs)
+    pos = model_cpgs.get_indexer(used_df.index)
+    (usable_cpg, usable_sample) = used_df.shape
+    logging.info(
+        "Used CpGs: %d, Used samples: %d" % (usable_cpg, usable_sample))
 
-        # initialize the EPM model
-        logging.info("Initialize the EPM model ...")
-        epm_cv = EpigeneticPacemakerCV(
-            iter_limit=iter_n,
-            error_tolerance=error_tol,
-            cv_folds=cv_folds)
+    logging.info("Predict EPM ages ...")
+    output = pd.Series(
+        predict_epm(used_df.to_numpy(dtype=np.float64), rates[pos],
+                    intercepts[pos]),
+        index=used_df.columns, name=cname)
 
-        # fit the model using the training data
-        logging.info("Fit the EPM model using training data ...")
-        epm_cv.fit(
-            train_beta_values[selected_CpGs_indices, :],
-            train_sample_ages)
+    if metafile is not None:
+        logging.info("Read meta information file: \"%s\"" % metafile)
+        meta_df = pd.read_csv(metafile, sep=None, index_col=0, engine='python')
+        meta_df.index = meta_df.index.astype(str)
+        # combine predicted age and other meta information
+        logging.info("Combining meta information with predicted age")
+        output = pd.concat([output, meta_df], axis=1)
 
-        logging.info("Get training sample EPM predictions (when left out) ...")
-        train_predict = epm_cv.predicted_states
-        train_out = train_data.assign(
-            epm_age=pd.Series(train_predict, index=train_data.index))
+    # save missed CpGs to file
+    logging.info("Save missed CpGs: %s" % missed_cpg_out)
+    pd.DataFrame(list(missed_cpgs), columns=["missed_CpGs"]).to_csv(
+        missed_cpg_out, sep="\t", index=False)
 
-        # save predicted EMP age
-        logging.info(
-            "Save predicted EPM ages of traning samples to \"%s\""
-            % train_age_out)
-        train_out.to_csv(train_age_out, sep="\t")
+    # save predicted age
+    logging.info("Save predicted EPM age to: %s" % age_out)
+    output.to_csv(age_out, sep="\t", index_label="Sample_ID")
 
-        # save scatter plot
-        logging.info(
-            "Generate scatter plot of train samples and save to \"%s\""
-            % train_png_out)
-        plot_known_predicted_ages(
-            known_ages=train_sample_ages,
-            predicted_ages=train_predict,
-            outfile=train_png_out,
-            title="EPM CV predicted ages (training samples when left out)"
-            )
+    if metafile is not None:
+        # generate scatter plot between c_age and d_age
+        c_age = []
+        for col_id in output.columns:
+            if col_id.lower() == 'age':
+                c_age = output[col_id]
+                break
+        if len(c_age) >= 2 and len(c_age) == len(output):
+            logging.info(
+                "Generate scatter plot and save to \"%s\"" % scatter_out)
+            plot_known_predicted_ages(
+                known_ages=c_age.tolist(),
+                predicted_ages=output[cname].tolist(),
+                outfile=scatter_out,
+                title="EPM predicted ages")
+    return output
 
 
 def clock_mouse(beta_file, outfile, cname, genome, metafile=None, delimiter=None,
                 ff='pdf', na_percent=0.2, ovr=False,
-                imputation_method=11, ext_file=None):
+                imputation_method=11, ext_file=None,
+                impute_clock_only=False, knn_pool=1000,
+                cache_dir=None, ref_panel=None, n_jobs=1,
+                coverage=False, min_cov=5, cov_format=None, match='exact',
+                window=0, knn_max_donors=50000):
     """
     Compute mouse DNAm age using four clocks ("WLMT", "YOMT", "Liver", or
     "Blood"). Note that unlike human DNAm clocks, the input DNA methylation
@@ -1507,7 +1429,10 @@ def clock_mouse(beta_file, outfile, cname, genome, metafile=None, delimiter=None
     outfile : str
         The prefix of out files.
     genome : str
-        Must be one of ["mm39", "mm10"].
+        Must be one of ["mm39", "mm10", "auto", "both"]. "auto": the build
+        with more clock CpGs found in the input is used. "both": clock CpGs
+        not found in that build are looked up in the other build (e.g.,
+        input merged from both builds). See "liftover".
     metafile : str, optional
         Meta information (e.g., Age, Sex) of samples.
         Example of a meta file
@@ -1537,35 +1462,279 @@ def clock_mouse(beta_file, outfile, cname, genome, metafile=None, delimiter=None
         This is must be exisit if imputation_method is set to 10.
         Two-column, Tab or comma separated file: 1st column is CpG ID, the 2nd
         column is beta value.
-
+    impute_clock_only : bool, optional
+        If set, only impute the clock CpGs instead of all CpGs of the input
+        file. The default is False.
+    knn_pool : int, optional
+        The maximum number of non-clock CpGs used as KNN neighbor candidates
+        when impute_clock_only is set. The default is 1000.
+    knn_max_donors : int, optional
+        The maximum number of CpGs used as KNN neighbor candidates when the
+        whole input is imputed (see "imputation.impute_knn"). 0 uses all
+        CpGs. The default is 50000.
+    cache_dir : str, optional
+        Directory of the binary cache of parsed beta files. See
+        "betareader.read_beta". The default is None (no cache).
+    ref_panel : str, optional
+        Name of the reference panel in "ext_file". If None, the first panel
+        is used. The default is None.
+    n_jobs : int, optional
+        Number of worker processes. The default is 1.
+    coverage : bool, optional
+        If set, "beta_file" is a manifest of per-sample coverage files
+        (Bismark ".cov", bedGraph or bedMethyl, see "coverage.read_manifest").
+        Only the clock CpGs are kept while the files are read. The default is
+        False.
+    min_cov : int, optional
+        Minimum number of reads of a CpG (coverage files only). The default
+        is 5.
+    cov_format : str, optional
+        Format of the coverage files ("bismark", "bedgraph" or "bedmethyl").
+        If None, it is guessed from the file names. The default is None.
+    match : str, optional
+        How input CpGs are matched to the clock CpGs: "exact" (same
+        position), "adjacent" (within 1 bp, e.g., the C of the other strand)
+        or "window" (within "window" bp). The nearest input CpG is used. See
+        "coordindex.CoordIndex". The default is 'exact'.
+    window : int, optional
+        Maximum distance (bp) of the "window" matching. The default is 0.
 
     Returns
     -------
     Pandas Series.
     """
 
+    if clock_runner(cname) != 'mouse':
+        logging.error(
+            "Not a mouse clock: %s. Must be one of: %s" %
+            (cname, ','.join(clocks_of('mouse'))))
+        sys.exit(0)
+    spec = CLOCKS[cname]
+    files = clock_outfiles(outfile, cname, ff=ff, ovr=ovr)
+
+    if genome in GENOMES:
+        builds = [genome]
+    elif genome in ('auto', 'both'):
+        builds = list(GENOMES)
+    else:
+        logging.error("Unknown genome: %s" % genome)
+        sys.exit(0)
+
+    logging.info("Loading %s clock data ..." % cname)
+    clock_dat = load_clock(model_name(cname, builds[0]))
+    log_clock(clock_dat)
+    clock_coef = clock_dat.coef_series()
+
+    # clock CpGs in each build (row-aligned with "clock_coef")
+    try:
+        max_distance(match, window)
+        build_ids = {b: lift(clock_coef.index, builds[0], b) for b in builds}
+        all_ids = pd.Index(np.concatenate(list(build_ids.values())))
+        all_ids = all_ids[all_ids != ''].unique()
+    except ValueError as e:
+        logging.error(str(e))
+        sys.exit(0)
+    if coverage is True:
+        # the clock matrix is assembled directly from the coverage files,
+        # so only the clock CpGs can be imputed.
+        logging.info("Read coverage files listed in: \"%s\"" % beta_file)
+        try:
+            cov_files = read_manifest(beta_file)
+            input_df1 = read_coverage_files(
+                cov_files, all_ids, fmt=cov_format, min_cov=min_cov,
+                match=match, window=window, n_jobs=n_jobs)
+        except (OSError, ValueError) as e:
+            logging.error("Cannot read coverage files: %s" % e)
+            sys.exit(0)
+        impute_clock_only = True
+        # coverage sites have been matched to the clock CpGs
+        site_match = 'exact'
+    else:
+        logging.info("Read input file: \"%s\"" % beta_file)
+        input_df1 = read_clock_input(
+            beta_file, delimiter=delimiter,
+            cpgs=CoordIndex(all_ids).candidate_ids(match, window)
+            if impute_clock_only is True else None,
+            imputation_method=imputation_method, knn_pool=knn_pool,
+            cache_dir=cache_dir)
+        site_match = match
+
+    # match the input CpGs to the clock CpGs of each build (nearest
+    # position), then rename them to the clock CpG IDs of the primary build.
+    best, source, order, hits = assign_sites(
+        input_df1.index, build_ids, site_match, window,
+        single=(genome != 'both'))
+    if len(builds) > 1:
+        logging.info(
+            "Clock CpGs found in the input: %s. Use %s clock CpGs." %
+            (', '.join('%d (%s)' % (hits[b], b) for b in builds), order[0]))
+        if order[0] != builds[0]:
+            clock_dat = load_clock(model_name(cname, order[0]))
+            clock_coef = clock_dat.coef_series()
+        if genome == 'both':
+            logging.info(
+                "Clock CpGs lifted from the other build: %d" %
+                (source[source != ''] != order[0]).sum())
+    found = best >= 0
+    renamed = input_df1.index[best[found]] != clock_coef.index[found]
+    logging.info(
+        "Clock CpGs matched (%s): %d, renamed: %d" %
+        (match, found.sum(), renamed.sum()))
+    # input CpGs that have the ID of a clock CpG but are not matched to it
+    # (only possible with two builds) are removed.
+    clash = np.setdiff1d(
+        np.flatnonzero(input_df1.index.isin(clock_coef.index)), best[found])
+    if len(clash) > 0:
+        logging.info(
+            "Remove %d input CpGs with the IDs of unmatched clock CpGs" %
+            len(clash))
+    if renamed.any() or len(clash) > 0:
+        new_index = input_df1.index.to_numpy(dtype=object, copy=True)
+        new_index[best[found]] = clock_coef.index[found]
+        keep = np.ones(len(new_index), dtype=bool)
+        keep[clash] = False
+        input_df1 = input_df1[keep]
+        input_df1.index = pd.Index(new_index[keep])
+
+    # the input beta values are rescaled to the range of the model: [0, 100]
+    # for WLMT, [0, 1] for YOMT/mmLiver/mmBlood
+    if spec.scale == 100 and input_df1.max(axis=None) <= 1:
+        logging.info("Change the range of beta values from (0, 1) to (0, 100)")
+        input_df1 = input_df1*100
+    elif spec.scale == 1 and input_df1.max(axis=None) > 1:
+        logging.info("Change the range of beta values from (0, 100) to (0, 1)")
+        input_df1 = input_df1/100
+
+    if impute_clock_only is True:
+        input_df2 = impute_clock_cpgs(
+            input_df1, clock_coef.index, method=imputation_method,
+            ref=ext_file, knn_pool=knn_pool, max_donors=knn_max_donors,
+            ref_panel=ref_panel, n_jobs=n_jobs)
+    else:
+        input_df2 = impute_beta(
+            input_df1, method=imputation_method, ref=ext_file,
+            ref_panel=ref_panel, max_donors=knn_max_donors, n_jobs=n_jobs)
+    (n_cpg, n_sample) = input_df2.shape
+    logging.info(
+        "Input file: \"%s\", Number of CpGs: %d, Number of samples: %d" %
+        (beta_file, n_cpg, n_sample))
+
+    logging.info("Extract clock CpGs ...")
+    # clock CpGs missed from data file (input CpGs matched to the clock CpGs
+    # have been renamed)
+    found = clock_coef.index.isin(input_df2.index)
+    check_missed(beta_file, cname, clock_coef.index[~found], clock_dat.ncpg,
+                 na_percent)
+    common_cpgs = clock_coef.index[found]
+    logging.info(
+        "Clock CpGs exisit in \"%s\": %d" % (beta_file, len(common_cpgs)))
+
+    used_df = input_df2.loc[common_cpgs]
+    (usable_cpg, usable_sample) = used_df.shape
+    logging.info(
+        "Used CpGs: %d, Used samples: %d" % (usable_cpg, usable_sample))
+
+    # wlmt: linear, mmliver: 2**x, mmblood: power, yomt: exp-quadratic (see
+    # "utils.apply_transform")
+    scores, _ = score_linear(used_df, {cname: clock_dat})
+    output = scores[cname]
+
+    return save_clock_output(output, cname, files, used_df, clock_coef,
+                             found, metafile=metafile)
+
+
+# Linear (human) clocks that can be scored together by "clock_multi" (see
+# "registry.CLOCKS"). The post-processing of the weighted sum of beta values
+# is given by the "transform" of the clock model (see
+# "clockmodel.TRANSFORMS").
+MULTI_CLOCKS = multi_clocks()
+
+
+def clock_multi(beta_file, outfile, clocks=None, metafile=None,
+                delimiter=None, na_percent=0.2, ovr=False,
+                imputation_method=11, ext_file=None, knn_pool=1000,
+                cache_dir=None, ref_panel=None, n_jobs=1,
+                knn_max_donors=50000):
+    """
+    Calculate DNAm ages of multiple (linear) clocks from one pass over the
+    input file.
+
+    The input file is read once, only the union of the clock CpGs is imputed
+    (see "impute_clock_cpgs"), and all clocks are computed as one
+    coefficient-matrix x beta-matrix product.
+
+    Parameters
+    ----------
+    beta_file : str
+        The input tabular structure file containing DNA methylation data.
+        #example of CSV file
+        ID_REF,s55N,s58N,s64N,s68N,s72N,s74N,s76N,s77N
+        cg26928153,0.86007,0.79695,0.72618,0.67142,0.70801,0.80371,0.8715,0.789
+        cg16269199,0.74023,0.64148,0.65569,0.64138,0.56486,0.5707,0.7531,0.672
+        cg13869341,0.76405,0.7559,0.7059,0.82141,0.72888,0.72055,0.8705,0.808
+        ...
+    outfile : str
+        The prefix of out files.
+    clocks : list, optional
+        Clock names. Must be in "MULTI_CLOCKS". The default is None
+        (all clocks in "MULTI_CLOCKS").
+    metafile : str, optional
+        Meta information (e.g., Age, Sex) of samples.
+    delimiter : str, optional
+        Character used to separate columns of the input file.
+        The default is None
+    na_percent : float, optional
+        The maximum of percent of missing values. Clocks exceeding this
+        cutoff are skipped. The default is 0.2 (20%).
+    ovr : bool, optional
+        If set, over write existing files. The default is False
+    imputation_method : int
+        Must be one of [-1, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]. See
+        imputation.py for details. default is 11.
+    ext_file : str
+        This is must be exisit if imputation_method is set to 10.
+        Two-column, Tab or comma separated file: 1st column is CpG ID, the 2nd
+        column is beta value.
+    knn_pool : int, optional
+        The maximum number of non-clock CpGs used as KNN neighbor candidates.
+        The default is 1000.
+    knn_max_donors : int, optional
+        The maximum number of CpGs used as KNN neighbor candidates when the
+        whole input is imputed (see "imputation.impute_knn"). 0 uses all
+        CpGs. The default is 50000.
+    cache_dir : str, optional
+        Directory of the binary cache of parsed beta files. See
+        "betareader.read_beta". The default is None (no cache).
+    ref_panel : str, optional
+        Name of the reference panel in "ext_file". If None, the first panel
+        is used. The default is None.
+    n_jobs : int, optional
+        Number of worker processes. The default is 1.
+
+    Returns
+    -------
+    Pandas DataFrame (samples x clocks).
+    """
+    if clocks is None:
+        clocks = list(MULTI_CLOCKS)
+    unknown = [c for c in clocks if c not in MULTI_CLOCKS]
+    if len(unknown) > 0:
+        logging.error(
+            "Unsupported clock(s): %s. Must be one of: %s" %
+            (','.join(unknown), ','.join(MULTI_CLOCKS)))
+        sys.exit(0)
+
     # set up the prefix for output files.
     if outfile is not None:
         out_prefix = outfile
     else:
-        out_prefix = cname + '_out'
+        out_prefix = 'multi_out'
     logging.info(
         "The prefix of output files is set to \"%s\"." % out_prefix)
 
-    used_cpg_out = out_prefix + '.predictorCpG_found.tsv'
-    missed_cpg_out = out_prefix + '.predictorCpG_missed.tsv'
     age_out = out_prefix + '.DNAm_age.tsv'
-    coef_out = out_prefix + '.predictorCpG_coef.tsv'
-    r_out = out_prefix + '.plots.R'
-
-    if ff.lower() in ['pdf', 'png']:
-        figure_out = out_prefix + '.coef_plot.' + ff.lower()
-        scatter_out = out_prefix + '.scatter_plot.' + ff.lower()
-    else:
-        logging.error("Does not suppor format: %s!" % ff)
-        sys.exit(0)
-    outfiles = [used_cpg_out, missed_cpg_out, age_out, coef_out, r_out,
-                figure_out, scatter_out]
+    summary_out = out_prefix + '.clock_summary.tsv'
+    outfiles = [age_out, summary_out]
 
     if ovr is True:
         logging.warning(
@@ -1574,7 +1743,7 @@ def clock_mouse(beta_file, outfile, cname, genome, metafile=None, delimiter=None
             try:
                 os.remove(tmp)
             except FileNotFoundError:
-                continue
+                pass
     else:
         for tmp in outfiles:
             if os.path.exists(tmp):
@@ -1583,92 +1752,78 @@ def clock_mouse(beta_file, outfile, cname, genome, metafile=None, delimiter=None
                     "\"--overwrite\" to replace existing files." % tmp))
                 sys.exit(0)
 
-    logging.info("Loading %s clock data ..." % cname)
-    model_file = cname + '_' + genome + '.pkl'
-    fh = importlib.resources.open_binary('dmc.data', model_file)
-
-    clock_dat = pickle.load(fh)
+    clock_dats = {}
+    for cname in clocks:
+        logging.info("Loading %s clock data ..." % cname)
+        clock_dats[cname] = load_clock(model_name(cname))
 
-    logging.info("Clock's name: \"%s\"" % clock_dat.name)
-    logging.info(
-        "Clock was trained from: \"%s\"" % ','.join(clock_dat.tissues))
-    logging.info("Clock's unit: \"%s\"" % clock_dat.unit)
-    logging.info("Number of CpGs used: %d" % clock_dat.ncpg)
-    logging.info("Clock's description: \"%s\"" % clock_dat.info)
-    clock_coef = pd.Series(clock_dat.coef, name='Coef')
-    if cname.lower() == 'wlmt' or cname.lower() == 'mmliver':
-        clock_intercept = clock_dat.Intercept
-    else:
-        clock_intercept = 0.0
+    # the "Zhang" clocks standardize each sample using all CpGs of the input
+    # file, so all CpGs must be read in this case.
+    need_zscore = 'zscore' in [clock_dats[c].transform for c in clocks]
+    all_cpgs = set()
+    for cname in clocks:
+        all_cpgs.update(clock_dats[cname].cpgs)
 
     logging.info("Read input file: \"%s\"" % beta_file)
-    input_df1 = pd.read_csv(beta_file, sep=None, index_col=0, engine='python')
-
-    # For WLMT clock, the input beta values should be in [0, 100] range
-    # convert (0, 1) to (0, 100) for WLMT if needed
-    if cname.lower() == 'wlmt' and input_df1.max(axis=None) <= 1:
-        logging.info("Change the range of beta values from (0, 1) to (0, 100)")
-        input_df1 = input_df1*100
-    # For YOMT/mmBlood/mmLiver clock, the input beta values should be in the
-    # [0, 1] range. Convert (0, 100) to (0, 1) for YOMT if needed
-    if cname.lower() in ('yomt', 'mmliver', 'mmblood') and input_df1.max(axis=None) > 1:
-        logging.info("Change the range of beta values from (0, 1) to (0, 100)")
-        input_df1 = input_df1/100
-
-    input_df2 = impute_beta(input_df1, method=imputation_method, ref=ext_file)
-    (n_cpg, n_sample) = input_df2.shape
+    input_df1 = read_clock_input(
+        beta_file, delimiter=delimiter,
+        cpgs=None if need_zscore else all_cpgs,
+        imputation_method=imputation_method, knn_pool=knn_pool,
+        cache_dir=cache_dir)
+    (n_cpg, n_sample) = input_df1.shape
     logging.info(
-        "Input file: \"%s\", Number of CpGs: %d, Number of samples: %d" %
+        "Input file: \"%s\", Number of CpGs read: %d, Number of samples: %d" %
         (beta_file, n_cpg, n_sample))
-    sample_cpg_ids = input_df2.index
-    # sample_names = df2.columns
-
-    # printlog("Standardization ...")
-    # scaled_df2 = (input_df2 - input_df2.mean())/input_df2.std()
 
-    logging.info("Extract clock CpGs ...")
-    # clock CpGs missed from data file
-    missed_cpgs = set(clock_coef.index) - set(sample_cpg_ids)
-    logging.info(
-        "Clock CpGs missed from '%s': %d (%f%%)" %
-        (beta_file, len(missed_cpgs), len(missed_cpgs)*100/clock_dat.ncpg))
-
-    if len(missed_cpgs)/clock_dat.ncpg > na_percent:
-        logging.critical(
-            "Missing clock CpGs exceed %f%%. Exit!" % (na_percent*100))
-        sys.exit(0)
-
-    common_cpgs = list(set(clock_coef.index) & set(sample_cpg_ids))
-    logging.info(
-        "Clock CpGs exisit in \"%s\": %d" % (beta_file, len(common_cpgs)))
-
-    used_df = input_df2.loc[common_cpgs]
-    used_clock_coef = clock_coef.loc[common_cpgs]
-    (usable_cpg, usable_sample) = used_df.shape
+    sample_mean = sample_std = None
+    if need_zscore:
+        logging.info("Calculate per-sample mean and std ...")
+        sample_mean, sample_std = sample_stats(input_df1)
+
+    # keep clocks with enough CpGs
+    summary = []
+    used_clocks = []
+    for cname in clocks:
+        clock_cpgs = clock_dats[cname].cpgs
+        n_found = int(input_df1.index.isin(clock_cpgs).sum())
+        n_missed = len(clock_cpgs) - n_found
+        status = 'OK'
+        if n_missed/len(clock_cpgs) > na_percent:
+            logging.warning(
+                "%s: missing clock CpGs exceed %f%%. Skipped!" %
+                (cname, na_percent*100))
+            status = 'Skipped'
+        elif CLOCKS[cname].strict is True and n_missed > 0:
+            logging.warning(
+                "%s: %d clock CpGs are missing. Skipped!" %
+                (cname, n_missed))
+            status = 'Skipped'
+        else:
+            used_clocks.append(cname)
+        summary.append(
+            [cname, len(clock_cpgs), n_found, n_missed,
+             n_missed*100/len(clock_cpgs), status])
+    summary = pd.DataFrame(
+        summary, columns=['Clock', 'Clock_CpGs', 'Found', 'Missed',
+                          'Missed_percent', 'Status'])
+
+    # union of clock CpGs
+    union_cpgs = set()
+    for cname in used_clocks:
+        union_cpgs.update(clock_dats[cname].cpgs)
+    union_cpgs = input_df1.index[input_df1.index.isin(union_cpgs)]
     logging.info(
-        "Used CpGs: %d, Used samples: %d" % (usable_cpg, usable_sample))
-
-    df4 = used_df.mul(used_clock_coef, axis=0)
-
-    # df4.to_csv('df4.csv')
-    if cname.lower() == 'wlmt':
-        output = df4.sum(axis=0) + clock_intercept
-    elif cname.lower() == 'mmliver':
-        output = 2**(df4.sum(axis=0) + clock_intercept)
-    elif cname.lower() == 'mmblood':
-        a = 0.1666
-        b = 0.4185
-        c = -1.712
-        output = ((df4.sum(axis=0) - c)/a) ** (1/b)
-    elif cname.lower() == 'yomt':
-        a = 0.1207
-        b = 1.2424
-        c = 2.5440
-        output = 7*np.exp(a*((df4.sum(axis=0)**2)) + b*df4.sum(axis=0) + c)
-    else:
-        logging.error("Unknown command %s" % cname)
-        sys.exit()
-    output.name = "%s" % cname
+        "Clock CpGs (union of %d clocks) exist in \"%s\": %d" %
+        (len(used_clocks), beta_file, len(union_cpgs)))
+    used_df = impute_clock_cpgs(
+        input_df1, union_cpgs, method=imputation_method, ref=ext_file,
+        knn_pool=knn_pool, max_donors=knn_max_donors,
+        ref_panel=ref_panel, n_jobs=n_jobs)
+
+    logging.info("Calculate DNAm ages of %d clocks ..." % len(used_clocks))
+    output, _ = score_linear(
+        used_df, {c: clock_dats[c] for c in used_clocks},
+        sample_mean=sample_mean, sample_std=sample_std)
 
     if metafile is not None:
         logging.info("Read meta information file: \"%s\"" % metafile)
@@ -1678,47 +1833,11 @@ def clock_mouse(beta_file, outfile, cname, genome, metafile=None, delimiter=None
         logging.info("Combining meta information with predicted age")
         output = pd.concat([output, meta_df], axis=1)
 
-        # generate scatter plot between c_age and d_age
-        c_age = []
-        for col_id in output.columns:
-            if col_id.lower() == 'age':
-                c_age = output[col_id]
-                break
-        d_age = output[cname]
-
-        if len(c_age) >= 2 and len(c_age) == len(d_age):
-            logging.info(
-                "Writing R script of scatter plot. Save to: %s" % r_out)
-            plot_corr(c_age, d_age, outfile=scatter_out, rfile=r_out)
-
-    # save used CpGs to file
-    logging.info("Save used CpGs and beta values to: %s" % used_cpg_out)
-    used_df.to_csv(used_cpg_out, sep="\t", index_label="CpG_ID")
-
-    # save missed CpGs to file
-    logging.info("Save missed CpGs: %s" % missed_cpg_out)
-    tmp = pd.DataFrame(list(missed_cpgs), columns=["missed_CpGs"])
-    tmp.to_csv(missed_cpg_out, sep="\t", index=False)
-
-    # save coef information
-    logging.info("Save CpG and coefficients to: %s" % coef_out)
-    tmp = clock_coef.to_frame()
-    tmp['Found'] = tmp.index.isin(common_cpgs)
-    tmp.to_csv(coef_out, sep="\t", index_label="CpG_ID")
+    # save clock summary
+    logging.info("Save clock summary to: %s" % summary_out)
+    summary.to_csv(summary_out, sep="\t", index=False)
 
     # save predicted age
     logging.info("Save predicted DNAm age to: %s" % age_out)
     output.to_csv(age_out, sep="\t", index_label="Sample_ID")
-
-    # generate coefficient plot
-    logging.info("Generate coefficient plot. Save to: %s" % figure_out)
-    plot_coef(coef_out, figure_out, r_out)
-
-    logging.info("Running R script: %s" % r_out)
-    try:
-        subprocess.call("Rscript " + r_out, shell=True)
-    except subprocess.CalledProcessError as e:
-        print("Cannot generate pdf file from " + r_out, file=sys.stderr)
-        print(e.output, file=sys.stderr)
-        pass
     return output
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Declarative registry of the clocks.
+
+Each clock declares how it is computed. The output transform and the
+per-sample standardization ("zscore") are declared by the clock model
+itself (see "clockmodel.TRANSFORMS"); all linear clocks, human and mouse,
+are scored by the same kernel (see "scoring.score_linear"). A new linear
+clock only needs its model in "dmc.data" and an entry in CLOCKS.
+
+    runner : how the clock is computed
+             'linear'   : methylclocks.clock_linear
+             'mouse'    : methylclocks.clock_mouse (coordinate-keyed CpGs,
+                          one model per genome build)
+             'dnn'      : methylclocks.altum_age
+             'external' : DunedinPACE.DunedinPACE_clock
+    model  : model name in "dmc.data" (the clock name if None). The genome
+             build is appended for the mouse clocks ("WLMT" -> "WLMT_mm10").
+    scale  : range of the beta values the model expects (1: [0, 1], 100:
+             [0, 100]). The input is rescaled if needed. None: used as is.
+    strict : if set, all clock CpGs must be found in the input.
+    multi  : if set, the clock is scored by "epical multi".
+
+>>> from dmc.registry import CLOCKS, model_name
+>>> CLOCKS['Weidner'].strict
+True
+>>> model_name('WLMT', 'mm39')
+'WLMT_mm39'
+"""
+
+from collections import namedtuple
+
+ClockSpec = namedtuple(
+    'ClockSpec', ['runner', 'model', 'scale', 'strict', 'multi'],
+    defaults=[None, None, False, False])
+
+CLOCKS = {
+    'Horvath13': ClockSpec('linear', multi=True),
+    'Horvath13_shrunk': ClockSpec('linear', multi=True),
+    'Horvath18': ClockSpec('linear', multi=True),
+    'MEAT': ClockSpec('linear', multi=True),
+    'PedBE': ClockSpec('linear', multi=True),
+    'Cortical': ClockSpec('linear', multi=True),
+    'Ped_Wu': ClockSpec('linear', multi=True),
+    'Zhang_EN': ClockSpec('linear', multi=True),
+    # the model is not bundled with the package
+    'Zhang_BLUP': ClockSpec('linear'),
+    'Levine': ClockSpec('linear', multi=True),
+    'Hannum': ClockSpec('linear', multi=True),
+    'Lu_DNAmTL': ClockSpec('linear', multi=True),
+    'GA_Knight': ClockSpec('linear', multi=True),
+    'GA_Mayne': ClockSpec('linear', multi=True),
+    'GA_Bohlin': ClockSpec('linear', multi=True),
+    'GA_Haftorn': ClockSpec('linear', multi=True),
+    'GA_Lee_CPC': ClockSpec('linear', multi=True),
+    'GA_Lee_RPC': ClockSpec('linear', multi=True),
+    'GA_Lee_rRPC': ClockSpec('linear', multi=True),
+    'Weidner': ClockSpec('linear', strict=True, multi=True),
+    'Lin': ClockSpec('linear', multi=True),
+    'ENCen100': ClockSpec('linear', multi=True),
+    'ENCen40': ClockSpec('linear', multi=True),
+    'WLMT': ClockSpec('mouse', scale=100),
+    'YOMT': ClockSpec('mouse', scale=1),
+    'mmLiver': ClockSpec('mouse', scale=1),
+    'mmBlood': ClockSpec('mouse', scale=1),
+    'AltumAge': ClockSpec('dnn'),
+    'DunedinPACE': ClockSpec('external'),
+}
+
+
+def get_spec(cname):
+    """Return the ClockSpec of a clock (ValueError if unknown)."""
+    if cname not in CLOCKS:
+        raise ValueError(
+            "Unknown clock: %s (must be one of %s)" %
+            (cname, ', '.join(CLOCKS)))
+    return CLOCKS[cname]
+
+
+def clock_runner(cname):
+    """Return the runner of a clock (None if "cname" is not a clock)."""
+    if cname not in CLOCKS:
+        return None
+    return CLOCKS[cname].runner
+
+
+def clocks_of(runner):
+    """Return the names of the clocks computed by "runner"."""
+    return [c for c, spec in CLOCKS.items() if spec.runner == runner]
+
+
+def multi_clocks():
+    """Return the names of the clocks scored by "epical multi"."""
+    return [c for c, spec in CLOCKS.items()
+            if spec.runner == 'linear' and spec.multi is True]
+
+
+def model_name(cname, genome=None):
+    """
+    Return the model name of a clock in "dmc.data".
+
+    Parameters
+    ----------
+    cname : str
+        Clock name (see CLOCKS).
+    genome : str, optional
+        Genome build of the mouse clocks ("mm10" or "mm39"). Ignored by the
+        other clocks. The default is None.
+    """
+    spec = get_spec(cname)
+    name = cname if spec.model is None else spec.model
+    if spec.runner == 'mouse':
+        if genome is None:
+            raise ValueError("%s needs a genome build" % cname)
+        name = name + '_' + genome
+    return name
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Run work over a pool of worker processes.
+
+Large inputs (beta value matrices) are put into shared memory once and the
+workers attach to them, so only small task descriptions (e.g., the range of
+rows or samples to process) are sent to the workers.
+
+>>> from dmc.scheduler import map_sample_blocks
+>>> ages = map_sample_blocks(predict, beta_df, n_jobs=8)
+"""
+
+import os
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# state of the worker process (set by the pool initializer)
+_worker = {}
+
+
+def share_array(array):
+    """
+    Copy a NumPy array into shared memory.
+
+    Parameters
+    ----------
+    array : numpy.ndarray
+        The array to share.
+
+    Returns
+    -------
+    tuple. (SharedMemory, spec), where "spec" (name, shape, dtype) is sent to
+    the workers to attach to the array (see "attach_array"). The caller must
+    call SharedMemory.close() and SharedMemory.unlink() when done.
+    """
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    view[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def attach_array(spec):
+    """
+    Attach to an array created by "share_array".
+
+    Returns
+    -------
+    tuple. (SharedMemory, numpy.ndarray). Changes to the array are seen by
+    all processes.
+    """
+    name, shape, dtype = spec
+    # worker processes share the resource tracker of the parent process,
+    # which unlinks the memory (see "run_pool").
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def _init_worker(specs, state):
+    """Pool initializer: attach to the shared arrays and keep the state."""
+    _worker.clear()
+    _worker.update(state)
+    _worker['shm'] = []
+    for key, spec in specs.items():
+        shm, array = attach_array(spec)
+        _worker['shm'].append(shm)
+        _worker[key] = array
+
+
+def worker_state():
+    """Return the state (incl. shared arrays) of the current worker."""
+    return _worker
+
+
+def run_pool(func, tasks, n_jobs, arrays=None, state=None, writeback=(),
+             mp_context=None):
+    """
+    Run "func(task)" for all tasks over a pool of processes.
+
+    Parameters
+    ----------
+    func : function
+        Module-level function. It can get the shared arrays and the state by
+        calling "worker_state()".
+    tasks : list
+        Arguments of "func" (should be small, e.g., (start, end) tuples).
+    n_jobs : int
+        Number of worker processes (0: one per CPU, see "n_workers"). If 1,
+        tasks are run in this process.
+    arrays : dict, optional
+        Name -> numpy.ndarray. Shared with the workers through shared
+        memory. The default is None.
+    state : dict, optional
+        Other (small) objects sent to each worker once. The default is None.
+    writeback : tuple, optional
+        Names of the arrays that are filled in place by the workers. They
+        are copied back from shared memory when all tasks are done. The
+        default is ().
+    mp_context : str, optional
+        Start method of the worker processes ("fork", "spawn" or
+        "forkserver"). If None, the platform default is used. The default
+        is None.
+
+    Returns
+    -------
+    list. Results in the same order as "tasks".
+    """
+    arrays = arrays or {}
+    state = state or {}
+    n_jobs = max(1, min(n_workers(n_jobs), len(tasks)))
+    if n_jobs == 1:
+        saved = dict(_worker)
+        _worker.clear()
+        _worker.update(state)
+        _worker.update(arrays)
+        try:
+            return [func(task) for task in tasks]
+        finally:
+            _worker.clear()
+            _worker.update(saved)
+
+    logging.debug("Run %d tasks with %d processes" % (len(tasks), n_jobs))
+    shms = {}
+    specs = {}
+    try:
+        for key, array in arrays.items():
+            shms[key], specs[key] = share_array(array)
+        ctx = None
+        if mp_context is not None:
+            ctx = multiprocessing.get_context(mp_context)
+        with ProcessPoolExecutor(
+                max_workers=n_jobs, mp_context=ctx,
+                initializer=_init_worker, initargs=(specs, state)) as pool:
+            results = list(pool.map(func, tasks))
+        for key in writeback:
+            arrays[key][...] = np.ndarray(
+                arrays[key].shape, dtype=arrays[key].dtype,
+                buffer=shms[key].buf)
+    finally:
+        for shm in shms.values():
+            shm.close()
+            shm.unlink()
+    return results
+
+
+def n_workers(n_jobs):
+    """
+    Return the number of worker processes of "n_jobs" (0: one per CPU).
+    Negative values raise ValueError.
+    """
+    if n_jobs < 0:
+        raise ValueError("The number of jobs must be >= 0 (got %d)" % n_jobs)
+    if n_jobs == 0:
+        return os.cpu_count() or 1
+    return n_jobs
+
+
+def split_range(n, n_blocks=None, block_size=None):
+    """
+    Split range(n) into contiguous blocks.
+
+    Returns
+    -------
+    list of (start, end) tuples.
+    """
+    if block_size is None:
+        n_blocks = max(1, min(n_blocks or 1, n))
+        block_size = -(-n // n_blocks)
+    return [(i, min(i + block_size, n)) for i in range(0, n, block_size)]
+
+
+def _sample_block(task):
+    start, end = task
+    w = worker_state()
+    block = pd.DataFrame(
+        w['betas'][:, start:end], index=w['index'],
+        columns=w['columns'][start:end])
+    return w['func'](block, *w['args'])
+
+
+def map_sample_blocks(func, df, n_jobs, args=(), mp_context=None):
+    """
+    Apply "func" to blocks of samples (columns) in parallel.
+
+    Parameters
+    ----------
+    func : function
+        Module-level function "func(block_df, *args)" that returns a Series
+        or DataFrame indexed by samples.
+    df : DataFrame
+        CpGs x samples. The values are passed through shared memory.
+    n_jobs : int
+        Number of worker processes (0: one per CPU).
+    args : tuple, optional
+        Other arguments of "func". The default is ().
+    mp_context : str, optional
+        See "run_pool". The default is None.
+
+    Returns
+    -------
+    Concatenated results (in the order of the samples).
+    """
+    n_jobs = n_workers(n_jobs)
+    if n_jobs == 1:
+        return func(df, *args)
+    tasks = split_range(df.shape[1], n_blocks=n_jobs)
+    results = run_pool(
+        _sample_block, tasks, n_jobs,
+        arrays={'betas': np.asarray(df.to_numpy())},
+        state={'index': df.index, 'columns': df.columns, 'func': func,
+               'args': args},
+        mp_context=mp_context)
+    return pd.concat(results, axis=0)
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Scoring kernel of the linear clocks, and the in-memory scoring API.
+
+All linear clocks are scored the same way: the rows of the clock CpGs are
+gathered once from the beta matrix (union of the CpGs of all clocks), the
+weighted sums are one dense (samples x CpGs) x (CpGs x clocks) product, and
+the output transform of each model is applied to its column (see
+"utils.apply_transform"). Clocks whose transform is "zscore" use betas
+standardized per sample over all CpGs of the input.
+
+>>> from dmc.clockmodel import load_clock
+>>> from dmc.scoring import score_linear
+>>> models = {c: load_clock(c) for c in ['Horvath13', 'Hannum']}
+>>> ages, found = score_linear(beta_df, models)
+
+"score" scores a beta matrix held in memory (DataFrame, NumPy array or
+memory-mapped array) without reading or writing any file:
+
+>>> import dmc
+>>> ages, coverage = dmc.score(beta_df, clocks=['Horvath13', 'Hannum'])
+"""
+
+import os
+import logging
+import numpy as np
+import pandas as pd
+from dmc.utils import apply_transform
+from dmc.clockmodel import load_clock
+from dmc.betareader import select_rows
+from dmc.imputation import impute_clock_cpgs, fill_by_reference
+from dmc.registry import get_spec, model_name, multi_clocks
+
+# runners of the clocks that can be scored by "score"
+SCORE_RUNNERS = ('linear', 'dnn')
+
+# clock models loaded by "get_model" (kept for the life of the process)
+_models = {}
+
+
+def gather_rows(index, cpgs):
+    """
+    Locate CpGs in the index of a beta matrix.
+
+    Parameters
+    ----------
+    index : pandas.Index
+        CpG IDs of the beta matrix (unique).
+    cpgs : array_like
+        CpG IDs to locate.
+
+    Returns
+    -------
+    numpy.ndarray. Row of each CpG in "index" (-1 if not found).
+    """
+    return pd.Index(index).get_indexer(np.asarray(cpgs, dtype=object))
+
+
+def sample_stats(beta_df):
+    """Return the per-sample mean and standard deviation (NaN skipped)."""
+    return beta_df.mean(), beta_df.std()
+
+
+def score_linear(beta_df, models, sample_mean=None, sample_std=None,
+                 adult_age=None):
+    """
+    Score linear clocks on a beta matrix.
+
+    Parameters
+    ----------
+    beta_df : DataFrame
+        Beta values (CpGs x samples). Missing values are ignored (i.e.,
+        contribute 0 to the weighted sum).
+    models : dict
+        Clock name -> ClockModel (see "clockmodel").
+    sample_mean, sample_std : Series, optional
+        Per-sample mean and standard deviation used by the "zscore" clocks.
+        If None, they are computed from "beta_df". The default is None.
+    adult_age : float, optional
+        Adult age of Horvath's anti.trafo. If None, the default of the
+        transform is used (see "utils.apply_transform"). The default is None.
+
+    Returns
+    -------
+    tuple. (DataFrame of scores (samples x clocks), dict of clock name ->
+    boolean array telling which CpGs of the model were found).
+    """
+    if not beta_df.index.is_unique:
+        logging.warning(
+            "Duplicated CpG IDs in the input. Only the first row is used.")
+        beta_df = beta_df[~beta_df.index.duplicated()]
+    names = list(models)
+    rows = {c: gather_rows(beta_df.index, models[c].cpgs) for c in names}
+    found = {c: rows[c] >= 0 for c in names}
+
+    # the union of the clock CpGs is gathered once
+    used_rows = np.unique(np.concatenate(
+        [rows[c][found[c]] for c in names] + [np.empty(0, dtype=np.intp)]))
+    betas = np.asarray(beta_df.to_numpy()[used_rows], dtype=np.float64)
+
+    # e.g. CpGs not covered by the reference panel of imputation method 10
+    nan_rows = np.isnan(betas).any(axis=1)
+    for c in names:
+        n_nan = nan_rows[np.searchsorted(used_rows, rows[c][found[c]])].sum()
+        if n_nan > 0:
+            logging.warning(
+                "%s: %d of %d CpGs still have missing values after "
+                "imputation (counted as 0)" % (c, n_nan, len(models[c].cpgs)))
+
+    # coefficient matrix (used CpGs x clocks)
+    coefs = np.zeros((len(used_rows), len(names)))
+    for j, c in enumerate(names):
+        coefs[np.searchsorted(used_rows, rows[c][found[c]]), j] = \
+            models[c].coef[found[c]]
+    intercepts = np.array([models[c].intercept for c in names])
+    zscore_cols = np.array([models[c].transform == 'zscore' for c in names],
+                           dtype=bool)
+
+    scores = np.empty((betas.shape[1], len(names)))
+    if (~zscore_cols).any():
+        scores[:, ~zscore_cols] = \
+            np.nan_to_num(betas).T @ coefs[:, ~zscore_cols]
+    if zscore_cols.any():
+        if sample_mean is None or sample_std is None:
+            sample_mean, sample_std = sample_stats(beta_df)
+        scaled = (betas - sample_mean[beta_df.columns].to_numpy()) / \
+            sample_std[beta_df.columns].to_numpy()
+        scores[:, zscore_cols] = np.nan_to_num(scaled).T @ \
+            coefs[:, zscore_cols]
+    scores += intercepts
+
+    for j, c in enumerate(names):
+        scores[:, j] = apply_transform(
+            scores[:, j], models[c].transform, adult_age=adult_age)
+    return pd.DataFrame(scores, index=beta_df.columns, columns=names), found
+
+
+def get_model(cname):
+    """
+    Load the model of a clock once per process.
+
+    Returns
+    -------
+    tuple. (ClockModel, CpG IDs used by the clock). For AltumAge, the CpGs
+    are those of "multi_platform_cpgs.pkl" (in the order of the network
+    inputs).
+    """
+    if cname not in _models:
+        model = load_clock(model_name(cname))
+        if get_spec(cname).runner == 'dnn':
+            cpgs = np.array(pd.read_pickle(os.path.join(
+                os.path.dirname(os.path.abspath(__file__)), 'data',
+                'multi_platform_cpgs.pkl')))
+        else:
+            cpgs = model.cpgs
+        _models[cname] = (model, cpgs)
+    return _models[cname]
+
+
+def column_stats(betas, samples, chunk_size=100000):
+    """
+    Per-sample mean and standard deviation (NaN skipped) of a (memory-mapped)
+    beta matrix, read in blocks of "chunk_size" rows.
+
+    Returns
+    -------
+    tuple. (mean, std), Series indexed by "samples".
+    """
+    n_row, n_col = betas.shape
+    count = np.zeros(n_col)
+    total = np.zeros(n_col)
+    for start in range(0, n_row, chunk_size):
+        block = np.asarray(betas[start:start + chunk_size], dtype=np.float64)
+        ok = ~np.isnan(block)
+        count += ok.sum(axis=0)
+        total += np.where(ok, block, 0).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        ss = np.zeros(n_col)
+        for start in range(0, n_row, chunk_size):
+            block = np.asarray(
+                betas[start:start + chunk_size], dtype=np.float64)
+            ss += np.nan_to_num((block - mean)**2).sum(axis=0)
+        std = np.sqrt(ss / (count - 1))
+    return pd.Series(mean, index=samples), pd.Series(std, index=samples)
+
+
+def as_matrix(betas, cpgs=None, samples=None):
+    """
+    Return the values, CpG IDs and sample IDs of a beta matrix.
+
+    Parameters
+    ----------
+    betas : DataFrame, numpy.ndarray or numpy.memmap
+        Beta values (CpGs x samples). A 1-D array is one sample.
+    cpgs : array_like, optional
+        CpG IDs of the rows (required if "betas" is not a DataFrame).
+    samples : array_like, optional
+        Sample IDs of the columns. If None, the columns of the DataFrame
+        or 0, 1, 2, ... are used. The default is None.
+
+    Returns
+    -------
+    tuple. (2-D array (not copied), pandas.Index of CpGs, pandas.Index of
+    samples).
+    """
+    if isinstance(betas, pd.DataFrame):
+        values = betas.to_numpy()
+        if cpgs is None:
+            cpgs = betas.index
+        if samples is None:
+            samples = betas.columns
+    else:
+        values = betas
+        if values.ndim == 1:
+            values = values.reshape(-1, 1)
+        if cpgs is None:
+            raise ValueError("CpG IDs (\"cpgs\") of the rows are required")
+    if values.ndim != 2:
+        raise ValueError("Beta values must be a 2-D matrix (CpGs x samples)")
+    cpgs = pd.Index(cpgs).astype(str)
+    if len(cpgs) != values.shape[0]:
+        raise ValueError(
+            "%d CpG IDs for %d rows" % (len(cpgs), values.shape[0]))
+    if not cpgs.is_unique:
+        raise ValueError(
+            "Duplicated CpG IDs: %s" % cpgs[cpgs.duplicated()][0])
+    if samples is None:
+        samples = pd.RangeIndex(values.shape[1])
+    samples = pd.Index(samples)
+    if len(samples) != values.shape[1]:
+        raise ValueError(
+            "%d sample IDs for %d columns" % (len(samples), values.shape[1]))
+    return values, cpgs, samples
+
+
+def check_clocks(clocks=None):
+    """Return the clocks to score in memory (ValueError if not supported)."""
+    if clocks is None:
+        clocks = multi_clocks()
+    clocks = list(clocks)
+    if len(clocks) == 0:
+        raise ValueError("No clock to score")
+    for cname in clocks:
+        if get_spec(cname).runner not in SCORE_RUNNERS:
+            raise ValueError(
+                "%s cannot be scored in memory (must be a linear clock or "
+                "AltumAge)" % cname)
+    return clocks
+
+
+def prepare_betas(betas, clocks=None, cpgs=None, samples=None,
+                  na_percent=0.2, imputation_method=11, ref=None,
+                  knn_pool=1000, ref_panel=None, n_jobs=1,
+                  knn_max_donors=50000):
+    """
+    Extract and impute the clock CpGs of an in-memory beta matrix.
+
+    Only the rows of the clock CpGs (plus up to "knn_pool" complete rows for
+    KNN imputation) are copied out of "betas", so a memory-mapped matrix is
+    not loaded as a whole. See "score" for the parameters.
+
+    Returns
+    -------
+    tuple. (DataFrame of the imputed clock CpGs (CpGs x samples), DataFrame
+    of the coverage of each clock, per-sample mean and standard deviation
+    (None if no "zscore" clock is scored)).
+    """
+    clocks = check_clocks(clocks)
+    values, all_cpgs, samples = as_matrix(betas, cpgs=cpgs, samples=samples)
+    models = {c: get_model(c) for c in clocks}
+
+    union_cpgs = pd.Index(np.concatenate(
+        [np.asarray(models[c][1], dtype=str) for c in clocks])).unique()
+    if imputation_method in (2, 3, 4, 5):
+        # column-wise methods use all CpGs
+        rows = np.arange(len(all_cpgs))
+    else:
+        rows = select_rows(
+            values, all_cpgs, union_cpgs,
+            n_extra=knn_pool if imputation_method == 11 else 0)
+    input_df = pd.DataFrame(
+        np.array(values[rows], dtype=np.float64), index=all_cpgs[rows],
+        columns=samples)
+
+    summary = []
+    for cname in clocks:
+        clock_cpgs = models[cname][1]
+        n_found = int(pd.Index(clock_cpgs).isin(input_df.index).sum())
+        n_missed = len(clock_cpgs) - n_found
+        status = 'OK'
+        if n_missed/len(clock_cpgs) > na_percent:
+            status = 'Skipped'
+        elif get_spec(cname).strict is True and n_missed > 0:
+            status = 'Skipped'
+        summary.append(
+            [len(clock_cpgs), n_found, n_missed,
+             n_missed*100/len(clock_cpgs), status])
+    summary = pd.DataFrame(
+        summary, index=pd.Index(clocks, name='Clock'),
+        columns=['Clock_CpGs', 'Found', 'Missed', 'Missed_percent',
+                 'Status'])
+
+    clock_rows = input_df.index[input_df.index.isin(union_cpgs)]
+    if (summary['Status'] != 'OK').all():
+        used_df = input_df.loc[clock_rows[:0]]
+    elif imputation_method == 10 and isinstance(ref, pd.Series):
+        used_df = fill_by_reference(input_df.loc[clock_rows], ref)
+    else:
+        used_df = impute_clock_cpgs(
+            input_df, clock_rows, method=imputation_method, ref=ref,
+            knn_pool=knn_pool, max_donors=knn_max_donors,
+            ref_panel=ref_panel, n_jobs=n_jobs)
+
+    sample_mean = sample_std = None
+    if any(models[c][0].transform == 'zscore' for c in clocks):
+        # standardized using all CpGs of the input
+        sample_mean, sample_std = column_stats(values, samples)
+    return used_df, summary, sample_mean, sample_std
+
+
+def score_prepared(prepared, clocks):
+    """
+    Score several prepared beta matrices together.
+
+    The matrices are imputed separately (see "prepare_betas"), so the ages
+    of a sample do not depend on the other matrices; the clocks are applied
+    to all samples at once.
+
+    Parameters
+    ----------
+    prepared : list
+        Outputs of "prepare_betas" (with the same "clocks").
+    clocks : list
+        Clock names.
+
+    Returns
+    -------
+    list. DataFrame of ages (samples x clocks, NaN if the clock is skipped)
+    of each matrix.
+    """
+    clocks = check_clocks(clocks)
+    models = {c: get_model(c) for c in clocks}
+    # samples are numbered across the matrices (sample IDs may be repeated)
+    offsets = np.cumsum([0] + [p[0].shape[1] for p in prepared])
+    frames = []
+    means = []
+    stds = []
+    for i, (used_df, _, sample_mean, sample_std) in enumerate(prepared):
+        cols = pd.RangeIndex(offsets[i], offsets[i + 1])
+        frames.append(used_df.set_axis(cols, axis=1))
+        if sample_mean is not None:
+            means.append(sample_mean.set_axis(cols))
+            stds.append(sample_std.set_axis(cols))
+    used_clocks = [c for c in clocks if any(
+        p[1].loc[c, 'Status'] == 'OK' for p in prepared)]
+    ages = pd.DataFrame(np.nan, index=pd.RangeIndex(offsets[-1]),
+                        columns=clocks)
+
+    linear = {c: models[c][0] for c in used_clocks
+              if get_spec(c).runner == 'linear'}
+    if len(linear) > 0:
+        # CpGs missing from a matrix are NaN (i.e., not used)
+        used_all = pd.concat(frames, axis=1)
+        scores, _ = score_linear(
+            used_all, linear,
+            sample_mean=pd.concat(means) if len(means) > 0 else None,
+            sample_std=pd.concat(stds) if len(stds) > 0 else None)
+        ages[list(linear)] = scores
+    for cname in used_clocks:
+        if get_spec(cname).runner == 'dnn':
+            # the AltumAge model is loaded once per process
+            from dmc.methylclocks import altum_predict
+            ages[cname] = altum_predict(pd.concat(
+                [f.reindex(models[cname][1], fill_value=0) for f in frames],
+                axis=1))
+
+    outputs = []
+    for i, (used_df, summary, _, _) in enumerate(prepared):
+        out = ages.iloc[offsets[i]:offsets[i + 1]].set_axis(
+            used_df.columns, axis=0)
+        out.loc[:, list(summary.index[summary['Status'] != 'OK'])] = np.nan
+        outputs.append(out)
+    return outputs
+
+
+def score(betas, clocks=None, cpgs=None, samples=None, na_percent=0.2,
+          imputation_method=11, ref=None, knn_pool=1000, ref_panel=None,
+          n_jobs=1, knn_max_donors=50000):
+    """
+    Calculate DNAm ages of an in-memory beta matrix.
+
+    Nothing is read from or written to disk (except the bundled models, which
+    are loaded once per process, see "get_model"). The clock CpGs are
+    extracted and imputed by "prepare_betas" and scored by "score_prepared",
+    as in "methylclocks.clock_multi".
+
+    Parameters
+    ----------
+    betas : DataFrame, numpy.ndarray or numpy.memmap
+        Beta values (CpGs x samples). A 1-D array is one sample.
+    clocks : list, optional
+        Clock names ("linear" clocks or AltumAge, see "registry.CLOCKS").
+        The default is None ("registry.multi_clocks").
+    cpgs : array_like, optional
+        CpG IDs of the rows. Required if "betas" is not a DataFrame.
+    samples : array_like, optional
+        Sample IDs of the columns. The default is None.
+    na_percent : float, optional
+        The maximum of percent of missing clock CpGs. Clocks exceeding this
+        cutoff (or "strict" clocks with any CpG missing) are skipped. The
+        default is 0.2 (20%).
+    imputation_method : int, optional
+        Imputation method of the clock CpGs (see "imputation.impute_beta").
+        The default is 11 (KNN).
+    ref : str or Series, optional
+        External reference of method 10: a file (see
+        "imputation.read_reference") or the reference beta values (Series
+        indexed by CpG IDs). The default is None.
+    knn_pool : int, optional
+        Number of complete CpGs used as KNN neighbor candidates (see
+        "imputation.impute_clock_cpgs"). The ages of a clock do not depend
+        on the other clocks in "clocks". The default is 1000.
+    ref_panel : str, optional
+        Name of the reference panel in "ref". The default is None.
+    n_jobs : int, optional
+        Number of worker processes. The default is 1.
+    knn_max_donors : int, optional
+        The maximum number of KNN neighbor candidates if "knn_pool" is 0
+        (see "imputation.impute_knn"). The default is 50000.
+
+    Returns
+    -------
+    tuple. (DataFrame of ages (samples x clocks, NaN if the clock is
+    skipped), DataFrame of the coverage of each clock (clocks x
+    ['Clock_CpGs', 'Found', 'Missed', 'Missed_percent', 'Status'])).
+    """
+    clocks = check_clocks(clocks)
+    prepared = prepare_betas(
+        betas, clocks=clocks, cpgs=cpgs, samples=samples,
+        na_percent=na_percent, imputation_method=imputation_method, ref=ref,
+        knn_pool=knn_pool, ref_panel=ref_panel, n_jobs=n_jobs,
+        knn_max_donors=knn_max_donors)
+    return score_prepared([prepared], clocks)[0], prepared[1]
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Long-lived scoring server ("epical serve").
+
+The clock models (and, optionally, the AltumAge network) are loaded once at
+start-up, so a request only pays for the arithmetic. Requests are queued and
+scored in micro-batches by one worker thread: requests arriving within
+"max_wait" seconds of each other (up to "max_batch" samples) are imputed
+separately and then scored together with one matrix product (see
+"scoring.score_prepared"), so the ages of a sample do not depend on the
+other requests of the batch.
+
+Endpoints (HTTP, on a TCP port or a Unix socket):
+
+    GET  /health : {"status": "ok", "clocks": [...]}
+    POST /score  : score beta values. The body is either
+        JSON ("Content-Type: application/json"):
+            {"cpgs": [...], "betas": [[...], ...], "samples": [...],
+             "clocks": [...]}
+            "betas" is CpGs x samples (a flat list is one sample, null is a
+            missing value). "samples" and "clocks" (a subset of the served
+            clocks) are optional.
+        or a ".npz" file ("Content-Type: application/octet-stream") with
+        the arrays "betas" (CpGs x samples), "cpgs" and, optionally,
+        "samples" (see "numpy.savez").
+
+The response is JSON:
+
+    {"samples": [...], "clocks": [...], "ages": [[...], ...] (samples x
+     clocks, null if the clock is skipped), "coverage": {clock: {"Found": n,
+     "Missed": n, "Status": "OK"}}, "batch": {"requests": n, "samples": n},
+     "latency_ms": {"queue": t, "score": t, "total": t}}
+
+>>> from dmc.server import serve
+>>> serve(clocks=['Horvath13', 'Hannum'], port=8080)
+
+$ curl -s -H 'Content-Type: application/json' -d @sample.json \
+    http://127.0.0.1:8080/score
+"""
+
+import io
+import os
+import sys
+import json
+import stat
+import time
+import queue
+import logging
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from dmc.imputation import REF_PANELS, read_reference
+from dmc.scoring import check_clocks, get_model, prepare_betas
+from dmc.scoring import score_prepared
+
+# the maximum size (bytes) of a request body
+MAX_BODY = 1 << 30
+
+# content types of the binary (".npz") payload
+NPZ_TYPES = ('application/octet-stream', 'application/x-npz')
+
+
+class MicroBatcher():
+    """
+    Queue of scoring requests, scored in micro-batches by a worker thread.
+
+    Parameters
+    ----------
+    clocks : list
+        Clock names (see "scoring.score").
+    max_batch : int, optional
+        The maximum number of samples scored together. The default is 64.
+    max_wait : float, optional
+        How long (seconds) the worker waits for more requests after the first
+        request of a batch. The default is 0.005.
+    **options :
+        Options of "scoring.prepare_betas" (na_percent, imputation_method,
+        ref, knn_pool, ref_panel, n_jobs, knn_max_donors).
+    """
+
+    def __init__(self, clocks, max_batch=64, max_wait=0.005, **options):
+        self.clocks = check_clocks(clocks)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.options = options
+        self.jobs = queue.Queue()
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self, betas, cpgs=None, samples=None):
+        """
+        Score beta values (blocks until the batch is scored).
+
+        Returns
+        -------
+        tuple. (DataFrame of ages, DataFrame of coverage, dict of batch
+        information and latencies (ms)).
+        """
+        betas, cpgs, samples = check_request(betas, cpgs, samples)
+        job = {'args': (betas, cpgs, samples), 'done': threading.Event(),
+               'queued': time.perf_counter()}
+        self.jobs.put(job)
+        job['done'].wait()
+        if 'error' in job:
+            raise job['error']
+        return job['ages'], job['coverage'], job['info']
+
+    def _run(self):
+        """Collect requests into batches and score them."""
+        while True:
+            batch = [self.jobs.get()]
+            try:
+                n_sample = self._n_sample(batch[0])
+                deadline = time.perf_counter() + self.max_wait
+                while n_sample < self.max_batch:
+                    timeout = deadline - time.perf_counter()
+                    if timeout <= 0:
+                        break
+                    try:
+                        job = self.jobs.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    batch.append(job)
+                    n_sample += self._n_sample(job)
+                self._score(batch)
+            except Exception as e:
+                # the worker must survive any request: fail the batch only
+                logging.exception("Scoring failed")
+                for job in batch:
+                    if not job['done'].is_set():
+                        job.setdefault('error', RuntimeError(str(e)))
+                        job.setdefault('info', {})
+                        job['done'].set()
+
+    @staticmethod
+    def _n_sample(job):
+        betas = job['args'][0]
+        return 1 if betas.ndim == 1 else betas.shape[1]
+
+    def _score(self, batch):
+        """Score a batch of requests and release the waiting clients."""
+        start = time.perf_counter()
+        ready = []
+        for job in batch:
+            betas, cpgs, samples = job['args']
+            try:
+                job['prepared'] = prepare_betas(
+                    betas, clocks=self.clocks, cpgs=cpgs, samples=samples,
+                    **self.options)
+                ready.append(job)
+            except (ValueError, KeyError) as e:
+                job['error'] = ValueError(str(e))
+            except Exception as e:
+                logging.exception("Imputation failed")
+                job['error'] = RuntimeError(str(e))
+        if len(ready) > 0:
+            try:
+                outputs = score_prepared(
+                    [job['prepared'] for job in ready], self.clocks)
+            except Exception as e:
+                logging.exception("Scoring failed")
+                for job in ready:
+                    job['error'] = RuntimeError(str(e))
+                ready = []
+            else:
+                for job, ages in zip(ready, outputs):
+                    job['ages'] = ages
+                    job['coverage'] = job['prepared'][1]
+        end = time.perf_counter()
+        n_sample = sum(self._n_sample(job) for job in batch)
+        for job in batch:
+            job.pop('prepared', None)
+            job['info'] = {
+                'batch': {'requests': len(batch), 'samples': n_sample},
+                'latency_ms': {
+                    'queue': (start - job['queued'])*1000,
+                    'score': (end - start)*1000,
+                    'total': (end - job['queued'])*1000}}
+            job['done'].set()
+
+
+def check_request(betas, cpgs, samples=None):
+    """
+    Check the shape and type of a scoring request (ValueError if malformed).
+
+    Returns
+    -------
+    tuple. (beta values (float64, 1-D or 2-D), CpG IDs, sample IDs).
+    """
+    try:
+        # null (None) -> NaN
+        betas = np.asarray(betas, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError("\"betas\" must be a (nested) list of numbers")
+    if betas.ndim not in (1, 2):
+        raise ValueError(
+            "\"betas\" must be 1-D (one sample) or 2-D (CpGs x samples), "
+            "not %d-D" % betas.ndim)
+    n_sample = 1 if betas.ndim == 1 else betas.shape[1]
+    ids = {'cpgs': (cpgs, betas.shape[0]), 'samples': (samples, n_sample)}
+    for name, (values, n) in ids.items():
+        if values is None and name == 'samples':
+            continue
+        if isinstance(values, (str, bytes, dict)) or \
+                not isinstance(values, (list, tuple, np.ndarray)):
+            raise ValueError("\"%s\" must be a list of IDs" % name)
+        values = np.asarray(values)
+        if values.ndim != 1 or \
+                (len(values) > 0 and values.dtype.kind not in 'UiuS'):
+            raise ValueError("\"%s\" must be a list of IDs" % name)
+        if len(values) != n:
+            raise ValueError(
+                "%d %s IDs for %d %s" %
+                (len(values), name[:-1].replace('cpg', 'CpG'), n,
+                 'rows' if name == 'cpgs' else 'columns'))
+        ids[name] = values.astype(str)
+    samples = None if samples is None else ids['samples']
+    return betas, ids['cpgs'], samples
+
+
+def parse_payload(body, content_type):
+    """
+    Parse the body of a "/score" request.
+
+    Returns
+    -------
+    tuple. (beta values, CpG IDs, sample IDs (None if not given), clocks
+    (None if not given)).
+    """
+    if content_type in NPZ_TYPES:
+        try:
+            dat = np.load(io.BytesIO(body), allow_pickle=False)
+            if not isinstance(dat, np.lib.npyio.NpzFile):
+                raise ValueError("not an .npz file")
+            with dat:
+                arrays = {k: dat[k] for k in ('betas', 'cpgs', 'samples')
+                          if k in dat.files}
+        except Exception as e:
+            raise ValueError("Invalid .npz payload: %s" % e)
+        if 'betas' not in arrays or 'cpgs' not in arrays:
+            raise ValueError("The .npz payload needs \"betas\" and \"cpgs\"")
+        return check_request(
+            arrays['betas'], arrays['cpgs'], arrays.get('samples')) + (None,)
+    try:
+        payload = json.loads(body)
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError("Invalid JSON: %s" % e)
+    if not isinstance(payload, dict) or 'betas' not in payload or \
+            'cpgs' not in payload:
+        raise ValueError("The JSON payload needs \"betas\" and \"cpgs\"")
+    clocks = payload.get('clocks')
+    if clocks is not None and (not isinstance(clocks, list) or not all(
+            isinstance(c, str) for c in clocks)):
+        raise ValueError("\"clocks\" must be a list of clock names")
+    return check_request(
+        payload['betas'], payload['cpgs'], payload.get('samples')) + (clocks,)
+
+
+def _json_value(value):
+    """NaN -> None (JSON null)."""
+    return None if np.isnan(value) else float(value)
+
+
+def make_handler(batcher):
+    """Return the HTTP request handler class serving "batcher"."""
+
+    class ScoreHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            logging.debug(format % args)
+
+        def send_json(self, status, obj):
+            body = json.dumps(obj).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip('/') == '/health':
+                self.send_json(200, {'status': 'ok',
+                                     'clocks': batcher.clocks})
+            else:
+                self.send_json(404, {'error': 'Not found: %s' % self.path})
+
+        def do_POST(self):
+            received = time.perf_counter()
+            if self.path.rstrip('/') != '/score':
+                self.send_json(404, {'error': 'Not found: %s' % self.path})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+            except ValueError:
+                # the body cannot be skipped: close the connection
+                self.close_connection = True
+                self.send_json(400, {'error': 'Invalid Content-Length: %s' %
+                                     self.headers.get('Content-Length')})
+                return
+            if length <= 0 or length > MAX_BODY:
+                self.close_connection = True
+                self.send_json(
+                    411 if length <= 0 else 413,
+                    {'error': 'Invalid Content-Length: %d' % length})
+                return
+            body = self.rfile.read(length)
+            content_type = self.headers.get(
+                'Content-Type', 'application/json').split(';')[0].strip()
+            try:
+                betas, cpgs, samples, clocks = parse_payload(
+                    body, content_type)
+                if clocks is not None:
+                    unknown = [c for c in clocks if c not in batcher.clocks]
+                    if len(unknown) > 0:
+                        raise ValueError(
+                            "Clocks not served: %s" % ','.join(unknown))
+                ages, coverage, info = batcher.submit(
+                    betas, cpgs=cpgs, samples=samples)
+            except ValueError as e:
+                self.send_json(400, {'error': str(e)})
+                return
+            except RuntimeError as e:
+                self.send_json(500, {'error': str(e)})
+                return
+            if clocks is not None:
+                ages = ages[clocks]
+                coverage = coverage.loc[clocks]
+            info['latency_ms']['total'] = \
+                (time.perf_counter() - received)*1000
+            logging.info(
+                "%d samples scored in %.1f ms (queue %.1f ms, batch of %d "
+                "requests / %d samples)" %
+                (len(ages), info['latency_ms']['total'],
+                 info['latency_ms']['queue'], info['batch']['requests'],
+                 info['batch']['samples']))
+            self.send_json(200, {
+                'samples': [str(s) for s in ages.index],
+                'clocks': list(ages.columns),
+                'ages': [[_json_value(v) for v in row]
+                         for row in ages.to_numpy(dtype=np.float64)],
+                'coverage': {
+                    c: {'Found': int(coverage.loc[c, 'Found']),
+                        'Missed': int(coverage.loc[c, 'Missed']),
+                        'Status': str(coverage.loc[c, 'Status'])}
+                    for c in coverage.index},
+                'batch': info['batch'],
+                'latency_ms': info['latency_ms']})
+
+    return ScoreHandler
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn,
+                     socketserver.UnixStreamServer):
+    """HTTP server on a Unix socket."""
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ('local', 0)
+
+
+def is_socket(path):
+    """Return True if "path" exists and is a Unix socket."""
+    try:
+        return stat.S_ISSOCK(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return False
+
+
+def serve(clocks=None, host='127.0.0.1', port=8080, socket_path=None,
+          altum=False, max_batch=64, max_wait=0.005, na_percent=0.2,
+          imputation_method=11, ref=None, knn_pool=1000, ref_panel=None,
+          n_jobs=1, knn_max_donors=50000):
+    """
+    Run the scoring server (until interrupted).
+
+    Parameters
+    ----------
+    clocks : list, optional
+        Clocks to serve ("linear" clocks, see "scoring.score"). The default
+        is None (the clocks of "epical multi").
+    host, port : optional
+        Address of the HTTP server. The default is 127.0.0.1:8080.
+    socket_path : str, optional
+        If set, the server listens on this Unix socket instead of "host"
+        and "port". The default is None.
+    altum : bool, optional
+        If set, AltumAge is also served (its network is loaded at start-up).
+        The default is False.
+    max_batch, max_wait :
+        See "MicroBatcher".
+    na_percent, imputation_method, knn_pool, ref_panel, n_jobs,
+    knn_max_donors :
+        See "scoring.score".
+    ref : str, optional
+        External reference file of imputation method 10. It is read once
+        at start-up. The default is None (the bundled panels).
+    """
+    clocks = check_clocks(clocks)
+    if altum is True and 'AltumAge' not in clocks:
+        clocks.append('AltumAge')
+    logging.info("Loading %d clock models ..." % len(clocks))
+    for cname in clocks:
+        get_model(cname)
+    if 'AltumAge' in clocks:
+        logging.info("Loading the AltumAge model ...")
+        from dmc.methylclocks import load_altum_model
+        load_altum_model()
+    if imputation_method == 10:
+        if ref is None:
+            logging.warning(
+                "No external reference file: use the bundled panel (%s). "
+                "It is not a tissue panel, and the CpGs it does not cover "
+                "stay missing." % REF_PANELS)
+            ref = REF_PANELS
+        logging.info("Read the external reference: \"%s\"" % ref)
+        ref = read_reference(ref, panel=ref_panel)
+
+    batcher = MicroBatcher(
+        clocks, max_batch=max_batch, max_wait=max_wait,
+        na_percent=na_percent, imputation_method=imputation_method, ref=ref,
+        knn_pool=knn_pool, ref_panel=ref_panel, n_jobs=n_jobs,
+        knn_max_donors=knn_max_donors)
+    handler = make_handler(batcher)
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            # only replace a stale socket, never another file
+            if not is_socket(socket_path):
+                logging.error(
+                    "\"%s\" exists and is not a socket" % socket_path)
+                sys.exit(0)
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, handler)
+        address = socket_path
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+        address = 'http://%s:%d' % server.server_address[:2]
+    logging.info(
+        "Serving %d clocks on %s (micro-batches of up to %d samples, %.1f ms "
+        "wait)" % (len(clocks), address, max_batch, max_wait*1000))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Stop the server")
+    finally:
+        server.server_close()
+        if socket_path is not None and is_socket(socket_path):
+            os.remove(socket_path)
@@ -1,14 +1,8 @@
 import sys
 from time import strftime
 import numpy as np
-from scipy import stats
+import pandas as pd
 import logging
-import matplotlib.pyplot as plt
-from matplotlib import rc
-from scipy import optimize
-
-# use latex formatting for plots
-rc('text', usetex=True)
 
 
 def plot_known_predicted_ages(known_ages,
@@ -18,6 +12,13 @@ def plot_known_predicted_ages(known_ages,
                               xlab='Chronological Age',
                               ylab='EPM Age',
                               font_size=16):
+    # matplotlib and scipy are only needed here, import them on demand.
+    import matplotlib.pyplot as plt
+    from matplotlib import rc
+    from scipy import optimize
+    # use latex formatting for plots
+    rc('text', usetex=True)
+
     # define optimization function
     def func(x, a, b, c):
         return a * np.asarray(x)**0.5 + c
@@ -48,6 +49,7 @@ def plot_known_predicted_ages(known_ages,
 
 def r2(x, y):
     # return r squared
+    from scipy import stats
     return stats.pearsonr(x, y)[0]**2
 
 
@@ -56,15 +58,116 @@ def pearson_correlation(meth_matrix, phenotype):
     calculate pearson correlation coefficient between rows of input matrix
     and phenotype
     """
-    # calculate mean for each row and phenotype mean
-    matrix_means = np.mean(meth_matrix, axis=1)
-    phenotype_mean = np.mean(phenotype)
-    transformed_matrix = meth_matrix - matrix_means.reshape([-1, 1])
-    transformed_phenotype = phenotype - phenotype_mean
-    covariance = np.sum(transformed_matrix * transformed_phenotype, axis=1)
-    variance_meth = np.sqrt(np.sum(transformed_matrix ** 2, axis=1))
-    variance_phenotype = np.sqrt(np.sum(transformed_phenotype ** 2))
-    return covariance / (variance_meth * variance_phenotype)
+    return pearson_from_stats(correlation_stats(meth_matrix, phenotype))
+
+
+def correlation_stats(meth_matrix, phenotype, cols=None, block_size=50000,
+                      n_jobs=1):
+    """
+    Sufficient statistics of the Pearson correlation between each row of
+    the matrix and the phenotype.
+
+    The matrix is read in blocks of rows, and each block is converted to
+    float64 once and reduced to its row sums, sums of squares and
+    cross-products with the phenotype. No full-size temporary is created.
+    The statistics are additive, so the statistics of new samples can be
+    added to those of old samples (see "add_stats").
+
+    Parameters
+    ----------
+    meth_matrix : numpy.ndarray
+        2-D array (CpGs x samples). Can be a np.memmap.
+    phenotype : array_like
+        Phenotype (e.g., age) of the samples (in the order of "cols").
+    cols : array_like, optional
+        Column positions of the samples to use. If None, all columns are
+        used. The default is None.
+    block_size : int, optional
+        Number of rows processed at a time. The default is 50000.
+    n_jobs : int, optional
+        Number of threads (0: one per CPU). The default is 1.
+
+    Returns
+    -------
+    dict. 'n', 'sum_y' and 'sum_yy' (phenotype), and 'sum_x', 'sum_xx' and
+    'sum_xy' (arrays, one value per row).
+    """
+    y = np.asarray(phenotype, dtype=np.float64)
+    n_row = meth_matrix.shape[0]
+    stats = {
+        'n': len(y), 'sum_y': y.sum(), 'sum_yy': y @ y,
+        'sum_x': np.empty(n_row), 'sum_xx': np.empty(n_row),
+        'sum_xy': np.empty(n_row)}
+
+    def reduce_block(start):
+        block = meth_matrix[start:start + block_size]
+        if cols is not None:
+            block = block[:, cols]
+        x = np.asarray(block, dtype=np.float64)
+        end = start + len(x)
+        stats['sum_x'][start:end] = x.sum(axis=1)
+        stats['sum_xx'][start:end] = np.einsum('ij,ij->i', x, x)
+        stats['sum_xy'][start:end] = x @ y
+
+    from dmc.scheduler import n_workers
+    starts = range(0, n_row, block_size)
+    n_jobs = n_workers(n_jobs)
+    if n_jobs > 1:
+        # NumPy releases the GIL in the reductions
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            list(pool.map(reduce_block, starts))
+    else:
+        for start in starts:
+            reduce_block(start)
+    return stats
+
+
+def add_stats(stats1, stats2):
+    """Combine the correlation statistics of two sets of samples."""
+    return {k: stats1[k] + stats2[k] for k in stats1}
+
+
+def pearson_from_stats(stats):
+    """Pearson correlation coefficients from "correlation_stats"."""
+    n = stats['n']
+    cov = stats['sum_xy'] - stats['sum_x'] * (stats['sum_y'] / n)
+    var_x = np.maximum(stats['sum_xx'] - stats['sum_x'] ** 2 / n, 0)
+    var_y = stats['sum_yy'] - stats['sum_y'] ** 2 / n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return cov / np.sqrt(var_x * var_y)
+
+
+def select_correlated(meth_matrix, phenotype, pcc_cut, cols=None,
+                      block_size=50000, n_jobs=1, stats=None):
+    """
+    Select rows whose absolute Pearson correlation with the phenotype is
+    above "pcc_cut".
+
+    Parameters
+    ----------
+    meth_matrix : numpy.ndarray
+        2-D array (CpGs x samples).
+    phenotype : array_like
+        Phenotype of the samples.
+    pcc_cut : float
+        Cutoff of the absolute correlation coefficient.
+    cols, block_size, n_jobs :
+        See "correlation_stats".
+    stats : dict, optional
+        Precomputed "correlation_stats". If provided, the matrix is not
+        read. The default is None.
+
+    Returns
+    -------
+    tuple. (row indices, correlation coefficients of these rows).
+    """
+    if stats is None:
+        stats = correlation_stats(meth_matrix, phenotype, cols=cols,
+                                  block_size=block_size, n_jobs=n_jobs)
+    pcc = pearson_from_stats(stats)
+    indices = np.where(np.abs(pcc) > pcc_cut)[0]
+    return indices, pcc[indices]
 
 
 def printlog(mesg):
@@ -74,20 +177,77 @@ def printlog(mesg):
 
 
 def traof(x, adult_age=20):
-    x = (x+1)/(1 + adult_age)
-    if x <= 1:
-        y = np.log(x)
-    else:
-        y = x - 1
-    return y
+    """
+    Horvath's "trafo" (log-linear transformation of age).
+
+    x can be a scalar or an array (element-wise).
+    """
+    x = (np.asarray(x, dtype=np.float64) + 1)/(1 + adult_age)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        y = np.where(x <= 1, np.log(x), x - 1)
+    return y if y.ndim > 0 else float(y)
 
 
 def anti_traof(x, adult_age=20):
-    if x < 0:
-        y = (1 + adult_age)*np.exp(x) - 1
-    else:
-        y = (1 + adult_age)*x + adult_age
-    return y
+    """
+    Horvath's "anti.trafo" (inverse of "traof").
+
+    x can be a scalar or an array (element-wise).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    with np.errstate(over='ignore'):
+        y = np.where(x < 0, (1 + adult_age)*np.exp(x) - 1,
+                     (1 + adult_age)*x + adult_age)
+    return y if y.ndim > 0 else float(y)
+
+
+# output transforms of the mouse clocks (see "clock_mouse")
+MMBLOOD_ABC = (0.1666, 0.4185, -1.712)
+YOMT_ABC = (0.1207, 1.2424, 2.5440)
+
+
+def apply_transform(score, transform, adult_age=None):
+    """
+    Convert the linear scores of a clock into its output.
+
+    Parameters
+    ----------
+    score : array_like or Series
+        Linear scores (sum(beta * coef) + intercept) of the samples.
+    transform : str
+        Transform type of the clock model (see "clockmodel.TRANSFORMS").
+            horvath: anti_traof (adult_age = 20)
+            ped_wu: anti_traof (adult_age = 48), then month -> year
+            mmliver: 2**score
+            mmblood: ((score - c)/a)**(1/b)
+            yomt: 7*exp(a*score**2 + b*score + c)
+        Other types (e.g., "linear", "zscore" or "wlmt") are not transformed.
+    adult_age : int, optional
+        "adult_age" of anti_traof. If None, it is given by the transform
+        type. The default is None.
+
+    Returns
+    -------
+    Same type as "score" (numpy.ndarray if "score" is not a Series).
+    """
+    values = np.asarray(score, dtype=np.float64)
+    if transform in ('horvath', 'ped_wu'):
+        if adult_age is None:
+            adult_age = 48 if transform == 'ped_wu' else 20
+        values = anti_traof(values, adult_age)
+        if transform == 'ped_wu':
+            values = values/12.0
+    elif transform == 'mmliver':
+        values = 2**values
+    elif transform == 'mmblood':
+        a, b, c = MMBLOOD_ABC
+        values = ((values - c)/a) ** (1/b)
+    elif transform == 'yomt':
+        a, b, c = YOMT_ABC
+        values = 7*np.exp(a*(values**2) + b*values + c)
+    if isinstance(score, pd.Series):
+        return pd.Series(values, index=score.index, name=score.name)
+    return values
 
 
 def plot_coef(infile, outfile, rfile):
@@ -178,6 +338,7 @@ def plot_corr(cage, dage, outfile, rfile):
     -------
     None.
     """
+    from scipy import stats
     r, pval = stats.pearsonr(cage, dage)
     r = str(round(r, 3))
     pval = "{:.2e}".format(pval)
@@ -0,0 +1,140 @@
+"""Tests of the NumPy AltumAge forward pass (dmc.altum)."""
+
+import os
+import numpy as np
+import pytest
+from dmc.altum import AltumNet, SELU_ALPHA, SELU_SCALE, keras_arrays
+from dmc.altum import cache_altum, default_file, find_altum, load_altum
+
+N_IN = 20
+
+
+def selu(x):
+    return SELU_SCALE * np.where(x > 0, x, SELU_ALPHA * np.expm1(x))
+
+
+def random_arrays(rng):
+    """BatchNorm -> Dense(selu) -> BatchNorm -> Dense -> Activation(relu) ->
+    Dense(1), in the layout of "AltumAge_net.npz"."""
+    arrays = {'center': rng.uniform(0.2, 0.8, N_IN),
+              'scale': rng.uniform(0.1, 0.5, N_IN),
+              'layers': np.array(['BatchNormalization', 'Dense',
+                                  'BatchNormalization', 'Dense',
+                                  'Activation', 'Dense'])}
+    for i, n in ((0, N_IN), (2, 8)):
+        arrays['gamma_%d' % i] = rng.uniform(0.5, 1.5, n)
+        arrays['beta_%d' % i] = rng.normal(0, 0.1, n)
+        arrays['mean_%d' % i] = rng.normal(0, 0.5, n)
+        arrays['var_%d' % i] = rng.uniform(0.5, 2, n)
+        arrays['epsilon_%d' % i] = np.array(1e-3)
+    for i, shape, act in ((1, (N_IN, 8), 'selu'), (3, (8, 4), 'linear'),
+                          (5, (4, 1), 'linear')):
+        arrays['kernel_%d' % i] = rng.normal(0, 0.5, shape)
+        arrays['bias_%d' % i] = rng.normal(0, 0.1, shape[1])
+        arrays['activation_%d' % i] = np.array(act)
+    arrays['activation_4'] = np.array('relu')
+    return arrays
+
+
+def unfolded_forward(arrays, betas):
+    """Layer-by-layer float64 reference of the forward pass."""
+    x = (betas.T - arrays['center']) / arrays['scale']
+    for i, kind in enumerate(arrays['layers']):
+        if kind == 'BatchNormalization':
+            x = (x - arrays['mean_%d' % i]) / np.sqrt(
+                arrays['var_%d' % i] + arrays['epsilon_%d' % i]) * \
+                arrays['gamma_%d' % i] + arrays['beta_%d' % i]
+        elif kind == 'Dense':
+            x = x @ arrays['kernel_%d' % i] + arrays['bias_%d' % i]
+            if str(arrays['activation_%d' % i]) == 'selu':
+                x = selu(x)
+        else:
+            x = np.maximum(x, 0)
+    return x[:, 0]
+
+
+def test_folded_batchnorm_matches_reference():
+    rng = np.random.default_rng(1)
+    arrays = random_arrays(rng)
+    betas = rng.uniform(0, 1, (N_IN, 300))
+    np.testing.assert_allclose(
+        AltumNet(arrays).predict(betas, batch_size=64),
+        unfolded_forward(arrays, betas), rtol=1e-4, atol=1e-4)
+
+
+def test_activation_before_dense_is_rejected():
+    arrays = {'center': np.zeros(2), 'scale': np.ones(2),
+              'layers': np.array(['Activation', 'Dense']),
+              'activation_0': np.array('relu'),
+              'kernel_1': np.ones((2, 1)), 'bias_1': np.zeros(1),
+              'activation_1': np.array('linear')}
+    with pytest.raises(ValueError):
+        AltumNet(arrays)
+
+
+def keras_model(keras, rng):
+    """Small Keras model with the AltumAge layer types."""
+    model = keras.Sequential([
+        keras.Input(shape=(N_IN,)),
+        keras.layers.BatchNormalization(),
+        keras.layers.Dense(8, activation='selu'),
+        keras.layers.Dropout(0.3),
+        keras.layers.BatchNormalization(),
+        keras.layers.Dense(4),
+        keras.layers.Activation('relu'),
+        keras.layers.Dense(1)])
+    # non-trivial moving statistics of the batch normalization layers
+    for layer in model.layers:
+        if isinstance(layer, keras.layers.BatchNormalization):
+            n = layer.get_weights()[0].shape[0]
+            layer.set_weights([rng.uniform(0.5, 1.5, n),
+                               rng.normal(0, 0.1, n),
+                               rng.normal(0, 0.5, n),
+                               rng.uniform(0.5, 2, n)])
+    return model
+
+
+def test_keras_parity():
+    tf = pytest.importorskip('tensorflow')
+    rng = np.random.default_rng(2)
+    model = keras_model(tf.keras, rng)
+    center = rng.uniform(0.2, 0.8, N_IN)
+    scale = rng.uniform(0.1, 0.5, N_IN)
+    betas = rng.uniform(0, 1, (N_IN, 100))
+    expected = model.predict(
+        (betas.T - center) / scale, verbose=0).flatten()
+    observed = AltumNet(keras_arrays(model, center, scale)).predict(betas)
+    np.testing.assert_allclose(observed, expected, rtol=1e-4, atol=1e-4)
+
+
+def test_cache_altum(tmp_path, monkeypatch):
+    tf = pytest.importorskip('tensorflow')
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    if os.path.exists(default_file()):
+        pytest.skip('the exported model is bundled')
+    rng = np.random.default_rng(3)
+    model = keras_model(tf.keras, rng)
+    center = rng.uniform(0.2, 0.8, N_IN)
+    scale = rng.uniform(0.1, 0.5, N_IN)
+    assert find_altum() is None
+    net = cache_altum(model, center, scale)
+    assert net is not None
+    # later loads use the cached file
+    assert find_altum() == str(tmp_path / 'epical' / 'AltumAge_net.npz')
+    betas = rng.uniform(0, 1, (N_IN, 50))
+    expected = model.predict(
+        (betas.T - center) / scale, verbose=0).flatten()
+    np.testing.assert_allclose(
+        load_altum().predict(betas), expected, rtol=1e-4, atol=1e-4)
+    assert [p.name for p in (tmp_path / 'epical').iterdir()] == \
+        ['AltumAge_net.npz']
+
+
+def test_cache_altum_unwritable(tmp_path, monkeypatch):
+    tf = pytest.importorskip('tensorflow')
+    # the cache directory cannot be created
+    (tmp_path / 'epical').write_text('')
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    rng = np.random.default_rng(4)
+    model = keras_model(tf.keras, rng)
+    assert cache_altum(model, np.zeros(N_IN), np.ones(N_IN)) is None
@@ -0,0 +1,95 @@
+"""Tests of the coordinate index of mouse clock CpGs (dmc.coordindex)."""
+
+import numpy as np
+import pytest
+from dmc.coordindex import CoordIndex, max_distance, split_ids
+
+# two CpGs 10 bp apart on chr1, one on chr2 (not in sorted order)
+CPGS = ['chr1_120', 'chr2_50', 'chr1_110']
+
+
+@pytest.fixture
+def index():
+    return CoordIndex(CPGS)
+
+
+def test_split_ids():
+    chroms, positions = split_ids(['chr1_100', 'chrX_5', 'bad', 'chr2_x'])
+    assert list(chroms[:2]) == ['chr1', 'chrX']
+    np.testing.assert_array_equal(positions, [100, 5, np.nan, np.nan])
+
+
+def test_split_ids_empty():
+    chroms, positions = split_ids([])
+    assert len(chroms) == 0 and len(positions) == 0
+
+
+def test_invalid_ids_are_rejected():
+    with pytest.raises(ValueError):
+        CoordIndex(['chr1_100', 'cg00000029'])
+
+
+def test_exact(index):
+    rows, dists = index.match_ids(
+        ['chr1_110', 'chr1_111', 'chr2_50', 'chr1_120'], 'exact')
+    np.testing.assert_array_equal(rows, [2, -1, 1, 0])
+    np.testing.assert_array_equal(dists, [0, 0, 0, 0])
+
+
+def test_adjacent(index):
+    # +1 bp (other strand) and -1 bp are matched, 2 bp is not
+    rows, dists = index.match_ids(
+        ['chr1_111', 'chr1_109', 'chr2_51', 'chr2_52', 'chr1_121'],
+        'adjacent')
+    np.testing.assert_array_equal(rows, [2, 2, 1, -1, 0])
+    np.testing.assert_array_equal(dists, [1, 1, 1, 0, 1])
+
+
+def test_window(index):
+    rows, dists = index.match_ids(
+        ['chr1_113', 'chr1_117', 'chr1_100', 'chr1_99', 'chr2_53'],
+        'window', window=3)
+    # 113 -> 110 (3 bp), 117 -> 120 (3 bp), 100 -> out of the window
+    np.testing.assert_array_equal(rows, [2, 0, -1, -1, 1])
+    np.testing.assert_array_equal(dists, [3, 3, 0, 0, 3])
+    assert max_distance('window', 3) == 3
+    with pytest.raises(ValueError):
+        max_distance('nearest')
+
+
+def test_equidistant_sites_go_upstream(index):
+    # 115 is 5 bp from both 110 and 120
+    rows, dists = index.match_ids(['chr1_115'], 'window', window=5)
+    np.testing.assert_array_equal(rows, [2])
+    np.testing.assert_array_equal(dists, [5])
+
+
+def test_unknown_chromosomes_and_nan_positions(index):
+    rows, dists = index.match(
+        ['chr3', 'chr1', 'chr1', 'chrUn'], [110, np.nan, 120, np.nan],
+        'adjacent')
+    np.testing.assert_array_equal(rows, [-1, -1, 0, -1])
+    np.testing.assert_array_equal(dists, [0, 0, 0, 0])
+
+
+def test_empty_input(index):
+    rows, dists = index.match_ids([], 'window', window=5)
+    assert len(rows) == 0 and len(dists) == 0
+    np.testing.assert_array_equal(index.best_sites([], 'adjacent'),
+                                  [-1, -1, -1])
+
+
+def test_best_sites(index):
+    sites = ['chr1_111', 'chr1_110', 'chr2_51', 'chr2_49', 'chr9_1']
+    # chr1_110: the exact site beats the adjacent one; chr2_50: two sites
+    # at 1 bp, the first one wins; chr1_120: no site
+    np.testing.assert_array_equal(
+        index.best_sites(sites, 'adjacent'), [-1, 2, 1])
+
+
+def test_candidate_ids(index):
+    assert set(index.candidate_ids('exact')) == set(CPGS)
+    assert set(index.candidate_ids('adjacent')) == {
+        'chr1_119', 'chr1_120', 'chr1_121', 'chr2_49', 'chr2_50', 'chr2_51',
+        'chr1_109', 'chr1_110', 'chr1_111'}
+    assert len(index.candidate_ids('window', window=2)) == 15
@@ -0,0 +1,118 @@
+"""Tests of the coverage file readers (dmc.coverage)."""
+
+import gzip
+import numpy as np
+import pytest
+from dmc.coordindex import CoordIndex
+from dmc.coverage import guess_format, read_coverage, read_coverage_files
+from dmc.coverage import read_manifest
+
+CPGS = ['chr1_110', 'chr1_120', 'chr2_50']
+
+# chrom, start (1-based), end, percent, methylated, unmethylated
+BISMARK = '''chr1\t110\t110\t80\t8\t2
+chr1\t111\t111\t50\t5\t5
+chr1\t120\t120\t100\t3\t0
+chr3\t10\t10\t0\t0\t9
+'''
+
+# chrom, start (0-based), end, percent
+BEDGRAPH = '''track type=bedGraph
+chr1\t109\t110\t80
+chr1\t110\t111\t60
+chr1\t119\t120\t100
+'''
+
+# chrom, start (0-based), end, name, score, strand, thick start, thick end,
+# color, coverage, percent
+BEDMETHYL = '''chr1\t109\t110\t.\t0\t+\t109\t110\t0,0,0\t10\t80
+chr1\t110\t111\t.\t0\t-\t110\t111\t0,0,0\t10\t50
+chr2\t49\t50\t.\t0\t+\t49\t50\t0,0,0\t4\t25
+'''
+
+
+@pytest.fixture
+def index():
+    return CoordIndex(CPGS)
+
+
+def write(path, text):
+    if str(path).endswith('.gz'):
+        with gzip.open(path, 'wt') as fh:
+            fh.write(text)
+    else:
+        path.write_text(text)
+    return str(path)
+
+
+def test_guess_format():
+    assert guess_format('a.cov') == 'bismark'
+    assert guess_format('a.bismark.cov.gz') == 'bismark'
+    assert guess_format('a.bedGraph.gz') == 'bedgraph'
+    assert guess_format('a.bed') == 'bedmethyl'
+    assert guess_format('a.txt') is None
+
+
+@pytest.mark.parametrize('name', ['s.cov', 's.cov.gz'])
+def test_bismark(tmp_path, index, name):
+    cov_file = write(tmp_path / name, BISMARK)
+    # chr1_120 has 3 reads (< min_cov)
+    np.testing.assert_allclose(
+        read_coverage(cov_file, index, min_cov=5),
+        [0.8, np.nan, np.nan])
+    np.testing.assert_allclose(
+        read_coverage(cov_file, index, min_cov=3), [0.8, 1.0, np.nan])
+    # both strands are added up: (8 + 5) / 20
+    np.testing.assert_allclose(
+        read_coverage(cov_file, index, min_cov=5, match='adjacent'),
+        [0.65, np.nan, np.nan])
+
+
+def test_bedgraph(tmp_path, index):
+    cov_file = write(tmp_path / 's.bedGraph', BEDGRAPH)
+    # no read counts: "min_cov" is not applied
+    np.testing.assert_allclose(
+        read_coverage(cov_file, index, min_cov=5), [0.8, 1.0, np.nan])
+    # the levels of the matched sites are averaged
+    np.testing.assert_allclose(
+        read_coverage(cov_file, index, match='adjacent'), [0.7, 1.0, np.nan])
+
+
+def test_bedmethyl(tmp_path, index):
+    cov_file = write(tmp_path / 's.bed', BEDMETHYL)
+    np.testing.assert_allclose(
+        read_coverage(cov_file, index, min_cov=5), [0.8, np.nan, np.nan])
+    np.testing.assert_allclose(
+        read_coverage(cov_file, index, min_cov=4, match='adjacent',
+                      chunk_size=1),
+        [0.65, np.nan, 0.25])
+
+
+def test_unknown_format(tmp_path, index):
+    cov_file = write(tmp_path / 's.cov', BISMARK)
+    with pytest.raises(ValueError):
+        read_coverage(cov_file, index, fmt='vcf')
+
+
+def test_manifest_and_matrix(tmp_path):
+    (tmp_path / 'data').mkdir()
+    write(tmp_path / 'data' / 'A.cov', BISMARK)
+    write(tmp_path / 'data' / 'B.bed', BEDMETHYL)
+    manifest = tmp_path / 'samples.txt'
+    manifest.write_text('# samples\n\nsampleA\tdata/A.cov\ndata/B.bed\n')
+    files = read_manifest(str(manifest))
+    assert files == {'sampleA': str(tmp_path / 'data' / 'A.cov'),
+                     'B': str(tmp_path / 'data' / 'B.bed')}
+    df = read_coverage_files(files, CPGS, min_cov=4, match='adjacent')
+    # chr1_120 is covered by 3 reads only (sample A): dropped
+    assert list(df.index) == ['chr1_110', 'chr2_50']
+    assert list(df.columns) == ['sampleA', 'B']
+    np.testing.assert_allclose(df.to_numpy(), [[0.65, 0.65],
+                                               [np.nan, 0.25]])
+
+
+def test_duplicated_samples(tmp_path):
+    manifest = tmp_path / 'samples.txt'
+    manifest.write_text('A\ta.cov\nA\tb.cov\n')
+    with pytest.raises(ValueError):
+        read_manifest(str(manifest))
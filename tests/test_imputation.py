@@ -0,0 +1,37 @@
+"""Tests of the imputation methods (dmc.imputation)."""
+
+import logging
+import numpy as np
+import pandas as pd
+from sklearn.impute import KNNImputer
+from dmc.imputation import impute_beta, impute_knn
+
+
+def random_betas(n_cpg=300, n_sample=9, na_rate=0.1, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.uniform(0, 1, (n_cpg, n_sample))
+    values[rng.uniform(0, 1, values.shape) < na_rate] = np.nan
+    return pd.DataFrame(values, index=['cg%08d' % i for i in range(n_cpg)])
+
+
+def test_all_donors_match_knnimputer():
+    df = random_betas()
+    expected = KNNImputer(n_neighbors=3).fit_transform(df.to_numpy())
+    for max_donors in (0, None, len(df)):
+        np.testing.assert_allclose(
+            impute_knn(df, k=3, max_donors=max_donors, block_size=50),
+            expected, rtol=0, atol=1e-12)
+
+
+def test_donor_subset_is_reported(caplog):
+    df = random_betas()
+    with caplog.at_level(logging.WARNING):
+        subset = impute_beta(df, method=11, max_donors=100)
+    assert any('KNN neighbor candidates' in r.getMessage()
+               for r in caplog.records)
+    assert not subset.isnull().any(axis=None)
+    caplog.clear()
+    with caplog.at_level(logging.WARNING):
+        impute_beta(df, method=11, max_donors=0)
+    assert not any('KNN neighbor candidates' in r.getMessage()
+                   for r in caplog.records)
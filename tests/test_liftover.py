@@ -0,0 +1,62 @@
+"""Tests of the mm10/mm39 liftover of the mouse clock CpGs (dmc.liftover)."""
+
+import numpy as np
+import pytest
+from dmc.clockmodel import load_clock
+from dmc.liftover import assign_sites, lift, load_liftover
+from dmc.liftover import mapping_from_models
+
+
+def test_lift():
+    assert list(lift(['chr10_111559529'], 'mm10', 'mm39')) == \
+        ['chr10_111395434']
+    assert list(lift(['chr10_111395434', 'chr1_1'], 'mm39', 'mm10')) == \
+        ['chr10_111559529', '']
+    with pytest.raises(ValueError):
+        lift(['chr10_111559529'], 'mm10', 'hg38')
+
+
+def test_lift_follows_the_models():
+    # the i-th CpG of the mm10 model is the i-th CpG of the mm39 model
+    mm10 = load_clock('WLMT_mm10').cpgs
+    mm39 = load_clock('WLMT_mm39').cpgs
+    assert list(lift(mm10, 'mm10', 'mm39')) == list(mm39)
+    assert list(lift(mm39, 'mm39', 'mm10')) == list(mm10)
+    assert list(lift(mm10, 'mm10', 'mm10')) == list(mm10)
+
+
+def test_bundled_mapping_is_current():
+    mapping = mapping_from_models()
+    bundled = load_liftover()[('mm10', 'mm39')]
+    assert len(bundled) == len(mapping)
+    assert (bundled[mapping['mm10']].to_numpy() ==
+            mapping['mm39'].to_numpy()).all()
+
+
+BUILDS = {'a': ['chr1_100', 'chr1_200', 'chr1_300', '', 'chr1_400'],
+          'b': ['chr1_1100', 'chr1_1200', 'chr1_1300', 'chr1_100', '']}
+INPUT = ['chr1_100', 'chr1_201', 'chr1_1300', 'chr1_400']
+
+
+def test_assign_sites():
+    best, source, order, hits = assign_sites(INPUT, BUILDS, match='adjacent')
+    assert order == ['a', 'b']
+    assert hits == {'a': 3, 'b': 2}
+    # row 2 is found in build b only; row 3 (b) would reuse input 0
+    np.testing.assert_array_equal(best, [0, 1, 2, -1, 3])
+    assert list(source) == ['a', 'a', 'b', '', 'a']
+
+
+def test_assign_sites_single_build():
+    best, source, order, _ = assign_sites(
+        INPUT, BUILDS, match='adjacent', single=True)
+    assert order == ['a']
+    np.testing.assert_array_equal(best, [0, 1, -1, -1, 3])
+    assert list(source) == ['a', 'a', '', '', 'a']
+
+
+def test_assign_sites_exact():
+    # chr1_201 is 1 bp away from chr1_200
+    best, _, _, hits = assign_sites(INPUT, BUILDS)
+    assert hits == {'a': 2, 'b': 2}
+    assert best[1] == -1
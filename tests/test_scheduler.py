@@ -0,0 +1,49 @@
+"""Tests of the worker pool (dmc.scheduler)."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from dmc.scheduler import map_sample_blocks, n_workers, run_pool
+from dmc.scheduler import split_range, worker_state
+
+
+def double_rows(task):
+    """Write 2 * x + offset into "out" for rows [start, end)."""
+    start, end = task
+    w = worker_state()
+    w['out'][start:end] = 2 * w['x'][start:end] + w['offset']
+    return end - start
+
+
+def weighted_sum(block, weights):
+    return pd.Series(weights @ block.to_numpy(), index=block.columns)
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_run_pool_writeback(n_jobs):
+    x = np.arange(30, dtype=np.float64).reshape(10, 3)
+    out = np.zeros_like(x)
+    tasks = split_range(len(x), block_size=3)
+    results = run_pool(double_rows, tasks, n_jobs,
+                       arrays={'x': x, 'out': out}, state={'offset': 1},
+                       writeback=('out',))
+    assert results == [3, 3, 3, 1]
+    np.testing.assert_array_equal(out, 2 * x + 1)
+
+
+def test_map_sample_blocks_does_not_depend_on_jobs():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.uniform(0, 1, (50, 7)),
+                      columns=['s%d' % i for i in range(7)])
+    weights = rng.normal(0, 1, 50)
+    single = map_sample_blocks(weighted_sum, df, 1, args=(weights,))
+    double = map_sample_blocks(weighted_sum, df, 2, args=(weights,))
+    assert list(double.index) == list(df.columns)
+    pd.testing.assert_series_equal(single, double, check_exact=True)
+
+
+def test_n_workers():
+    assert n_workers(3) == 3
+    assert n_workers(0) >= 1
+    with pytest.raises(ValueError):
+        n_workers(-1)
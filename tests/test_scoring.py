@@ -0,0 +1,74 @@
+"""Tests of the in-memory scoring API (dmc.score)."""
+
+import logging
+import numpy as np
+import pandas as pd
+import dmc
+from dmc.betareader import read_beta, select_rows
+from dmc.scoring import get_model
+
+CLOCKS = ['Horvath13', 'Hannum', 'PedBE', 'Levine']
+
+
+def make_betas(clocks, n_sample=12, n_other=400, na_rate=0.1, seed=0):
+    """Random beta values of the clock CpGs plus other CpGs (with NaNs)."""
+    rng = np.random.default_rng(seed)
+    cpgs = pd.Index(np.concatenate(
+        [np.asarray(get_model(c)[1], dtype=str) for c in clocks])).unique()
+    others = ['cg9%07d' % i for i in range(n_other)]
+    index = rng.permutation(np.concatenate([cpgs, others]))
+    values = rng.uniform(0, 1, (len(index), n_sample))
+    values[rng.uniform(0, 1, values.shape) < na_rate] = np.nan
+    return pd.DataFrame(
+        values, index=index, columns=['s%02d' % i for i in range(n_sample)])
+
+
+def test_ages_do_not_depend_on_the_clock_set():
+    df = make_betas(CLOCKS)
+    single, _ = dmc.score(df, clocks=['Horvath13'])
+    together, _ = dmc.score(df, clocks=CLOCKS)
+    np.testing.assert_allclose(
+        single['Horvath13'], together['Horvath13'], rtol=0, atol=1e-9)
+    pair, _ = dmc.score(df, clocks=['Hannum', 'Levine'])
+    np.testing.assert_allclose(
+        pair[['Hannum', 'Levine']], together[['Hannum', 'Levine']],
+        rtol=0, atol=1e-9)
+
+
+def test_knn_pool_does_not_depend_on_cpgs(tmp_path):
+    df = make_betas(['Hannum'], n_sample=6, n_other=200, na_rate=0.05)
+    beta_file = tmp_path / 'beta.tsv'
+    df.to_csv(beta_file, sep='\t')
+    cpgs = list(df.index[::7])
+    a = read_beta(str(beta_file), cpgs=cpgs, n_extra=50)
+    b = read_beta(str(beta_file), cpgs=cpgs[:3], n_extra=50)
+    # rows are kept in the order of the file
+    pos = select_rows(df.to_numpy(), df.index, cpgs, n_extra=50)
+    assert list(a.index) == list(df.index[pos])
+
+    def pool(d):
+        return list(d.index[d.notnull().all(axis=1)][:50])
+    assert pool(a) == pool(b) == pool(df)
+
+
+def test_unfilled_cpgs_are_reported(caplog):
+    # the bundled panel of method 10 leaves most Hannum CpGs missing
+    df = make_betas(['Horvath13', 'Hannum'], n_sample=4, na_rate=0.3)
+    with caplog.at_level(logging.WARNING):
+        dmc.score(df, clocks=['Horvath13', 'Hannum'], imputation_method=10,
+                  na_percent=1)
+    unfilled = [r.getMessage() for r in caplog.records
+                if 'still have missing values' in r.getMessage()]
+    assert any(m.startswith('Hannum: ') for m in unfilled)
+    caplog.clear()
+    with caplog.at_level(logging.WARNING):
+        dmc.score(df, clocks=['Horvath13', 'Hannum'])
+    assert not any('still have missing values' in r.getMessage()
+                   for r in caplog.records)
+
+
+def test_float32_betas():
+    df = make_betas(['Hannum'], n_sample=4, na_rate=0)
+    ages, _ = dmc.score(df, clocks=['Hannum'])
+    ages32, _ = dmc.score(df.astype(np.float32), clocks=['Hannum'])
+    np.testing.assert_allclose(ages32['Hannum'], ages['Hannum'], atol=1e-4)
@@ -0,0 +1,79 @@
+"""Tests of the scoring server (dmc.server)."""
+
+import json
+import socket
+import threading
+import http.client
+import numpy as np
+import pytest
+from dmc.scoring import get_model
+from dmc.server import MicroBatcher, UnixHTTPServer, make_handler
+
+
+class UnixConnection(http.client.HTTPConnection):
+    """HTTP connection over a Unix socket."""
+
+    def __init__(self, path):
+        super().__init__('localhost', timeout=60)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = str(tmp_path / 'epical.sock')
+    batcher = MicroBatcher(['Hannum'], max_wait=0.001)
+    httpd = UnixHTTPServer(path, make_handler(batcher))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield path
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def post(path, body, length=None):
+    """POST "body" to /score; return (status, decoded JSON)."""
+    conn = UnixConnection(path)
+    conn.putrequest('POST', '/score')
+    conn.putheader('Content-Type', 'application/json')
+    conn.putheader('Content-Length',
+                   str(len(body)) if length is None else length)
+    conn.endheaders(body)
+    response = conn.getresponse()
+    result = response.status, json.loads(response.read())
+    conn.close()
+    return result
+
+
+def payload():
+    cpgs = [str(c) for c in get_model('Hannum')[1]]
+    rng = np.random.default_rng(0)
+    betas = rng.uniform(0, 1, (len(cpgs), 2)).tolist()
+    return json.dumps({'cpgs': cpgs, 'betas': betas,
+                       'samples': ['a', 'b']}).encode('utf-8')
+
+
+def test_score_and_survive_malformed_requests(server):
+    body = payload()
+    status, first = post(server, body)
+    assert status == 200
+    assert first['samples'] == ['a', 'b']
+    assert first['clocks'] == ['Hannum']
+    assert all(np.isfinite(row[0]) for row in first['ages'])
+
+    for bad in (b'{"betas": 5, "cpgs": 5}', b'not json',
+                b'{"betas": [[1, 2]], "cpgs": ["a", "b"]}'):
+        status, result = post(server, bad)
+        assert status == 400
+        assert 'error' in result
+    status, result = post(server, b'', length='abc')
+    assert status == 400
+
+    # the worker is still alive
+    status, again = post(server, body)
+    assert status == 200
+    assert again['ages'] == first['ages']